@@ -0,0 +1,63 @@
+"""Load benchmark of the WSGI and ASGI stacks against a local Flickr stand-in.
+
+    python -m benchmarks.asgi_vs_wsgi [--latency 0.1] [--concurrency 100]
+
+Starts gunicorn (one worker, --threads threads) on config.wsgi and uvicorn
+(one worker) on config.asgi, then drives the groups page fan-out and the
+API index through each at the given concurrency. Upstream calls go to
+flickr.fake_flickr started in this process with --latency seconds per call,
+or to --flickr-url. Needs gunicorn and uvicorn from requirements/dev.txt.
+"""
+import argparse
+import json
+
+from benchmarks import load
+from flickr.fake_flickr import FakeFlickr, serve_in_thread
+
+PATHS = [
+    '/people/{userid}/groups/?stream=1',
+    '/api/',
+]
+
+
+def bench(server, port, args):
+    urls = ['http://127.0.0.1:{}{}'.format(port, path.format(userid=args.userid))
+            for path in PATHS]
+    try:
+        load.run_load(urls, args.concurrency, args.concurrency)  # warm up
+        return load.summarize(*load.run_load(urls, args.concurrency, args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--flickr-url', help='use this Flickr REST endpoint instead')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='seconds per call of the in-process fake Flickr')
+    parser.add_argument('--userid', default='38954353@N06')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8,
+                        help='gunicorn threads of the WSGI worker')
+    args = parser.parse_args()
+
+    flickr_url = args.flickr_url
+    if flickr_url is None:
+        server, flickr_url = serve_in_thread(FakeFlickr(latency=args.latency))
+
+    env = {'FLICKR_REST_URL': flickr_url}
+    results = {}
+
+    port = load.free_port()
+    results['wsgi'] = bench(load.wsgi_server(port, args.threads, env), port, args)
+
+    port = load.free_port()
+    results['asgi'] = bench(load.asgi_server(port, env), port, args)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
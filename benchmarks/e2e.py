@@ -0,0 +1,189 @@
+"""End-to-end benchmark of the explorer and group views.
+
+    python -m benchmarks.e2e [--stack wsgi|asgi] [--concurrency 20] [--views 200]
+                             [--compare benchmarks/results/OLD.json]
+
+Every scenario runs against a fresh server process (gunicorn or uvicorn)
+backed by flickr.fake_flickr in this process. A page view is the sequence
+of requests a browser makes for one page, e.g. the groups page plus its 25
+per-group POSTs, or its one batch POST. For each scenario it reports p50/p95/p99 page view
+latency, page views/sec, upstream Flickr calls per page view and the peak
+RSS of the server. Results are written as JSON, named after the current
+commit, so runs can be diffed with --compare.
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks import load
+from flickr.fake_flickr import FakeFlickr, serve_in_thread
+
+USERID = '38954353@N06'
+GROUPS = 25
+GALLERY_PHOTOS = 500
+
+
+def scenarios(fake):
+    groups = fake.get_groups({'user_id': USERID})['groups']['group']
+    group_posts = [('POST', '/people/{}/{}'.format(USERID, group['nsid']),
+                    {'group[name]': group['name']}) for group in groups]
+    groups_page = ('GET', '/people/{}/groups/'.format(USERID), None)
+    batch = json.dumps({'groups': [{'nsid': group['nsid'], 'name': group['name']}
+                                   for group in groups]})
+
+    return {
+        'api-index': [('GET', '/api/', None)],
+        'explore-form': [('GET', '/flickr.groups.pools.getPhotos', None)],
+        'group-fanout-ajax': [groups_page] + group_posts,
+        'group-fanout-batch': [groups_page,
+                               ('POST', '/people/{}/groups/batch'.format(USERID), batch)],
+        'group-fanout-stream': [groups_page,
+                                ('GET', '/people/{}/groups/?stream=1'.format(USERID), None)],
+        'gallery-500': [('POST', '/flickr.groups.pools.getPhotos',
+                         {'group_id': groups[0]['nsid'], 'extras': 'views',
+                          'per_page': GALLERY_PHOTOS})],
+    }
+
+
+def page_view(base_url, requests):
+    started = time.perf_counter()
+    ok = True
+    for method, path, data in requests:
+        body, headers = None, {}
+        if isinstance(data, str):
+            body, headers = data.encode('utf-8'), {'Content-Type': 'application/json'}
+        elif data is not None:
+            body = urlencode(data).encode('utf-8')
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        seconds, status, size = load.fetch(base_url + path, method, body, headers)
+        ok = ok and status == 200
+    return time.perf_counter() - started, ok
+
+
+def peak_rss_mb(pid):
+    """Largest peak resident set size of pid and its children, Linux only.
+
+    gunicorn serves requests from a worker process, not from the master.
+    """
+    pids = [pid]
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as fp:
+            pids += [int(child) for child in fp.read().split()]
+    except OSError:
+        pass
+
+    peaks = []
+    for process in pids:
+        try:
+            with open('/proc/{}/status'.format(process)) as fp:
+                peaks += [int(line.split()[1]) for line in fp if line.startswith('VmHWM:')]
+        except OSError:
+            pass
+    return round(max(peaks) / 1024, 1) if peaks else None
+
+
+def run_scenario(name, requests, fake, flickr_url, args):
+    port = load.free_port()
+    env = {'FLICKR_REST_URL': flickr_url}
+    if args.stack == 'asgi':
+        server = load.asgi_server(port, env)
+    else:
+        server = load.wsgi_server(port, args.threads, env)
+
+    base_url = 'http://127.0.0.1:{}'.format(port)
+    try:
+        page_view(base_url, requests)  # warm up
+        fake.reset()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(lambda i: page_view(base_url, requests),
+                                        range(args.views)))
+        wall_time = time.perf_counter() - started
+
+        latencies = [seconds for seconds, ok in results if ok]
+        summary = load.summarize(latencies, len(results) - len(latencies), wall_time)
+        summary['upstream_calls_per_view'] = round(
+            sum(fake.stats().values()) / len(results), 2)
+        summary['upstream_calls'] = fake.stats()
+        summary['peak_rss_mb'] = peak_rss_mb(server.pid)
+        return summary
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=load.ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old, new):
+    keys = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'upstream_calls_per_view', 'peak_rss_mb')
+    for name, result in new['scenarios'].items():
+        before = old['scenarios'].get(name)
+        if before is None:
+            continue
+        print(name)
+        for key in keys:
+            if before.get(key) is None or result.get(key) is None:
+                continue
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+            print('  {:<24} {:>10} -> {:>10} ({:+.1f}%)'.format(key, before[key], result[key], change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--stack', choices=('wsgi', 'asgi'), default='wsgi')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='gunicorn threads of the WSGI worker')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='page views in flight')
+    parser.add_argument('--views', type=int, default=200,
+                        help='page views per scenario')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per fake Flickr call')
+    parser.add_argument('--scenario', action='append',
+                        help='run only this scenario, may be repeated')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--compare', help='earlier JSON results file to diff against')
+    args = parser.parse_args()
+
+    fake = FakeFlickr(latency=args.latency, groups_per_user=GROUPS,
+                      photos_per_pool=GALLERY_PHOTOS)
+    flickr_server, flickr_url = serve_in_thread(fake)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'compare')},
+        'scenarios': {},
+    }
+    for name, requests in scenarios(fake).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        results['scenarios'][name] = run_scenario(name, requests, fake, flickr_url, args)
+        print(name, json.dumps(results['scenarios'][name]))
+
+    output = args.output or os.path.join(
+        load.ROOT, 'benchmarks', 'results', '{}-{}.json'.format(results['commit'], args.stack))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+    print('Results written to {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), results)
+
+
+if __name__ == '__main__':
+    main()
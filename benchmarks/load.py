@@ -0,0 +1,105 @@
+"""Helpers shared by the benchmarks: server processes and a threaded load driver."""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Nothing listening on port {}'.format(port))
+
+
+def start_server(command, port, env=None):
+    """Start command in the repository root and wait until port accepts connections."""
+    process_env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings', **(env or {}))
+    process = subprocess.Popen(command, cwd=ROOT, env=process_env)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def wsgi_server(port, threads, env=None):
+    return start_server([sys.executable, '-m', 'gunicorn', 'config.wsgi',
+                         '--bind', '127.0.0.1:{}'.format(port), '--workers', '1',
+                         '--threads', str(threads), '--log-level', 'warning'],
+                        port, dict(env or {}, FLICKR_ASYNC_VIEWS='0'))
+
+
+def asgi_server(port, env=None):
+    return start_server([sys.executable, '-m', 'uvicorn', 'config.asgi:application',
+                         '--host', '127.0.0.1', '--port', str(port), '--workers', '1',
+                         '--log-level', 'warning'],
+                        port, dict(env or {}, FLICKR_ASYNC_VIEWS='1'))
+
+
+def fetch(url, method='GET', data=None, headers=None):
+    """Request url, return (seconds, status, body size)."""
+    request = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as err:
+        size, status = 0, err.code
+    return time.perf_counter() - started, status, size
+
+
+def run_load(urls, concurrency, total):
+    """GET the urls round robin, total times with concurrency in flight.
+
+    :return: (list of latencies in seconds, number of errors, wall time)
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: fetch(urls[i % len(urls)]), range(total)))
+    wall_time = time.perf_counter() - started
+
+    latencies = [seconds for seconds, status, size in results if status == 200]
+    errors = len(results) - len(latencies)
+    return latencies, errors, wall_time
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies, errors, wall_time):
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'rps': round((len(latencies) + errors) / wall_time, 1),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
@@ -0,0 +1,94 @@
+"""Microbenchmark of flickr.flickrutils photo URL building.
+
+    python -m benchmarks.photo_url [--photos 500] [--repeat 200]
+
+Compares the original per-photo implementation with photo_url and the
+batch photo_urls, for a fixed suffix, a longest side lookup, and photos
+that already carry the url_* extra.
+"""
+import argparse
+import timeit
+
+from flickr import flickrutils
+
+SIZES = flickrutils.SIZES
+
+
+def legacy_photo_url(photo_dict, size_suffix='z', longest_side=None):
+    if longest_side:
+        size_suffix = legacy_get_size_suffix(int(longest_side))
+
+    farm = photo_dict['farm']
+    photoid = photo_dict['id']
+    secret = photo_dict['secret']
+    server = photo_dict['server']
+
+    url_template = ('https://farm{farmid}.staticflickr.com/'
+                    '{serverid}/{photoid}_{secret}_{size_suffix}.jpg')
+
+    url = url_template.format(photoid=photoid, serverid=server,
+                              farmid=farm, secret=secret,
+                              size_suffix=size_suffix)
+    return url
+
+
+def legacy_get_size_suffix(longest_side):
+    if longest_side in SIZES:
+        return SIZES[longest_side]
+
+    desc_ordered_sizes = sorted(SIZES.keys(), reverse=True)
+    for size in desc_ordered_sizes:
+        if longest_side >= size:
+            return SIZES[size]
+    return SIZES[size]
+
+
+def make_photos(count, with_extras=False):
+    photos = []
+    for i in range(count):
+        photo = {'farm': 6, 'id': str(30014555241 + i),
+                 'secret': 'cc74e7f525', 'server': '5631'}
+        if with_extras:
+            photo['url_z'] = legacy_photo_url(photo)
+        photos.append(photo)
+    return photos
+
+
+def check(photos):
+    for side in (1, 75, 99, 100, 500, 640, 2047, 2048, 5000):
+        expected = [legacy_photo_url(photo, longest_side=side) for photo in photos]
+        assert [flickrutils.photo_url(photo, longest_side=side) for photo in photos] == expected
+        assert flickrutils.photo_urls(photos, longest_side=side) == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--photos', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    photos = make_photos(args.photos)
+    photos_with_extras = make_photos(args.photos, with_extras=True)
+    check(photos[:20])
+
+    cases = [
+        ('legacy photo_url', lambda: [legacy_photo_url(p) for p in photos]),
+        ('photo_url', lambda: [flickrutils.photo_url(p) for p in photos]),
+        ('photo_urls', lambda: flickrutils.photo_urls(photos)),
+        ('legacy photo_url, longest_side',
+         lambda: [legacy_photo_url(p, longest_side=700) for p in photos]),
+        ('photo_url, longest_side',
+         lambda: [flickrutils.photo_url(p, longest_side=700) for p in photos]),
+        ('photo_urls, longest_side',
+         lambda: flickrutils.photo_urls(photos, longest_side=700)),
+        ('photo_urls, url_z extras', lambda: flickrutils.photo_urls(photos_with_extras)),
+    ]
+
+    print('{} photos, best of 5 x {} runs'.format(args.photos, args.repeat))
+    for label, case in cases:
+        best = min(timeit.repeat(case, number=args.repeat, repeat=5)) / args.repeat
+        print('{:<34} {:>9.1f} us/gallery'.format(label, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Latency of the indexed favorite queries of flickr.queries on a synthetic dataset.
+
+    python -m benchmarks.queries [--favs 1000000] [--users 1000] [--keepdb]
+
+Loads --favs favorites of --users users, with Zipf distributed tags and
+owners, through flickr.ingest into a test database, then times every query
+of flickr.queries next to the same query written against the JSONB info
+column, and shows which index the planner picked. --keepdb keeps the
+database and its data for the next run.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from flickr import ingest, queries  # noqa: E402
+from flickr.models import Fav  # noqa: E402
+
+TAGS = 5000
+OWNERS = 20000
+FIRST_UPLOAD = 1104537600  # 2005-01-01
+
+
+def zipf(rng, n, s=1.1):
+    """Index in [0, n) drawn from a Zipf-like distribution, 0 the most frequent."""
+    return min(int(rng.paretovariate(s)) - 1, n - 1)
+
+
+def photo(rng, index):
+    dateupload = FIRST_UPLOAD + rng.randrange(0, 20 * 365 * 24 * 3600)
+    taken = time.gmtime(dateupload - rng.randrange(0, 30 * 24 * 3600))
+    return {
+        'id': str(10 ** 10 + index),
+        'owner': '{}@N01'.format(10 ** 7 + zipf(rng, OWNERS)),
+        'ownername': 'owner {}'.format(index % OWNERS),
+        'title': 'Photo {}'.format(index),
+        'secret': '{:010x}'.format(rng.getrandbits(40)),
+        'server': str(rng.randrange(1000, 9999)),
+        'views': str(int(rng.lognormvariate(6, 2))),
+        'tags': ' '.join(sorted({'tag{}'.format(zipf(rng, TAGS))
+                                 for _ in range(rng.randrange(0, 9))})),
+        'dateupload': str(dateupload),
+        'datetaken': time.strftime('%Y-%m-%d %H:%M:%S', taken),
+    }
+
+
+def load(favs, users, seed):
+    rng = random.Random(seed)
+    per_user = favs // users
+    started = time.perf_counter()
+    for user in range(users):
+        nsid = '{}@N01'.format(user)
+        ingest.upsert_favs(nsid, (photo(rng, user * per_user + i) for i in range(per_user)))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE {}'.format(Fav._meta.db_table))
+    return per_user * users, time.perf_counter() - started
+
+
+def timed(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def raw(sql, params):
+    def run():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    return run
+
+
+def indexes_used(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    names = []
+
+    def visit(node):
+        if 'Index Name' in node:
+            names.append(node['Index Name'])
+        for child in node.get('Plans', []):
+            visit(child)
+
+    visit(plan[0]['Plan'])
+    return ', '.join(names) or 'seq scan'
+
+
+def scenarios(users):
+    table = Fav._meta.db_table
+    columns = 'id, user_id, photoid, info'
+    views = "CASE WHEN info->>'views' ~ '^[0-9]+$' THEN (info->>'views')::bigint END"
+    return [
+        ('tag by views', queries.favs(tag='tag20')[:50],
+         "SELECT {} FROM {} WHERE ' ' || (info->>'tags') || ' ' LIKE %s "
+         "ORDER BY {} DESC NULLS LAST LIMIT 50".format(columns, table, views), ['% tag20 %']),
+        ('rare tag by views', queries.favs(tag='tag3000')[:50],
+         "SELECT {} FROM {} WHERE ' ' || (info->>'tags') || ' ' LIKE %s "
+         "ORDER BY {} DESC NULLS LAST LIMIT 50".format(columns, table, views), ['% tag3000 %']),
+        ('user by views', queries.favs(user='{}@N01'.format(users // 2))[:50],
+         'SELECT {} FROM {} WHERE user_id = %s ORDER BY {} DESC NULLS LAST LIMIT 50'.format(
+             columns, table, views), ['{}@N01'.format(users // 2)]),
+        ('top views', queries.favs()[:50],
+         'SELECT {} FROM {} ORDER BY {} DESC NULLS LAST LIMIT 50'.format(columns, table, views),
+         []),
+        ('owner by upload', queries.favs(owner='10000001@N01', order='-dateupload')[:50],
+         "SELECT {} FROM {} WHERE info->>'owner' = %s "
+         "ORDER BY (info->>'dateupload')::bigint DESC LIMIT 50".format(columns, table),
+         ['10000001@N01']),
+        ('taken in a month', queries.favs(taken_after='2015-06', taken_before='2015-07',
+                                          order='-taken')[:50],
+         "SELECT {} FROM {} WHERE info->'datetaken' >= %s AND info->'datetaken' < %s "
+         "ORDER BY info->'datetaken' DESC LIMIT 50".format(columns, table),
+         ['"2015-06"', '"2015-07"']),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--favs', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        if not Fav.objects.exists():
+            loaded, seconds = load(args.favs, args.users, args.seed)
+            print('Loaded {} favorites in {:.0f}s, {:.0f} rows/s'.format(
+                loaded, seconds, loaded / seconds))
+
+        print('{:<18} {:>11} {:>11}  {}'.format('query', 'indexed ms', 'jsonb ms', 'indexes'))
+        for label, queryset, json_sql, json_params in scenarios(args.users):
+            sql, params = queryset.query.sql_with_params()
+            indexed = timed(lambda: list(queryset.all()), args.repeat)
+            scanned = timed(raw(json_sql, json_params), max(1, args.repeat // 5))
+            print('{:<18} {:>11.2f} {:>11.2f}  {}'.format(
+                label, indexed, scanned, indexes_used(sql, params)))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""Settings for running the site under benchmark against a local stand-in for Flickr."""
+import os
+
+# No secrets needed, see config/settings.py.
+os.environ.setdefault('FLICKR_FAKE', '1')
+
+from config.settings import *  # noqa: F401,F403,E402
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+FLICKR_REST_URL = os.environ.get('FLICKR_REST_URL', 'http://127.0.0.1:8765/services/rest/')
+
+# Every page view must reach the upstream to measure it.
+FLICKR_RESPONSE_CACHE = dict(FLICKR_RESPONSE_CACHE, METHODS={})
+FLICKR_FRAGMENT_CACHE = dict(FLICKR_FRAGMENT_CACHE, TTL=0)
+
+# The stand-in has no quota to protect.
+FLICKR_QUOTA = dict(FLICKR_QUOTA, LIMIT=None)
+
+# Benchmarks post forms without first fetching a CSRF token.
+MIDDLEWARE = [name for name in MIDDLEWARE if name != 'django.middleware.csrf.CsrfViewMiddleware']
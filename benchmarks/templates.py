@@ -0,0 +1,79 @@
+"""Startup and first-render latency of the Jinja2 templates.
+
+    python -m benchmarks.templates [--photos 500]
+
+Builds a fresh environment per mode, then times loading every template
+under templates/ and the first render of a photo gallery:
+
+    source      no bytecode cache, templates compiled from source
+    bytecode    FileSystemBytecodeCache filled beforehand, as by
+                `manage.py compile_templates`
+    bundle      modules written by `manage.py compile_templates --bundle`
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, ModuleLoader  # noqa: E402
+
+import flickr.flickrutils  # noqa: E402
+from config.jinja2 import environment  # noqa: E402
+from flickr.fake_flickr import FakeFlickr  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(settings.BASE_DIR, 'templates')
+
+
+def make_env(loader, bytecode_cache=None):
+    return environment(loader=loader, bytecode_cache=bytecode_cache, autoescape=True,
+                       auto_reload=False)
+
+
+def measure(make, photos):
+    started = time.perf_counter()
+    env = make()
+    names = [name for name in FileSystemLoader(TEMPLATE_DIR).list_templates()]
+    for name in names:
+        env.get_template(name)
+    loaded = time.perf_counter()
+    env.get_template('flickr/_group.html').render(
+        groupname='Group', photos=photos, utils=flickr.flickrutils)
+    rendered = time.perf_counter()
+    return (loaded - started) * 1000, (rendered - loaded) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--photos', type=int, default=500)
+    args = parser.parse_args()
+
+    photos = FakeFlickr(photos_per_pool=args.photos).get_pool_photos(
+        {'per_page': args.photos})['photos']['photo']
+
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as bundle_dir:
+        source_loader = FileSystemLoader(TEMPLATE_DIR)
+        make_env(source_loader).compile_templates(bundle_dir, zip=None)
+        warm = make_env(source_loader, FileSystemBytecodeCache(cache_dir))
+        for name in warm.list_templates():
+            warm.get_template(name)
+
+        modes = [
+            ('source', lambda: make_env(FileSystemLoader(TEMPLATE_DIR))),
+            ('bytecode', lambda: make_env(FileSystemLoader(TEMPLATE_DIR),
+                                          FileSystemBytecodeCache(cache_dir))),
+            ('bundle', lambda: make_env(ModuleLoader(bundle_dir))),
+        ]
+        print('{:<10} {:>12} {:>18}'.format('mode', 'startup ms', 'first render ms'))
+        for label, make in modes:
+            startup, first_render = measure(make, photos)
+            print('{:<10} {:>12.1f} {:>18.1f}'.format(label, startup, first_render))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,47 @@
+import os
+
+from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.urls import reverse
 
-from jinja2 import Environment
+from jinja2 import (ChoiceLoader, Environment, FileSystemBytecodeCache,
+                    MemcachedBytecodeCache, ModuleLoader)
+
+
+class MemoryBytecodeCache(MemcachedBytecodeCache):
+    """Bytecode kept in a dict for the life of the process."""
+
+    class _Client(dict):
+        def set(self, key, value, timeout=None):
+            self[key] = value
+
+    def __init__(self):
+        super().__init__(self._Client(), prefix='')
+
+
+def bytecode_cache():
+    options = getattr(settings, 'JINJA2_BYTECODE_CACHE', None) or {}
+    backend = options.get('BACKEND')
+    if backend == 'filesystem':
+        directory = options['DIRECTORY']
+        os.makedirs(directory, exist_ok=True)
+        return FileSystemBytecodeCache(directory)
+    if backend == 'memory':
+        return MemoryBytecodeCache()
+    return None
 
 
 def environment(**options):
+    options.setdefault('bytecode_cache', bytecode_cache())
+    # Django's backend passes TEMPLATES OPTIONS['auto_reload'], else DEBUG.
+    options.setdefault('auto_reload', getattr(settings, 'JINJA2_AUTO_RELOAD', settings.DEBUG))
+
+    # Templates compiled by `manage.py compile_templates --bundle` take
+    # precedence over the sources, unless templates are being edited.
+    bundle = getattr(settings, 'JINJA2_PRECOMPILED_DIR', None)
+    if bundle and not options['auto_reload'] and os.path.isdir(bundle) and 'loader' in options:
+        options['loader'] = ChoiceLoader([ModuleLoader(bundle), options['loader']])
+
     env = Environment(**options)
     env.globals.update({
         'static': staticfiles_storage.url,
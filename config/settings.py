@@ -11,7 +11,27 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
 import os
-from config.secrets import SECRET_KEY, DB_USER, DB_PASSWORD, FLICKR_KEY, FLICKR_SECRET
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from config.secrets import SECRET_KEY, DB_USER, DB_PASSWORD, FLICKR_KEY, FLICKR_SECRET
+except ImportError:
+    # No config/secrets.py is only allowed with FLICKR_FAKE=1, when running
+    # against the local Flickr stand-in (flickr.fake_flickr) or the tests.
+    # Without SECRET_KEY in the environment a random key is used, so sessions
+    # do not survive a restart nor are shared between processes.
+    if os.environ.get('FLICKR_FAKE') != '1':
+        raise ImproperlyConfigured('config/secrets.py is missing. Set FLICKR_FAKE=1 to run '
+                                   'against flickr.fake_flickr without it.')
+
+    from django.utils.crypto import get_random_string
+
+    SECRET_KEY = os.environ.get('SECRET_KEY') or get_random_string(50)
+    DB_USER = os.environ.get('DB_USER', '')
+    DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+    FLICKR_KEY = os.environ.get('FLICKR_KEY', 'fake-key')
+    FLICKR_SECRET = os.environ.get('FLICKR_SECRET', 'fake-secret')
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +45,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Addresses allowed to scrape /metrics.
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
 
 # Application definition
 
@@ -40,8 +63,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'flickr.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'flickr.quota.QuotaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -51,12 +76,27 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'config.urls'
 
+# Jinja2 production template mode, see config/jinja2.py.
+# BACKEND 'filesystem' keeps compiled bytecode in DIRECTORY across restarts,
+# 'memory' for the life of the process, None disables the cache.
+# `manage.py compile_templates` fills the cache at deploy time, and with
+# --bundle writes precompiled modules to JINJA2_PRECOMPILED_DIR.
+
+JINJA2_BYTECODE_CACHE = {
+    'BACKEND': 'filesystem',
+    'DIRECTORY': os.path.join(BASE_DIR, '.jinja2-cache'),
+}
+JINJA2_AUTO_RELOAD = DEBUG
+JINJA2_PRECOMPILED_DIR = os.path.join(BASE_DIR, '.jinja2-compiled')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.jinja2.Jinja2',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'OPTIONS': {
-            'environment': 'config.jinja2.environment'
+            'environment': 'config.jinja2.environment',
+            'extensions': ['flickr.fragments.FragmentCacheExtension'],
+            'auto_reload': JINJA2_AUTO_RELOAD,
         },
     },
     {
@@ -76,6 +116,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve the Flickr proxy views from flickr.async_views, on by default under config.asgi.
+FLICKR_ASYNC_VIEWS = os.environ.get('FLICKR_ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
@@ -134,4 +179,165 @@ STATICFILES_DIRS = (
     'static',
 )
 
-SESSION_SERIALIZER = 'django.contrib.sessions.serializers.PickleSerializer'
+# Sessions only hold the compact Flickr token (flickr.tokens), so they live
+# in a signed cookie and need no database round-trip.
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
+
+# Flickr reflection.getMethods / getMethodInfo cache
+# BACKEND is a Django cache alias shared by all workers, or None for the
+# in-process LRU only. Bump VERSION to drop every cached descriptor.
+
+FLICKR_REFLECTION_CACHE = {
+    'BACKEND': 'default',
+    'VERSION': 1,
+    'TTL': 24 * 60 * 60,
+    'STALE': 7 * 24 * 60 * 60,
+    'MAX_ENTRIES': 512,
+}
+
+# Group pools on UserGroupsView
+# MODE 'ajax' has the browser post the groups of the page to the batch
+# endpoint, 'server' streams them from the page URL with ?stream=1. Either
+# way all pools are fetched concurrently, at most MAX_BATCH per request.
+
+FLICKR_FANOUT = {
+    'MODE': 'server',
+    'WORKERS': 8,
+    'TIMEOUT': 10,
+    'MAX_BATCH': 100,
+}
+
+# Flickr REST and OAuth endpoints, overridable to point the clients at a local
+# stand-in such as flickr.fake_flickr. FLICKR_OAUTH_URL None keeps flickrapi's.
+
+FLICKR_REST_URL = os.environ.get('FLICKR_REST_URL', 'https://api.flickr.com/services/rest/')
+FLICKR_OAUTH_URL = os.environ.get('FLICKR_OAUTH_URL')
+
+# Flickr API clients
+# All clients share one keep-alive HTTP session. POOL_SIZE is the number of
+# pooled connections, IDLE_TIMEOUT the seconds after which an unused session
+# is recycled, MAX_CLIENTS the number of per-token clients kept around.
+
+FLICKR_CLIENT = {
+    'POOL_SIZE': 10,
+    'IDLE_TIMEOUT': 60,
+    'RETRIES': 3,
+    'BACKOFF': 0.5,
+    'MAX_CLIENTS': 256,
+}
+
+# Flickr response cache
+# BACKEND is 'memory', 'file' (LOCATION is a directory) or 'django'
+# (LOCATION is a cache alias). Only METHODS are cached, value is the TTL
+# in seconds.
+
+FLICKR_RESPONSE_CACHE = {
+    'BACKEND': 'memory',
+    'LOCATION': None,
+    'MAX_ENTRIES': 1024,
+    'METHODS': {
+        'flickr.people.getGroups': 10 * 60,
+        'flickr.people.getInfo': 60 * 60,
+        'flickr.people.getPhotos': 5 * 60,
+        'flickr.people.getPublicPhotos': 5 * 60,
+        'flickr.groups.getInfo': 60 * 60,
+        'flickr.groups.pools.getPhotos': 5 * 60,
+        'flickr.favorites.getList': 5 * 60,
+        'flickr.favorites.getPublicList': 5 * 60,
+        'flickr.contacts.getPublicList': 10 * 60,
+        'flickr.urls.lookupUser': 24 * 60 * 60,
+        'flickr.urls.lookupGroup': 24 * 60 * 60,
+    },
+    # Concurrent misses of the same call share one upstream request. Set
+    # LOCK_BACKEND to a CACHES alias to coalesce across processes as well.
+    'COALESCE': True,
+    'LOCK_BACKEND': None,
+    'LOCK_TIMEOUT': 10,
+}
+
+# Rendered group galleries, see flickr/fragments.py. BACKEND is one of
+# flickr.response_cache.BACKENDS. A pool checked less than FRESH seconds ago
+# is served from the cache without calling Flickr.
+
+FLICKR_FRAGMENT_CACHE = {
+    'BACKEND': 'memory',
+    'LOCATION': None,
+    'MAX_ENTRIES': 256,
+    'TTL': 24 * 60 * 60,
+    'FRESH': 60,
+}
+
+# Method catalog built by `manage.py build_catalog`, see flickr/catalog.py.
+
+FLICKR_METHOD_CATALOG = {
+    'PATH': os.path.join(BASE_DIR, 'flickr-methods.json'),
+    'SEARCH_LIMIT': 20,
+}
+
+# Profile URL and path alias to NSID resolution, see flickr/resolver.py.
+# Aliases resolved less than TTL seconds ago are read from Person.alias.
+
+FLICKR_RESOLVER = {
+    'TTL': 30 * 24 * 60 * 60,
+    'WORKERS': 8,
+    'MAX_ENTRIES': 4096,
+}
+
+# Background jobs run by `manage.py run_jobs`, see flickr/jobs.py.
+# CONCURRENCY caps the running jobs of a kind across all workers. Failed
+# jobs are retried MAX_ATTEMPTS times, BACKOFF seconds after the first
+# failure, doubling up to MAX_BACKOFF. Jobs whose worker sent no heartbeat
+# for LEASE seconds are retried too.
+
+FLICKR_JOBS = {
+    'CONCURRENCY': {
+        'sync_person': 2,
+        'sync_favs': 2,
+        'resolve_users': 1,
+    },
+    'DEFAULT_CONCURRENCY': 1,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 30,
+    'MAX_BACKOFF': 60 * 60,
+    'LEASE': 5 * 60,
+    'POLL': 1,
+}
+
+# Hourly call quota of FLICKR_KEY, see flickr/quota.py. LIMIT and BURST are
+# split between the PROCESSES calling Flickr: web workers, run_jobs workers
+# and running export or sync commands. None turns the scheduler off. Fan-out
+# and background calls leave their RESERVE share of the BURST to the higher
+# priorities, and give up after waiting DEADLINES seconds.
+
+FLICKR_QUOTA = {
+    'LIMIT': 3600,
+    'PROCESSES': 1,
+    'BURST': 60,
+    'RESERVE': {
+        'fanout': 0.2,
+        'background': 0.5,
+    },
+    'DEADLINES': {
+        'interactive': 5,
+        'fanout': 10,
+        'background': 15 * 60,
+    },
+}
+
+# Exports of group pools and favorites, see flickr/exports.py. File exports
+# save a checkpoint every CHECKPOINT_EVERY records, Parquet ones every
+# PART_ROWS records, in part files of ROW_GROUP_SIZE row groups. Progress is
+# reported every PROGRESS_EVERY seconds.
+
+FLICKR_EXPORT = {
+    'PER_PAGE': 500,
+    'CHECKPOINT_EVERY': 1000,
+    'ROW_GROUP_SIZE': 10000,
+    'PART_ROWS': 100000,
+    'PROGRESS_EVERY': 5,
+}
+
+# Rows per INSERT ... ON CONFLICT statement when ingesting favorites and contacts.
+
+FLICKR_INGEST_BATCH_SIZE = 1000
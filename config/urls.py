@@ -13,28 +13,48 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin
 from django.views.generic import RedirectView
 
 import flickr.views
 
+if settings.FLICKR_ASYNC_VIEWS:
+    import flickr.async_views as proxy_views
+else:
+    proxy_views = flickr.views
+
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^$', RedirectView.as_view(pattern_name='api'), name='home'),
-    url(r'^api/$', flickr.views.api, name='api'),
+    url(r'^api/$', proxy_views.api, name='api'),
+    url(r'^api/search$', flickr.views.api_search, name='api-search'),
 
     url(r'^people/$', flickr.views.PeopleView.as_view(), name='people'),
 
     url(r'^people/(?P<userid>.*)/groups/?$',
-        flickr.views.UserGroupsView.as_view(), name='groups'),
+        proxy_views.UserGroupsView.as_view(), name='groups'),
+
+    url(r'^people/(?P<userid>.*)/photos/?$',
+        flickr.views.UserPhotosView.as_view(), name='photos'),
+
+    url(r'^people/(?P<userid>.*)/sync$', flickr.views.person_sync, name='person-sync'),
+    url(r'^jobs/(?P<job_id>\d+)$', flickr.views.job_status, name='job'),
+
+    url(r'^people/(?P<userid>.*)/export/(?P<source>groups|favorites)\.(?P<fmt>\w+)$',
+        flickr.views.export, name='export'),
+
+    url(r'^people/(?P<userid>.*)/groups/batch$',
+        proxy_views.UserGroupsBatchView.as_view(), name='groups-batch'),
 
     url(r'^people/(?P<userid>.*)/(?P<groupid>.*)$',
-        flickr.views.UserGroupView.as_view()),
+        proxy_views.UserGroupView.as_view()),
 
     url(r'^flickr-auth/$', flickr.views.flickr_auth, name='flickr-auth'),
     url(r'^auth/$', flickr.views.auth),
     url(r'^logout/$', flickr.views.logout),
+    url(r'^metrics$', flickr.views.metrics, name='metrics'),
 
-    url(r'^(?P<method_name>flickr\..*)$', flickr.views.FlickrExplore.as_view(), name='flickr-explore'),
+    url(r'^(?P<method_name>flickr\..*)$', proxy_views.FlickrExplore.as_view(), name='flickr-explore'),
 ]
@@ -1,3 +1,8 @@
 from django.contrib import admin
 
-# Register your models here.
+from flickr.models import Person, Fav, Following, Job
+
+admin.site.register(Person)
+admin.site.register(Fav)
+admin.site.register(Following)
+admin.site.register(Job)
@@ -0,0 +1,129 @@
+"""Asyncio Flickr REST client for the ASGI views.
+
+Requests are signed with OAuth 1.0a HMAC-SHA1 like flickrapi does, and sent
+through one httpx.AsyncClient per event loop, so a single process can keep
+hundreds of upstream calls in flight. Calls read like the sync client:
+
+    f = AsyncFlickrClient(token)
+    response = await f.people.getGroups(user_id=userid)
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from urllib.parse import quote
+
+import httpx
+from django.conf import settings
+from flickrapi import FlickrError
+
+from flickr import client, instrumentation, quota, response_cache
+
+_http_clients = {}
+
+
+def get_http_client():
+    """Shared httpx.AsyncClient of the running event loop."""
+    loop = asyncio.get_event_loop()
+    http = _http_clients.get(loop)
+    if http is None:
+        options = client.client_settings()
+        limits = httpx.Limits(max_connections=options['POOL_SIZE'],
+                              max_keepalive_connections=options['POOL_SIZE'],
+                              keepalive_expiry=options['IDLE_TIMEOUT'])
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=options['RETRIES'])
+        http = httpx.AsyncClient(transport=transport, timeout=30)
+        _http_clients[loop] = http
+    return http
+
+
+def _escape(value):
+    return quote(str(value), safe='~')
+
+
+def oauth_sign(http_method, url, params, api_secret, token_secret=''):
+    """HMAC-SHA1 signature of a request, as described in RFC 5849."""
+    pairs = sorted((_escape(key), _escape(value)) for key, value in params.items())
+    normalized = '&'.join('{}={}'.format(key, value) for key, value in pairs)
+    base_string = '&'.join([http_method.upper(), _escape(url), _escape(normalized)])
+    key = '{}&{}'.format(_escape(api_secret), _escape(token_secret))
+    digest = hmac.new(key.encode('utf-8'), base_string.encode('utf-8'), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+class _MethodProxy:
+    def __init__(self, flickr, method_name):
+        self._flickr = flickr
+        self._method_name = method_name
+
+    def __getattr__(self, name):
+        return _MethodProxy(self._flickr, '{}.{}'.format(self._method_name, name))
+
+    def __call__(self, **kwargs):
+        return self._flickr.do_flickr_call(self._method_name, **kwargs)
+
+
+class AsyncFlickrClient:
+    def __init__(self, token=None, http=None):
+        self.token = token
+        self.http = http
+        self.rest_url = getattr(settings, 'FLICKR_REST_URL', client.REST_URL)
+        self.scope = 'public' if token is None else token.user_nsid
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _MethodProxy(self, 'flickr.' + name)
+
+    async def do_flickr_call(self, _method_name, **kwargs):
+        with instrumentation.measure(_method_name) as record:
+            return await response_cache.get_cache().acached_call(
+                _method_name, kwargs, self.scope,
+                lambda: self._upstream_call(record, _method_name, **kwargs))
+
+    async def _upstream_call(self, record, _method_name, **kwargs):
+        record.cache_hit = False
+        await quota.aacquire(self.scope)
+        http = self.http or get_http_client()
+        try:
+            response = await http.post(self.rest_url,
+                                       data=self._signed_params(_method_name, kwargs))
+        except httpx.HTTPError as err:
+            # Failures are FlickrError whatever the cause, as with the sync client.
+            raise FlickrError('{}: {}'.format(type(err).__name__, err))
+        if response.status_code != 200:
+            raise FlickrError('do_request: Status code {} received'.format(response.status_code))
+        record.response_bytes = len(response.content)
+
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            raise FlickrError('Invalid JSON response for {}'.format(_method_name))
+        if data.get('stat') != 'ok':
+            raise FlickrError('Error: {}: {}'.format(data.get('code'), data.get('message')),
+                              code=data.get('code'))
+        return data
+
+    def _signed_params(self, method_name, kwargs):
+        params = {key: value for key, value in kwargs.items() if value is not None}
+        params.update({
+            'method': method_name,
+            'format': 'json',
+            'nojsoncallback': 1,
+            'oauth_consumer_key': settings.FLICKR_KEY,
+            'oauth_nonce': uuid.uuid4().hex,
+            'oauth_signature_method': 'HMAC-SHA1',
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_version': '1.0',
+        })
+        token_secret = ''
+        if self.token is not None:
+            params['oauth_token'] = self.token.token
+            token_secret = self.token.token_secret
+
+        params['oauth_signature'] = oauth_sign('POST', self.rest_url, params,
+                                               settings.FLICKR_SECRET, token_secret)
+        return params
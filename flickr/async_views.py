@@ -0,0 +1,193 @@
+"""Async versions of the Flickr proxy views, routed by config.urls when
+settings.FLICKR_ASYNC_VIEWS is on (the default under config.asgi).
+
+Upstream calls go through flickr.aio, so a worker is not blocked while
+Flickr answers. The session is loaded in a thread before rendering,
+because base.html reads it and the session backend is synchronous.
+"""
+import asyncio
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotFound,
+                         JsonResponse)
+from django.shortcuts import render, reverse
+from django.views import View
+from flickrapi import FlickrError
+
+import flickr.flickrutils
+from flickr import aio, catalog, fragments, paging, quota, reflection, tokens
+from flickr.forms import flickr_form_class
+from flickr.utils import set_query_param
+from flickr.views import FRAGMENT_SEPARATOR, batch_groups, per_page_param
+
+log = logging.getLogger(__name__)
+
+
+class AsyncView(View):
+    """View with async handlers.
+
+    Django 3.x only runs async function views, so as_view() wraps the
+    dispatching view in a coroutine function.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        functools.update_wrapper(async_view, view)
+        return async_view
+
+
+async def init_flickrapi(request):
+    token = await sync_to_async(tokens.load)(request.session)
+    return aio.AsyncFlickrClient(token)
+
+
+class UserGroupView(AsyncView):
+    async def post(self, request, userid, groupid):
+        groupname = request.POST.get('group[name]')
+
+        f = await init_flickrapi(request)
+        with quota.use(quota.FANOUT):
+            return HttpResponse(
+                await fragments.agroup_fragment(f, request, userid, groupid, groupname))
+
+
+class UserGroupsView(AsyncView):
+    async def get(self, request, userid):
+        f = await init_flickrapi(request)
+
+        pages = await list_page(request, f, 'flickr.people.getGroups', per_page=25, user_id=userid)
+
+        if request.GET.get('stream'):
+            # Django cannot stream from async views yet, so the fragments are
+            # sent in one body, with the same separators as the sync view.
+            results = await group_fragments(request, f, userid, pages.object_list)
+            return HttpResponse(''.join(html + FRAGMENT_SEPARATOR for group, html in results))
+
+        stream_url = None
+        if settings.FLICKR_FANOUT['MODE'] == 'server':
+            stream_url = set_query_param(request.get_full_path(), 'stream', 1)
+
+        context = {
+            'userid': userid,
+            'groups': pages.object_list,
+            'pages': pages,
+            'stream_url': stream_url,
+            'batch_url': reverse('groups-batch', kwargs={'userid': userid}),
+            'utils': flickr.flickrutils,
+        }
+        return render(request, 'flickr/groups.html', context)
+
+
+class UserGroupsBatchView(AsyncView):
+    """Async flickr.views.UserGroupsBatchView, fragments are sent in one body."""
+
+    async def post(self, request, userid):
+        try:
+            groups = batch_groups(request)
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+
+        f = await init_flickrapi(request)
+        results = await group_fragments(request, f, userid, groups)
+
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'groups': [{'nsid': group['nsid'], 'html': html}
+                                            for group, html in results]})
+        return HttpResponse(''.join(html + FRAGMENT_SEPARATOR for group, html in results))
+
+
+async def list_page(request, f, method_name, per_page, **kwargs):
+    """flickr.views.list_page for an AsyncFlickrClient."""
+    try:
+        return await paging.apaginate(f, method_name, paging.page_number(request.GET.get('page')),
+                                      per_page=per_page_param(request, per_page), **kwargs)
+    except InvalidPage as err:
+        raise Http404(str(err))
+
+
+async def group_fragments(request, f, userid, groups):
+    """[(group, rendered _group.html)] of all groups, fetched concurrently."""
+    timeout = settings.FLICKR_FANOUT['TIMEOUT']
+
+    async def fragment(group):
+        try:
+            return group, await asyncio.wait_for(fragments.agroup_fragment(
+                f, request, userid, group['nsid'], group.get('name')), timeout)
+        except asyncio.TimeoutError as err:
+            log.error('{!r} {}'.format(err, group.get('name')))
+        except Exception:
+            # A bug or a malformed pool, still only this group's loss.
+            log.exception('Failed fetching pool of {}'.format(group['nsid']))
+        return group, fragments.render_group(request, f.scope, userid, group['nsid'],
+                                             group.get('name'))
+
+    with quota.use(quota.FANOUT):
+        return await asyncio.gather(*(fragment(group) for group in groups))
+
+
+class FlickrExplore(AsyncView):
+    async def get(self, request, method_name, form=None, response=None):
+        f = await init_flickrapi(request)
+
+        if not form:
+            try:
+                form = (await self._form_class(f, method_name))()
+            except FlickrError:
+                return HttpResponseNotFound('<h1>404 Not Found</h1>')
+
+        context = {
+            'form': form,
+            'response': response,
+            'utils': flickr.flickrutils,
+        }
+        return render(request, 'flickr/flickr_explore.html', context)
+
+    async def post(self, request, method_name):
+        f = await init_flickrapi(request)
+        try:
+            form_class = await self._form_class(f, method_name)
+        except FlickrError:
+            return HttpResponseNotFound('<h1>404 Not Found</h1>')
+
+        form = form_class(request.POST)
+
+        if form.is_valid():
+            log.debug(f'form: {form.cleaned_data}')
+
+        try:
+            response = await f.do_flickr_call(method_name, **form.cleaned_data)
+        except FlickrError as err:
+            log.error('{}'.format(err))
+            response = {'stat': 'fail', 'code': err.code, 'message': str(err)}
+
+        return await self.get(request, method_name=method_name, response=response, form=form)
+
+    async def _form_class(self, f, method_name):
+        methods = catalog.get_catalog()
+        method_info = methods.method_info(method_name) if methods is not None else None
+        if method_info is None:
+            method_info = await reflection.aget_method_info(f, method_name)
+        return flickr_form_class(method_name, lambda: method_info)
+
+
+async def api(request):
+    f = await init_flickrapi(request)
+    methods = await catalog.aget_methods_catalog(f)
+
+    context = {
+        'methods': methods.namespaces(),
+    }
+
+    return render(request, 'flickr/api.html', context)
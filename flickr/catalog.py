@@ -0,0 +1,191 @@
+"""Catalog of the Flickr API methods, with their arguments and error codes.
+
+Built once from flickr.reflection responses by `manage.py build_catalog`
+and saved as JSON to FLICKR_METHOD_CATALOG['PATH'], so the API index, the
+method search and the explorer forms need no upstream call. Without that
+file, a catalog of method names only is built from the cached method list.
+
+Search matches, best first: the full name, a prefix of the full name, a
+prefix of the name without its namespace ('getph' finds
+flickr.groups.pools.getPhotos) and finally a substring, looked up through
+a trigram index.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from flickr import reflection
+
+FORMAT_VERSION = 1
+
+_lock = threading.Lock()
+_catalog = None
+
+
+def namespace(method_name):
+    """'flickr.groups.pools.getPhotos' -> 'groups.pools'"""
+    return method_name[len('flickr.'):method_name.rindex('.')]
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefixed(keys, prefix):
+    """Positions of the keys of a sorted list that start with prefix."""
+    i = bisect.bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix):
+        yield i
+        i += 1
+
+
+class Catalog:
+    def __init__(self, methods, built_at=None):
+        """:param methods: {method name: flickr.reflection.getMethodInfo response or None}"""
+        self.methods = methods
+        self.built_at = built_at
+        self.names = sorted(methods)
+
+        self._lowered = [name.lower() for name in self.names]
+        short = sorted((name.rsplit('.', 1)[-1].lower(), i) for i, name in enumerate(self.names))
+        self._short_names = [name for name, i in short]
+        self._short_indexes = [i for name, i in short]
+        self._trigrams = defaultdict(set)
+        for i, name in enumerate(self._lowered):
+            for trigram in _trigrams(name):
+                self._trigrams[trigram].add(i)
+
+    @classmethod
+    def from_methods_response(cls, methods_response):
+        return cls({name: None for name in reflection.method_names(methods_response)})
+
+    def namespaces(self):
+        """[(namespace, [method names])], both sorted."""
+        grouped = defaultdict(list)
+        for name in self.names:
+            grouped[namespace(name)].append(name)
+        return sorted(grouped.items())
+
+    def method_info(self, method_name):
+        """Stored getMethodInfo response, None when unknown or not stored."""
+        return self.methods.get(method_name)
+
+    def describe(self, method_name):
+        info = self.methods.get(method_name) or {}
+        method = info.get('method', {})
+        return {
+            'name': method_name,
+            'namespace': namespace(method_name),
+            'description': method.get('description', {}).get('_content', ''),
+            'needslogin': bool(method.get('needslogin')),
+            'arguments': [argument['name'] for argument in
+                          info.get('arguments', {}).get('argument', [])],
+            'errors': [int(error['code']) for error in info.get('errors', {}).get('error', [])],
+        }
+
+    def search(self, query, limit=20):
+        """Method names matching query, best matches first."""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        found = []
+        seen = set()
+
+        def add(indexes):
+            for i in indexes:
+                if i not in seen:
+                    seen.add(i)
+                    found.append(self.names[i])
+
+        exact = bisect.bisect_left(self._lowered, query)
+        if exact < len(self._lowered) and self._lowered[exact] == query:
+            add([exact])
+        add(_prefixed(self._lowered, query))
+        add(self._short_indexes[i] for i in _prefixed(self._short_names, query))
+        if len(found) < limit:
+            add(sorted(self._containing(query), key=self.names.__getitem__))
+        return found[:limit]
+
+    def _containing(self, query):
+        if len(query) < 3:
+            return (i for i, name in enumerate(self._lowered) if query in name)
+
+        candidates = set.intersection(*(self._trigrams.get(trigram, set())
+                                        for trigram in _trigrams(query)))
+        return (i for i in candidates if query in self._lowered[i])
+
+    # Persistence
+
+    def to_json(self):
+        return {'version': FORMAT_VERSION, 'built_at': self.built_at, 'methods': self.methods}
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError('Unsupported catalog version {}'.format(data.get('version')))
+        return cls(data['methods'], built_at=data.get('built_at'))
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(self.to_json(), fp, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fp:
+            return cls.from_json(json.load(fp))
+
+
+def build(f, workers=8):
+    """Catalog of every method, descriptors fetched through the reflection cache.
+
+    :return: (Catalog, list of (method_name, error))
+    """
+    stored, errors = reflection.warm(f, workers=workers)
+    failed = {name for name, err in errors}
+    names = reflection.method_names(reflection.get_methods(f))
+    methods = {name: None if name in failed else reflection.get_method_info(f, name)
+               for name in names}
+    return Catalog(methods, built_at=int(time.time())), errors
+
+
+def catalog_path():
+    return settings.FLICKR_METHOD_CATALOG['PATH']
+
+
+def get_catalog():
+    """The saved catalog, loaded once per process, None when not built yet."""
+    global _catalog
+    with _lock:
+        if _catalog is None:
+            try:
+                _catalog = Catalog.load(catalog_path())
+            except FileNotFoundError:
+                return None
+        return _catalog
+
+
+def set_catalog(catalog):
+    global _catalog
+    with _lock:
+        _catalog = catalog
+
+
+def get_methods_catalog(f):
+    """The saved catalog, or one of method names from the cached method list."""
+    return get_catalog() or Catalog.from_methods_response(reflection.get_methods(f))
+
+
+async def aget_methods_catalog(f):
+    """get_methods_catalog for an AsyncFlickrClient."""
+    return get_catalog() or Catalog.from_methods_response(await reflection.aget_methods(f))
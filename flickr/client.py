@@ -0,0 +1,205 @@
+"""Reusable Flickr API clients sharing one pooled HTTP transport.
+
+Building a FlickrAPI per call means a new requests session, and with it a
+TLS handshake, on every view. Here all clients share one keep-alive
+session with retry/backoff. Unauthenticated calls share a single client
+per process; authenticated calls get a small per-token client kept in an
+LRU.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from flickrapi import FlickrAPI, FlickrError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from flickr import instrumentation, quota, response_cache
+
+REST_URL = 'https://api.flickr.com/services/rest/'
+
+DEFAULTS = {
+    'POOL_SIZE': 10,
+    'IDLE_TIMEOUT': 60,
+    'RETRIES': 3,
+    'BACKOFF': 0.5,
+    'MAX_CLIENTS': 256,
+}
+
+
+def client_settings():
+    return dict(DEFAULTS, **getattr(settings, 'FLICKR_CLIENT', {}))
+
+
+class Transport:
+    """Process-wide requests session, recycled after IDLE_TIMEOUT seconds unused."""
+
+    def __init__(self, pool_size, idle_timeout, retries, backoff):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self._adapters = {}
+        self._session = None
+        self._last_used = 0
+        self._lock = threading.Lock()
+
+    def mount(self, prefix, adapter):
+        """Send requests for URLs starting with prefix through adapter,
+        e.g. flickr.fake_flickr.fake_flickr_adapter().
+        """
+        with self._lock:
+            self._adapters[prefix] = adapter
+            if self._session is not None:
+                self._session.mount(prefix, adapter)
+
+    def session(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._session is not None and now - self._last_used > self.idle_timeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._new_session()
+            self._last_used = now
+            return self._session
+
+    def _new_session(self):
+        retry = Retry(total=self.retries, backoff_factor=self.backoff,
+                      status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=False, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.hooks['response'].append(instrumentation.response_hook)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        for prefix, extra_adapter in self._adapters.items():
+            session.mount(prefix, extra_adapter)
+        return session
+
+
+class FlickrClient(FlickrAPI):
+    """FlickrAPI whose HTTP calls go through the shared transport.
+
+    Responses of whitelisted read methods are served from the response cache,
+    upstream calls wait for their share of the quota (see flickr.quota) and
+    every call is measured by flickr.instrumentation.
+    """
+
+    def __init__(self, token=None, transport=None):
+        """
+        :param token: flickr.tokens.StoredToken or None for public calls
+        """
+        super().__init__(settings.FLICKR_KEY, settings.FLICKR_SECRET,
+            token=token.to_flickrapi() if token is not None else None,
+            store_token=False, format='parsed-json')
+        self.REST_URL = getattr(settings, 'FLICKR_REST_URL', REST_URL)
+        oauth_url = getattr(settings, 'FLICKR_OAUTH_URL', None)
+        if oauth_url:
+            self.flickr_oauth.REQUEST_TOKEN_URL = oauth_url + 'request_token'
+            self.flickr_oauth.AUTHORIZE_URL = oauth_url + 'authorize'
+            self.flickr_oauth.ACCESS_TOKEN_URL = oauth_url + 'access_token'
+        self.transport = transport or get_transport()
+        self.scope = 'public' if token is None else token.user_nsid
+
+    def do_flickr_call(self, _method_name, **kwargs):
+        with instrumentation.measure(_method_name) as record:
+            return response_cache.get_cache().cached_call(
+                _method_name, kwargs, self.scope,
+                lambda: self._upstream_call(record, _method_name, **kwargs))
+
+    def _upstream_call(self, record, _method_name, **kwargs):
+        record.cache_hit = False
+        quota.acquire(self.scope)
+        self.flickr_oauth.session = self.transport.session()
+        try:
+            response = super().do_flickr_call(_method_name=_method_name, **kwargs)
+        except requests.RequestException as err:
+            # Connection errors, timeouts and exhausted retries fail like any
+            # other Flickr call, the views only handle FlickrError.
+            raise FlickrError('{}: {}'.format(type(err).__name__, err))
+        record.response_bytes = instrumentation.last_response_bytes()
+        return response
+
+
+class ClientPool:
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self.hits = 0
+        self.misses = 0
+
+        self._public = None
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token=None):
+        with self._lock:
+            if token is None:
+                client = self._public
+            else:
+                client = self._clients.get(token.token)
+                if client is not None:
+                    self._clients.move_to_end(token.token)
+
+            if client is not None:
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            client = FlickrClient(token)
+            if token is None:
+                self._public = client
+            else:
+                self._clients[token.token] = client
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            return client
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'clients': len(self._clients) + (self._public is not None),
+            }
+
+
+_transport = None
+_pool = None
+_init_lock = threading.Lock()
+
+
+def get_transport():
+    global _transport
+    with _init_lock:
+        if _transport is None:
+            options = client_settings()
+            _transport = Transport(options['POOL_SIZE'], options['IDLE_TIMEOUT'],
+                                   options['RETRIES'], options['BACKOFF'])
+        return _transport
+
+
+def _get_pool():
+    global _pool
+    with _init_lock:
+        if _pool is None:
+            _pool = ClientPool(client_settings()['MAX_CLIENTS'])
+        return _pool
+
+
+def get_client(token=None):
+    """Shared client for token, or the public client when token is None."""
+    return _get_pool().get(token)
+
+
+def new_client(token=None):
+    """Unshared client, for flows that mutate OAuth state such as the auth dance."""
+    return FlickrClient(token)
+
+
+def pool_stats():
+    return _get_pool().stats()
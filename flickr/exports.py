@@ -0,0 +1,421 @@
+"""Streaming export of the group pools or favorites of a Flickr user.
+
+    python manage.py export 38954353@N06 groups pools.csv
+    GET /people/38954353@N06/export/favorites.ndjson
+
+Records are written as their pages arrive, so an export holds a page of
+photos, and a Parquet row group, in memory whatever its size. The position
+in an export is the number of records written, which the sources skip to
+resume. A file export keeps it in <output>.checkpoint and continues from
+there when run again, an HTTP export resumes with ?skip=<records received>.
+Resuming assumes the lists did not change meanwhile: photos added to a pool
+or faved since shift the records that follow.
+
+Parquet needs pyarrow. A Parquet file export is a directory of part files,
+checkpointed as each part is completed.
+"""
+import csv
+import glob
+import io
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from flickr.paging import list_items, page_container, walk
+from flickr.sync import PHOTO_EXTRAS
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PER_PAGE': 500,
+    'CHECKPOINT_EVERY': 1000,
+    'ROW_GROUP_SIZE': 10000,
+    'PART_ROWS': 100000,
+    'PROGRESS_EVERY': 5,
+}
+
+PHOTO_FIELDS = (
+    ('id', str), ('owner', str), ('ownername', str), ('title', str),
+    ('secret', str), ('server', str), ('views', int), ('tags', str),
+    ('datetaken', str), ('dateupload', int), ('url_q', str), ('url_z', str),
+)
+GROUP_FIELDS = (('group_id', str), ('group_name', str)) + PHOTO_FIELDS + (('dateadded', int),)
+FAVORITE_FIELDS = PHOTO_FIELDS + (('date_faved', int),)
+
+
+class ExportError(Exception):
+    pass
+
+
+def export_settings():
+    return dict(DEFAULTS, **getattr(settings, 'FLICKR_EXPORT', {}))
+
+
+def record(photo, fields, **extra):
+    """The fields of a photo, typed, missing ones None."""
+    values = dict(photo, **extra)
+    return {name: _convert(values.get(name), kind) for name, kind in fields}
+
+
+def _convert(value, kind):
+    if value is None or value == '':
+        return None
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Sources, generators of records skipping the first skip ones
+
+def group_pool_records(f, userid, skip=0, per_page=500):
+    """Photos of userid in the pool of each of their groups."""
+    for group in list_items(f.people.getGroups(user_id=userid)):
+        if skip:
+            # One small call tells whether the whole pool was exported already.
+            response = f.groups.pools.getPhotos(group_id=group['nsid'], user_id=userid,
+                                                per_page=1)
+            total = int(page_container(response)[0].get('total') or 0)
+            if total <= skip:
+                skip -= total
+                continue
+
+        photos = walk(f.groups.pools.getPhotos, per_page=per_page,
+                      first_page=skip // per_page + 1,
+                      group_id=group['nsid'], user_id=userid, extras=PHOTO_EXTRAS)
+        for photo in itertools.islice(photos, skip % per_page, None):
+            yield record(photo, GROUP_FIELDS, group_id=group['nsid'],
+                         group_name=group.get('name'))
+        skip = 0
+
+
+def favorite_records(f, userid, skip=0, per_page=500):
+    """Favorites of userid, most recently faved first."""
+    photos = walk(f.favorites.getList, per_page=per_page, first_page=skip // per_page + 1,
+                  user_id=userid, extras=PHOTO_EXTRAS)
+    for photo in itertools.islice(photos, skip % per_page, None):
+        yield record(photo, FAVORITE_FIELDS)
+
+
+SOURCES = {
+    'groups': (group_pool_records, GROUP_FIELDS),
+    'favorites': (favorite_records, FAVORITE_FIELDS),
+}
+
+
+# Writers of records to a binary file object
+
+class NDJSONWriter:
+    content_type = 'application/x-ndjson'
+
+    def __init__(self, out, fields, header=True):
+        self.out = out
+
+    def write(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def close(self):
+        pass
+
+
+class CSVWriter:
+    content_type = 'text/csv; charset=utf-8'
+
+    def __init__(self, out, fields, header=True):
+        self.text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+        self.writer = csv.DictWriter(self.text, [name for name, kind in fields])
+        if header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+    def close(self):
+        # Leave out open for its owner.
+        self.text.detach()
+
+
+class ParquetWriter:
+    content_type = 'application/vnd.apache.parquet'
+
+    def __init__(self, out, fields, header=True, row_group_size=None):
+        self.pa, pq = _pyarrow()
+        self.schema = self.pa.schema([(name, self.pa.int64() if kind is int else self.pa.string())
+                                      for name, kind in fields])
+        self.columns = {name: [] for name in self.schema.names}
+        self.rows = 0
+        self.row_group_size = row_group_size or export_settings()['ROW_GROUP_SIZE']
+        self.writer = pq.ParquetWriter(out, self.schema)
+
+    def write(self, record):
+        for name, column in self.columns.items():
+            column.append(record.get(name))
+        self.rows += 1
+        if self.rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pydict(self.columns, schema=self.schema))
+            self.columns = {name: [] for name in self.schema.names}
+            self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Parquet exports need pyarrow: pip install pyarrow')
+    return pyarrow, pyarrow.parquet
+
+
+WRITERS = {
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def writer_class(fmt):
+    """Writer of format fmt, raises ExportError when it cannot be written here."""
+    if fmt not in WRITERS:
+        raise ExportError('Unknown export format {}'.format(fmt))
+    if fmt == 'parquet':
+        _pyarrow()
+    return WRITERS[fmt]
+
+
+class Throughput:
+    """Records per second of an export, passed to report(records, rate) every few seconds."""
+
+    def __init__(self, report=None, every=None):
+        self.report = report
+        self.every = every if every is not None else export_settings()['PROGRESS_EVERY']
+        self.records = 0
+        self.started = self.reported = time.monotonic()
+
+    def add(self):
+        self.records += 1
+        if self.report is not None:
+            now = time.monotonic()
+            if now - self.reported >= self.every:
+                self.reported = now
+                self.report(self.records, self.rate())
+
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    def rate(self):
+        seconds = self.seconds()
+        return self.records / seconds if seconds else 0.0
+
+
+# Streaming
+
+class _Sink(io.RawIOBase):
+    """Write-only file collecting what is written until drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.pending = 0
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.pending += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.pending = 0
+        return data
+
+
+def stream(f, userid, source, fmt, skip=0, chunk_size=64 * 1024, progress=None):
+    """Yield the export as chunks of bytes, e.g. for a StreamingHttpResponse.
+
+    A resumed CSV export has no header line. A resumed Parquet export is a
+    file of its own.
+    """
+    options = export_settings()
+    records, fields = SOURCES[source]
+    sink = _Sink()
+    writer = writer_class(fmt)(sink, fields, header=not skip)
+    throughput = Throughput(progress)
+
+    for item in records(f, userid, skip, per_page=options['PER_PAGE']):
+        writer.write(item)
+        throughput.add()
+        if sink.pending >= chunk_size:
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+    log.info('Exported {} {} records of {} in {:.1f}s, {:.0f} records/s'.format(
+        throughput.records, source, userid, throughput.seconds(), throughput.rate()))
+
+
+# File exports
+
+def format_of(path):
+    """Export format matching the extension of path, ndjson when unknown."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'csv': 'csv', 'parquet': 'parquet'}.get(extension, 'ndjson')
+
+
+def export_file(f, userid, source, fmt, path, restart=False, progress=None):
+    """Export to path, continuing from its checkpoint unless restart.
+
+    :param progress: called with (records written by this run, records/s)
+    :return: dict with the records written in all, by this run, and its rate
+    """
+    options = export_settings()
+    records, fields = SOURCES[source]
+    writer_class(fmt)
+
+    checkpoint_path = path.rstrip(os.sep) + '.checkpoint'
+    export = {'userid': userid, 'source': source, 'format': fmt}
+    state = None if restart else load_checkpoint(checkpoint_path)
+    if state is not None and {key: state.get(key) for key in export} != export:
+        raise ExportError('{} is the checkpoint of another export.'.format(checkpoint_path))
+    if state is not None and state.get('done'):
+        return {'records': state['records'], 'new': 0, 'rate': 0.0}
+
+    skip = state['records'] if state is not None else 0
+    if fmt == 'parquet':
+        target = _PartsTarget(path, fields, options, state)
+    else:
+        target = _FileTarget(path, fmt, fields, options, state)
+    throughput = Throughput(progress)
+
+    written = skip
+    for item in records(f, userid, skip, per_page=options['PER_PAGE']):
+        target.write(item)
+        written += 1
+        throughput.add()
+        position = target.checkpoint()
+        if position is not None:
+            save_checkpoint(checkpoint_path, dict(export, records=written, **position))
+
+    save_checkpoint(checkpoint_path, dict(export, records=written, done=True, **target.close()))
+    log.info('Exported {} {} records of {} to {} in {:.1f}s, {:.0f} records/s'.format(
+        throughput.records, source, userid, path, throughput.seconds(), throughput.rate()))
+    return {'records': written, 'new': throughput.records, 'rate': throughput.rate()}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(state, fp, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class _FileTarget:
+    """NDJSON or CSV file, checkpointed every CHECKPOINT_EVERY records."""
+
+    def __init__(self, path, fmt, fields, options, state):
+        if state is None:
+            self.out = open(path, 'wb')
+        else:
+            # Drop what was written after the checkpoint.
+            self.out = open(path, 'r+b')
+            self.out.truncate(state['bytes'])
+            self.out.seek(state['bytes'])
+        self.writer = WRITERS[fmt](self.out, fields, header=state is None)
+        self.every = options['CHECKPOINT_EVERY']
+        self.since = 0
+
+    def write(self, item):
+        self.writer.write(item)
+        self.since += 1
+
+    def checkpoint(self):
+        if self.since < self.every:
+            return None
+        self.since = 0
+        self.out.flush()
+        os.fsync(self.out.fileno())
+        return {'bytes': self.out.tell()}
+
+    def close(self):
+        self.writer.close()
+        self.out.flush()
+        position = {'bytes': self.out.tell()}
+        self.out.close()
+        return position
+
+
+class _PartsTarget:
+    """Directory of Parquet files of PART_ROWS records, checkpointed as each is closed."""
+
+    def __init__(self, directory, fields, options, state):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fields = fields
+        self.part_rows = options['PART_ROWS']
+        self.row_group_size = options['ROW_GROUP_SIZE']
+        self.parts = state['parts'] if state is not None else 0
+        for path in glob.glob(os.path.join(directory, 'part-*.parquet')):
+            # Parts after the checkpoint are incomplete.
+            if int(os.path.basename(path)[5:-8]) >= self.parts:
+                os.remove(path)
+
+        self.out = self.writer = None
+        self.rows = 0
+        self.closed_part = False
+
+    def write(self, item):
+        if self.writer is None:
+            path = os.path.join(self.directory, 'part-{:05d}.parquet'.format(self.parts))
+            self.out = open(path, 'wb')
+            self.writer = ParquetWriter(self.out, self.fields, row_group_size=self.row_group_size)
+        self.writer.write(item)
+        self.rows += 1
+        if self.rows >= self.part_rows:
+            self._close_part()
+
+    def _close_part(self):
+        self.writer.close()
+        self.out.close()
+        self.out = self.writer = None
+        self.rows = 0
+        self.parts += 1
+        self.closed_part = True
+
+    def checkpoint(self):
+        if not self.closed_part:
+            return None
+        self.closed_part = False
+        return {'parts': self.parts}
+
+    def close(self):
+        if self.writer is not None:
+            self._close_part()
+        return {'parts': self.parts}
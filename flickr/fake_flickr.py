@@ -0,0 +1,407 @@
+"""Local stand-in for the Flickr REST and OAuth endpoints.
+
+Serves the methods this site uses from deterministic generated data, or
+from recorded responses (one <method name>.json file per method in a
+fixtures directory), with configurable latency and error injection.
+Counts calls per method, so benchmarks can report upstream calls.
+
+As a local HTTP server:
+
+    python -m flickr.fake_flickr --port 8765 --latency 0.1
+
+then set FLICKR_REST_URL=http://127.0.0.1:8765/services/rest/ and
+FLICKR_OAUTH_URL=http://127.0.0.1:8765/services/oauth/.
+
+In-process, without sockets, through the shared transport of flickr.client:
+
+    transport.mount(settings.FLICKR_REST_URL, fake_flickr_adapter(FakeFlickr()))
+
+Only the standard library is needed, so the server runs without Django.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+METHOD_NOT_FOUND = (112, 'Method "{}" not found')
+SERVICE_UNAVAILABLE = (105, 'Service currently unavailable')
+USER_NOT_FOUND = (1, 'User not found')
+
+
+class FlickrFail(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _rng(*parts):
+    seed = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return random.Random(seed)
+
+
+class FakeFlickr:
+    """Request handling independent of the transport."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, http_error_rate=0.0,
+                 fixtures_dir=None, groups_per_user=25, photos_per_pool=100,
+                 favorites_per_user=500, photos_per_user=500, contacts_per_user=100):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.fixtures_dir = fixtures_dir
+        self.groups_per_user = groups_per_user
+        self.photos_per_pool = photos_per_pool
+        self.favorites_per_user = favorites_per_user
+        self.photos_per_user = photos_per_user
+        self.contacts_per_user = contacts_per_user
+
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._request_tokens = {}
+
+        self.methods = {
+            'flickr.reflection.getMethods': self.get_methods,
+            'flickr.reflection.getMethodInfo': self.get_method_info,
+            'flickr.people.getGroups': self.get_groups,
+            'flickr.people.getInfo': self.get_person_info,
+            'flickr.people.getPhotos': self.get_person_photos,
+            'flickr.people.getPublicPhotos': self.get_person_photos,
+            'flickr.groups.pools.getPhotos': self.get_pool_photos,
+            'flickr.urls.lookupUser': self.lookup_user,
+            'flickr.favorites.getList': self.get_favorites,
+            'flickr.contacts.getPublicList': self.get_contacts,
+        }
+
+    # Transport independent entry points
+
+    def call(self, params):
+        """Handle one REST call, return (HTTP status, response dict)."""
+        method_name = params.get('method', '')
+        self._count(method_name)
+        self._delay()
+
+        rng = random.random()
+        if rng < self.http_error_rate:
+            return 503, {'stat': 'fail', 'code': 0, 'message': 'Service Unavailable'}
+        try:
+            if rng < self.http_error_rate + self.error_rate:
+                raise FlickrFail(*SERVICE_UNAVAILABLE)
+            response = self._recorded(method_name)
+            if response is None:
+                handler = self.methods.get(method_name)
+                if handler is None:
+                    raise FlickrFail(METHOD_NOT_FOUND[0], METHOD_NOT_FOUND[1].format(method_name))
+                response = dict(handler(params), stat='ok')
+        except FlickrFail as err:
+            return 200, {'stat': 'fail', 'code': err.code, 'message': err.message}
+        return 200, response
+
+    def oauth(self, endpoint, params):
+        """Handle an OAuth endpoint, return (HTTP status, headers, body)."""
+        self._count('oauth.' + endpoint)
+        if endpoint == 'request_token':
+            token = uuid.uuid4().hex
+            self._request_tokens[token] = params.get('oauth_callback', 'oob')
+            body = urlencode({'oauth_callback_confirmed': 'true', 'oauth_token': token,
+                              'oauth_token_secret': uuid.uuid4().hex})
+            return 200, {}, body
+        if endpoint == 'authorize':
+            token = params.get('oauth_token')
+            callback = self._request_tokens.get(token, 'oob')
+            separator = '&' if '?' in callback else '?'
+            location = callback + separator + urlencode({'oauth_token': token,
+                                                         'oauth_verifier': uuid.uuid4().hex})
+            return 302, {'Location': location}, ''
+        if endpoint == 'access_token':
+            body = urlencode({'fullname': 'Fake User', 'oauth_token': uuid.uuid4().hex,
+                              'oauth_token_secret': uuid.uuid4().hex,
+                              'user_nsid': '38954353@N06', 'username': 'fakeuser'})
+            return 200, {}, body
+        return 404, {}, ''
+
+    def stats(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def _delay(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _recorded(self, method_name):
+        if not self.fixtures_dir:
+            return None
+        try:
+            with open(os.path.join(self.fixtures_dir, method_name + '.json')) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+
+    # Methods
+
+    def get_methods(self, params):
+        return {'methods': {'method': [{'_content': name} for name in sorted(self.methods)]}}
+
+    def get_method_info(self, params):
+        method_name = params.get('method_name')
+        if method_name not in self.methods:
+            raise FlickrFail(METHOD_NOT_FOUND[0], METHOD_NOT_FOUND[1].format(method_name))
+
+        arguments = [('api_key', 0, 'Your API application key.')]
+        arguments += [(name, 1, 'Fake argument {}.'.format(name))
+                      for name in ('user_id', 'group_id', 'extras', 'per_page', 'page',
+                                   'min_fave_date', 'min_upload_date')]
+        return {
+            'method': {'name': method_name, 'needslogin': 0, 'needssigning': 0,
+                       'requiredperms': 0, 'description': {'_content': 'Fake method.'}},
+            'arguments': {'argument': [{'name': name, 'optional': optional, '_content': text}
+                                       for name, optional, text in arguments]},
+            'errors': {'error': [{'code': 100, 'message': 'Invalid API Key',
+                                  '_content': 'The API key passed was not valid.'}]},
+        }
+
+    def get_groups(self, params):
+        userid = self._user_id(params)
+        groups = [self._group(userid, i) for i in range(self.groups_per_user)]
+        return {'groups': {'group': groups}}
+
+    def get_person_info(self, params):
+        userid = self._user_id(params)
+        return {'person': {'id': userid, 'nsid': userid,
+                           'username': {'_content': 'user' + userid.split('@')[0]},
+                           'photos': {'count': {'_content': self.photos_per_user}}}}
+
+    def get_person_photos(self, params):
+        userid = self._user_id(params)
+        return self._photo_page(params, self.photos_per_user,
+                                lambda i: self._photo(('upload', userid), i, owner=userid),
+                                since_key='min_upload_date', date_key='dateupload')
+
+    def get_pool_photos(self, params):
+        groupid = params.get('group_id', '')
+        return self._photo_page(params, self.photos_per_pool,
+                                lambda i: self._photo(('pool', groupid), i))
+
+    def get_favorites(self, params):
+        userid = self._user_id(params)
+        return self._photo_page(params, self.favorites_per_user,
+                                lambda i: self._photo(('fave', userid), i),
+                                since_key='min_fave_date', date_key='date_faved')
+
+    def get_contacts(self, params):
+        userid = self._user_id(params)
+        page, per_page = self._paging(params)
+        total = self.contacts_per_user
+        start = (page - 1) * per_page
+        contacts = [{'nsid': '{}@N0{}'.format(10000000 + _rng(userid, 'contact', i).randrange(10 ** 7),
+                                              i % 10),
+                     'username': 'contact{}'.format(i)}
+                    for i in range(start, min(start + per_page, total))]
+        return {'contacts': self._container(page, per_page, total, contact=contacts)}
+
+    def lookup_user(self, params):
+        path = urlparse(params.get('url', '')).path.strip('/').split('/')
+        if len(path) < 2 or not path[1]:
+            raise FlickrFail(*USER_NOT_FOUND)
+        alias = path[1]
+        nsid = alias if '@' in alias else '{}@N0{}'.format(
+            10000000 + _rng('alias', alias).randrange(10 ** 7), len(alias) % 10)
+        return {'user': {'id': nsid, 'username': {'_content': alias}}}
+
+    # Data
+
+    def _user_id(self, params):
+        userid = params.get('user_id')
+        if not userid:
+            raise FlickrFail(*USER_NOT_FOUND)
+        return userid
+
+    def _paging(self, params):
+        page = max(1, int(params.get('page') or 1))
+        per_page = min(500, max(1, int(params.get('per_page') or 100)))
+        return page, per_page
+
+    def _container(self, page, per_page, total, **items):
+        pages = max(1, -(-total // per_page))
+        return dict(page=page, pages=pages, perpage=per_page, total=total, **items)
+
+    def _photo_page(self, params, total, make_photo, since_key=None, date_key='dateadded'):
+        page, per_page = self._paging(params)
+        photos = (make_photo(i) for i in range(total))
+        if since_key and params.get(since_key):
+            since = int(params[since_key])
+            photos = (photo for photo in photos if int(photo['dateadded']) >= since)
+        photos = list(photos)
+
+        start = (page - 1) * per_page
+        page_photos = photos[start:start + per_page]
+        for photo in page_photos:
+            photo[date_key] = photo.pop('dateadded')
+        return {'photos': self._container(page, per_page, len(photos), photo=page_photos)}
+
+    def _group(self, userid, index):
+        rng = _rng(userid, 'group', index)
+        nsid = '{}@N2{}'.format(1000000 + rng.randrange(10 ** 7), index % 10)
+        return {'nsid': nsid, 'name': 'Group {} of {}'.format(index, userid),
+                'iconfarm': 1, 'iconserver': str(rng.randrange(1, 9999)),
+                'admin': 0, 'eighteenplus': 0, 'invitation_only': 0,
+                'members': str(rng.randrange(10, 100000)),
+                'pool_count': str(self.photos_per_pool)}
+
+    def _photo(self, parts, index, owner=None):
+        rng = _rng(*parts, index)
+        owner = owner or '{}@N0{}'.format(10000000 + rng.randrange(10 ** 7), rng.randrange(10))
+        # Newest first, one photo an hour.
+        dateadded = 1500000000 - 3600 * index
+        return {'id': str(20000000000 + rng.randrange(10 ** 10)), 'owner': owner,
+                'secret': '{:010x}'.format(rng.getrandbits(40)),
+                'server': str(rng.randrange(1000, 9999)), 'farm': rng.randrange(1, 9),
+                'title': 'Photo {}'.format(index), 'ispublic': 1, 'isfriend': 0,
+                'isfamily': 0, 'ownername': 'owner' + owner.split('@')[0],
+                'views': str(rng.randrange(0, 100000)), 'tags': 'fake photo',
+                'dateadded': str(dateadded)}
+
+
+# HTTP server
+
+class FakeFlickrHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def do_GET(self):
+        parts = urlparse(self.path)
+        self._dispatch(parts.path, dict(parse_qsl(parts.query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        parts = urlparse(self.path)
+        params = dict(parse_qsl(parts.query))
+        params.update(parse_qsl(body))
+        self._dispatch(parts.path, params)
+
+    def _dispatch(self, path, params):
+        if path.startswith('/services/rest'):
+            status, response = self.fake.call(params)
+            self._send(status, {'Content-Type': 'application/json'}, json.dumps(response))
+        elif path.startswith('/services/oauth/'):
+            status, headers, body = self.fake.oauth(path.rsplit('/', 1)[-1], params)
+            self._send(status, dict(headers, **{'Content-Type': 'text/plain'}), body)
+        elif path == '/stats':
+            self._send(200, {'Content-Type': 'application/json'}, json.dumps(self.fake.stats()))
+        elif path == '/stats/reset':
+            self.fake.reset()
+            self._send(204, {}, '')
+        else:
+            self._send(404, {}, '')
+
+    def _send(self, status, headers, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(fake, host='127.0.0.1', port=8765):
+    handler = type('Handler', (FakeFlickrHandler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(fake, host='127.0.0.1', port=0):
+    """Start a server on a daemon thread, return (server, REST URL)."""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://{}:{}/services/rest/'.format(host, server.server_address[1])
+    return server, url
+
+
+# In-process transport
+
+def fake_flickr_adapter(fake):
+    """requests transport adapter answering from fake without any socket."""
+    from requests.adapters import BaseAdapter
+    from requests.models import Response
+
+    class Adapter(BaseAdapter):
+        def send(self, request, **kwargs):
+            body = request.body or ''
+            if isinstance(body, bytes):
+                body = body.decode('utf-8')
+            parts = urlparse(request.url)
+            params = dict(parse_qsl(parts.query))
+            params.update(parse_qsl(body))
+
+            response = Response()
+            if '/services/oauth/' in parts.path:
+                status, headers, content = fake.oauth(parts.path.rsplit('/', 1)[-1], params)
+            else:
+                status, data = fake.call(params)
+                headers, content = {'Content-Type': 'application/json'}, json.dumps(data)
+            response.status_code = status
+            response.headers.update(headers)
+            response._content = content.encode('utf-8')
+            response.encoding = 'utf-8'
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return Adapter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Flickr API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every call')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many extra random seconds per call')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with stat=fail')
+    parser.add_argument('--http-error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with HTTP 503')
+    parser.add_argument('--fixtures', help='directory of recorded <method>.json responses')
+    parser.add_argument('--groups', type=int, default=25, help='groups per user')
+    parser.add_argument('--photos', type=int, default=100, help='photos per group pool')
+    args = parser.parse_args()
+
+    fake = FakeFlickr(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      http_error_rate=args.http_error_rate, fixtures_dir=args.fixtures,
+                      groups_per_user=args.groups, photos_per_pool=args.photos)
+    server = make_server(fake, args.host, args.port)
+    print('Fake Flickr on http://{}:{}/services/rest/'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
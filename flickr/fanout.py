@@ -0,0 +1,71 @@
+"""Concurrent fetching of group photo pools."""
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+from flickrapi import FlickrError
+
+from flickr import quota
+
+log = logging.getLogger(__name__)
+
+
+def group_pool_photos(f, userid, groupid):
+    response = f.groups.pools.getPhotos(group_id=groupid, user_id=userid, extras='views')
+    return response['photos']['photo']
+
+
+def fetch_group_pools(f, userid, groups, workers=8, timeout=10, fetch=group_pool_photos):
+    """Fetch the pools of all groups concurrently.
+
+    Returns an iterator of (group, photos, error) in completion order, photos
+    being what fetch(f, userid, groupid) returned. A group whose fetch raises
+    or is still running after timeout seconds is yielded with no photos and
+    the error, so one bad group does not sink the page. The calls are made
+    with the fan-out quota priority.
+
+    The calls start right away, not when the iterator is first consumed, so
+    they are made in the context of the caller, e.g. for the quota user of
+    a request whose response streams the results.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    # Worker threads do not inherit context variables, such as the call
+    # summary of the current request, so each call runs in a copy.
+    context = contextvars.copy_context()
+    context.run(quota.bind, quota.FANOUT)
+    futures = {executor.submit(context.copy().run, fetch,
+                               f, userid, group['nsid']): group
+               for group in groups}
+    return _completed(executor, futures, timeout)
+
+
+def _completed(executor, futures, timeout):
+    pending = set(futures)
+
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            yield _result(future, futures[future])
+    except TimeoutError:
+        for future in pending:
+            group = futures[future]
+            if future.done():
+                yield _result(future, group)
+            else:
+                future.cancel()
+                log.error('Timed out fetching pool of {}'.format(group['nsid']))
+                yield group, [], TimeoutError(group['nsid'])
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _result(future, group):
+    try:
+        return group, future.result(), None
+    except FlickrError as err:
+        log.error('{} {}'.format(err, group.get('name')))
+        return group, [], err
+    except Exception as err:
+        # A bug in fetch or a template error, still only this group's loss.
+        log.exception('Failed fetching pool of {}'.format(group['nsid']))
+        return group, [], err
@@ -1,6 +1,15 @@
+from bisect import bisect_right
+
 SIZES = {75: 's', 150: 'q', 100: 't', 240: 'm', 320: 'n',
          640: 'z', 800: 'c', 1024: 'b', 1600: 'h', 2048: 'k'}
 
+# Longest sides in ascending order and their suffixes, for bisecting.
+_SIDES = sorted(SIZES)
+_SUFFIXES = [SIZES[side] for side in _SIDES]
+
+_URL_TEMPLATE = 'https://farm%s.staticflickr.com/%s/%s_%s_{}.jpg'
+_URL_TEMPLATES = {suffix: _URL_TEMPLATE.format(suffix) for suffix in _SUFFIXES}
+
 
 def photo_url(photo_dict, size_suffix='z', longest_side=None):
     """
@@ -10,35 +19,47 @@ def photo_url(photo_dict, size_suffix='z', longest_side=None):
                          'id': '30014555241',
                          'secret': 'cc74e7f525',
                          'server': '5631',}
+                       When the photo carries the url_<size_suffix> extra,
+                       that URL is returned as is.
     :param size_suffix:
     :return:
     """
     if longest_side:
         size_suffix = _get_size_suffix(int(longest_side))
 
-    farm = photo_dict['farm']
-    photoid = photo_dict['id']
-    secret = photo_dict['secret']
-    server = photo_dict['server']
+    return _build_url(photo_dict, size_suffix, _url_template(size_suffix))
 
-    url_template = ('https://farm{farmid}.staticflickr.com/'
-                    '{serverid}/{photoid}_{secret}_{size_suffix}.jpg')
 
-    url = url_template.format(photoid=photoid, serverid=server,
-                              farmid=farm, secret=secret,
-                              size_suffix=size_suffix)
-    return url
+def photo_urls(photos, size_suffix='z', longest_side=None):
+    """Batch version of photo_url, resolving the size once for all photos."""
+    if longest_side:
+        size_suffix = _get_size_suffix(int(longest_side))
+
+    template = _url_template(size_suffix)
+    return [_build_url(photo, size_suffix, template) for photo in photos]
+
+
+def _build_url(photo_dict, size_suffix, template):
+    url = photo_dict.get('url_' + size_suffix)
+    if url:
+        return url
+    return template % (photo_dict['farm'], photo_dict['server'],
+                       photo_dict['id'], photo_dict['secret'])
+
+
+def _url_template(size_suffix):
+    template = _URL_TEMPLATES.get(size_suffix)
+    if template is None:
+        template = _URL_TEMPLATE.format(size_suffix)
+    return template
 
 
 def _get_size_suffix(longest_side):
-    if longest_side in SIZES:
-        return SIZES[longest_side]
-
-    desc_ordered_sizes = sorted(SIZES.keys(), reverse=True)
-    for size in desc_ordered_sizes:
-        if longest_side >= size:
-            return SIZES[size]
-    return SIZES[size]
+    """Suffix of the largest size not longer than longest_side,
+    or of the smallest size when longest_side is below all of them.
+    """
+    index = bisect_right(_SIDES, longest_side) - 1
+    return _SUFFIXES[max(index, 0)]
 
 
 def profile_url(userid):
@@ -1,3 +1,7 @@
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+
 from django import forms
 
 
@@ -7,30 +11,80 @@ class PeopleForm(forms.Form):
     page = forms.IntegerField(min_value=1, required=False)
 
 
-class FlickrForm(forms.Form):
+class FlickrDateField(forms.DateTimeField):
+    """Date argument, entered as a datetime or a unix timestamp.
+
+    Flickr takes taken dates as MySQL datetimes and every other date as a
+    unix timestamp, so the cleaned value is already in the right format.
+    """
+
     def __init__(self, *args, **kwargs):
-        extra = kwargs.pop('extra')
+        self.mysql_datetime = kwargs.pop('mysql_datetime', False)
         super().__init__(*args, **kwargs)
 
-        arguments = extra['arguments']['argument']
-        for argument in arguments:
-            name = argument['name']
-            self.fields[name] = forms.CharField()
-            self.fields[name].help_text = argument['_content']
-            self.fields[name].required = not argument['optional']
+    def to_python(self, value):
+        if isinstance(value, str) and value.strip().isdigit():
+            return datetime.fromtimestamp(int(value), timezone.utc)
+        return super().to_python(value)
+
+    def clean(self, value):
+        value = super().clean(value)
+        if value is None:
+            return None
+        if self.mysql_datetime:
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return int(value.timestamp())
 
-        try:
-            self.fields['api_key'].required = False
-        except KeyError:
-            pass
 
+class FlickrForm(forms.Form):
     def clean(self):
-        """Remove keys with corresponding empty values '' from cleaned_data
+        """Remove keys with corresponding empty values '' or None from cleaned_data
         Fixes bug: if argument max_fave_date is '', no errors are thrown but the results are empty.
         """
         cleaned_data = super().clean()
         clone = cleaned_data.copy()
         for key, value in clone.items():
-            if value == '':
+            if value == '' or value is None:
                 del cleaned_data[key]
         return cleaned_data
+
+
+INTEGER_ARGUMENTS = {'page', 'per_page'}
+DATE_ARGUMENT = re.compile(r'^(min|max)_\w+_date$')
+
+_form_classes = {}
+
+
+def flickr_form_class(method_name, load_method_info):
+    """FlickrForm subclass with one field per argument of method_name.
+
+    Classes are built once from the reflection data returned by
+    load_method_info() and memoized, later calls need no reflection call.
+    """
+    form_class = _form_classes.get(method_name)
+    if form_class is None:
+        form_class = _build_form_class(method_name, load_method_info())
+        _form_classes[method_name] = form_class
+    return form_class
+
+
+def _build_form_class(method_name, method_info):
+    fields = OrderedDict()
+    for argument in method_info['arguments']['argument']:
+        name = argument['name']
+        fields[name] = _argument_field(name, help_text=argument['_content'],
+                                       required=not argument['optional'])
+
+    if 'api_key' in fields:
+        fields['api_key'].required = False
+
+    class_name = 'FlickrForm_' + method_name.replace('.', '_')
+    return type(FlickrForm)(class_name, (FlickrForm,), fields)
+
+
+def _argument_field(name, **kwargs):
+    if name in INTEGER_ARGUMENTS:
+        return forms.IntegerField(min_value=1, **kwargs)
+    if DATE_ARGUMENT.match(name):
+        return FlickrDateField(mysql_datetime=name.endswith('_taken_date'), **kwargs)
+    return forms.CharField(**kwargs)
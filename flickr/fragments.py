@@ -0,0 +1,232 @@
+"""Cache of rendered template fragments.
+
+A group gallery renders up to 500 photos, so the HTML of a group is kept
+keyed on (groupid, userid, scope, pool fingerprint, size). The scope is the
+one of the client that fetched the pool, 'public' or the NSID of the user
+whose token it used, since a token can see more. The fingerprint is the
+pool total and the date its newest photo was added: a photo added to or
+removed from the pool changes the fingerprint, and with it the key.
+
+Templates cache any block with the cache tag, nothing is stored when one
+of the key parts is None. Only what is rendered from Flickr data goes in
+the block, e.g. not a group name posted by the browser:
+
+    {% cache 'group', groupid, userid, scope, fingerprint, size_suffix %}...{% endcache %}
+
+Views call group_fragment(), which also remembers the latest fingerprint of
+each pool. For FRESH seconds after a pool was checked its fragment is served
+without calling Flickr; after that a single photo is fetched to compare
+fingerprints, and the whole pool only when they differ.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from flickrapi import FlickrError
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+import flickr.flickrutils
+from flickr import response_cache, steps
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'memory',
+    'LOCATION': None,
+    'MAX_ENTRIES': 256,
+    'TTL': 24 * 60 * 60,
+    'FRESH': 60,
+}
+
+DEFAULT_SIZE = 'z'
+
+
+def make_key(*parts):
+    raw = json.dumps([str(part) for part in parts])
+    return 'flickr:fragment:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class FragmentCache:
+    def __init__(self, backend, ttl=DEFAULTS['TTL'], fresh=DEFAULTS['FRESH']):
+        self.backend = backend
+        self.ttl = ttl
+        self.fresh = fresh
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        html = self.backend.get(key)
+        self.count('hits' if html is not None else 'misses')
+        return html
+
+    def set(self, key, html):
+        self.backend.set(key, str(html), self.ttl)
+
+    def fragment(self, parts, render):
+        """Cached render() for the key parts, render() every time if a part is None."""
+        if any(part is None for part in parts):
+            return render()
+
+        key = make_key(*parts)
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.set(key, html)
+        return html
+
+    def latest(self, *parts):
+        """(checked_at, fingerprint) last remembered for parts, or None."""
+        return self.backend.get(make_key('latest', *parts))
+
+    def remember(self, fingerprint, *parts):
+        self.backend.set(make_key('latest', *parts), (time.time(), fingerprint), self.ttl)
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def clear(self):
+        self.backend.clear()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        options = dict(DEFAULTS, **getattr(settings, 'FLICKR_FRAGMENT_CACHE', {}))
+        backend = response_cache.BACKENDS[options['BACKEND']](
+            options['LOCATION'], options['MAX_ENTRIES'])
+        _cache = FragmentCache(backend, ttl=options['TTL'], fresh=options['FRESH'])
+    return _cache
+
+
+def stats():
+    return get_cache().stats()
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja2 {% cache part, ... %} ... {% endcache %} tag."""
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_cached', [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached(self, parts, caller):
+        return Markup(get_cache().fragment(parts, caller))
+
+
+# Group galleries
+
+def pool_fingerprint(response):
+    """Pool total and date added of the newest photo, pools are sorted newest first."""
+    photos = response['photos']
+    newest = photos['photo'][0].get('dateadded') if photos['photo'] else None
+    return '{}-{}'.format(photos.get('total'), newest)
+
+
+def group_pool(f, userid, groupid, per_page=None):
+    return f.groups.pools.getPhotos(group_id=groupid, user_id=userid,
+                                    extras='views', per_page=per_page)
+
+
+def render_group(request, scope, userid, groupid, groupname, response=None, size=DEFAULT_SIZE):
+    """Render _group.html for a pool response, no photos and uncached without one.
+
+    :param scope: scope of the client that fetched the response
+    """
+    fingerprint = None
+    photos = []
+    if response is not None:
+        fingerprint = pool_fingerprint(response)
+        photos = response['photos']['photo']
+        get_cache().remember(fingerprint, groupid, userid, scope, size)
+
+    context = {
+        'groupid': groupid,
+        'groupname': groupname,
+        'userid': userid,
+        'scope': scope,
+        'fingerprint': fingerprint,
+        'size_suffix': size,
+        'photos': photos,
+        'utils': flickr.flickrutils,
+    }
+    return render_to_string('flickr/_group.html', context, request)
+
+
+def _render_cached(request, groupname, gallery):
+    """_group.html around a gallery from the cache."""
+    context = {'groupname': groupname, 'gallery': Markup(gallery)}
+    return render_to_string('flickr/_group.html', context, request)
+
+
+def _fresh_gallery(scope, userid, groupid, size):
+    """(cached gallery or None, fingerprint to check it against or None)."""
+    cache = get_cache()
+    latest = cache.latest(groupid, userid, scope, size)
+    if latest is None:
+        return None, None
+
+    checked_at, fingerprint = latest
+    if time.time() - checked_at < cache.fresh:
+        return cache.get(make_key('group', groupid, userid, scope, fingerprint, size)), None
+    return None, fingerprint
+
+
+def _revalidated(scope, userid, groupid, size, fingerprint, probe):
+    if pool_fingerprint(probe) != fingerprint:
+        return None
+    cache = get_cache()
+    gallery = cache.get(make_key('group', groupid, userid, scope, fingerprint, size))
+    if gallery is not None:
+        cache.count('revalidated')
+        cache.remember(fingerprint, groupid, userid, scope, size)
+    return gallery
+
+
+def _group_fragment_steps(f, request, userid, groupid, groupname, size):
+    gallery, fingerprint = _fresh_gallery(f.scope, userid, groupid, size)
+    if gallery is not None:
+        return _render_cached(request, groupname, gallery)
+
+    response = None
+    try:
+        if fingerprint is not None:
+            probe = yield lambda: group_pool(f, userid, groupid, per_page=1)
+            gallery = _revalidated(f.scope, userid, groupid, size, fingerprint, probe)
+            if gallery is not None:
+                return _render_cached(request, groupname, gallery)
+        response = yield lambda: group_pool(f, userid, groupid)
+    except FlickrError as err:
+        log.error('{} {}'.format(err, groupname))
+
+    return render_group(request, f.scope, userid, groupid, groupname, response, size)
+
+
+def group_fragment(f, request, userid, groupid, groupname, size=DEFAULT_SIZE):
+    """Rendered _group.html of a pool, from the cache while its fingerprint holds."""
+    return steps.run(_group_fragment_steps(f, request, userid, groupid, groupname, size))
+
+
+async def agroup_fragment(f, request, userid, groupid, groupname, size=DEFAULT_SIZE):
+    """group_fragment for an AsyncFlickrClient."""
+    return await steps.arun(_group_fragment_steps(f, request, userid, groupid, groupname, size))
@@ -0,0 +1,113 @@
+"""Bulk ingestion of favorites and follow edges.
+
+Items are streamed in, grouped into batches of FLICKR_INGEST_BATCH_SIZE
+and written with one INSERT ... ON CONFLICT statement per batch. Each batch
+reports how many rows were inserted, updated, and skipped because they were
+already up to date. Favorites are written with the info keys that
+flickr.queries filters on copied to their own columns, as Fav.save() does.
+Write favorites in bulk through here, bulk_create() would leave those
+columns empty.
+"""
+import itertools
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from flickr.models import Person, Fav, Following, photo_columns
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def batches(items, batch_size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _batch_size(batch_size):
+    return batch_size or getattr(settings, 'FLICKR_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def ensure_people(nsids):
+    sql = ('INSERT INTO {} (flickrid, photos) VALUES %s '
+           'ON CONFLICT (flickrid) DO NOTHING').format(Person._meta.db_table)
+    with connection.cursor() as cursor:
+        execute_values(cursor, sql, [(nsid, '[]') for nsid in set(nsids)],
+                       template='(%s, %s::jsonb)')
+
+
+def upsert_favs(nsid, photos, batch_size=None):
+    """Insert or update the Fav rows of user nsid from an iterable of photo dicts.
+
+    :return: list of per batch reports {'inserted': n, 'updated': n, 'skipped': n}
+    """
+    sql = ('INSERT INTO {table} (user_id, photoid, info, views, dateupload, owner, tags) '
+           'VALUES %s '
+           'ON CONFLICT (user_id, photoid) DO UPDATE SET info = EXCLUDED.info, '
+           'views = EXCLUDED.views, dateupload = EXCLUDED.dateupload, '
+           'owner = EXCLUDED.owner, tags = EXCLUDED.tags '
+           'WHERE {table}.info IS DISTINCT FROM EXCLUDED.info '
+           'RETURNING (xmax = 0) AS inserted').format(table=Fav._meta.db_table)
+
+    ensure_people([nsid])
+    reports = []
+    for batch in batches(photos, _batch_size(batch_size)):
+        # A statement may not touch the same row twice, the last copy wins.
+        rows = {photo['id']: _fav_row(nsid, photo) for photo in batch}
+        with transaction.atomic(), connection.cursor() as cursor:
+            results = execute_values(cursor, sql, list(rows.values()),
+                                     template='(%s, %s, %s::jsonb, %s, %s, %s, %s::text[])',
+                                     page_size=len(rows), fetch=True)
+        inserted = sum(1 for (is_insert,) in results if is_insert)
+        reports.append(_report(len(batch), inserted, len(results) - inserted))
+    return reports
+
+
+def _fav_row(nsid, photo):
+    columns = photo_columns(photo)
+    return (nsid, photo['id'], json.dumps(photo), columns['views'], columns['dateupload'],
+            columns['owner'], columns['tags'])
+
+
+def upsert_following(follower, followed_nsids, batch_size=None):
+    """Insert the missing Following edges from follower to each followed NSID.
+
+    :return: list of per batch reports {'inserted': n, 'updated': 0, 'skipped': n}
+    """
+    sql = ('INSERT INTO {} (follower_id, followed_id) VALUES %s '
+           'ON CONFLICT (follower_id, followed_id) DO NOTHING '
+           'RETURNING 1').format(Following._meta.db_table)
+
+    ensure_people([follower])
+    reports = []
+    for batch in batches(followed_nsids, _batch_size(batch_size)):
+        rows = {(follower, nsid) for nsid in batch}
+        with transaction.atomic(), connection.cursor() as cursor:
+            ensure_people(batch)
+            results = execute_values(cursor, sql, list(rows),
+                                     page_size=len(rows), fetch=True)
+        reports.append(_report(len(batch), len(results), 0))
+    return reports
+
+
+def totals(reports):
+    keys = ('inserted', 'updated', 'skipped')
+    return {key: sum(report[key] for report in reports) for key in keys}
+
+
+def _report(size, inserted, updated):
+    report = {
+        'inserted': inserted,
+        'updated': updated,
+        'skipped': size - inserted - updated,
+    }
+    log.debug('Batch of {}: {}'.format(size, report))
+    return report
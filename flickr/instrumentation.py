@@ -0,0 +1,197 @@
+"""Timing, counts and payload sizes of Flickr calls.
+
+Every call made through flickr.client or flickr.aio is measured with
+measure(). Calls are added to the summary of the current request, sent
+back in a Server-Timing header by ServerTimingMiddleware, and to
+process-wide histograms that the metrics view exports in the Prometheus
+text format.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+_request_calls = contextvars.ContextVar('flickr_request_calls', default=None)
+_local = threading.local()
+
+
+class CallRecord:
+    def __init__(self, method_name):
+        self.method_name = method_name
+        self.cache_hit = True
+        self.response_bytes = 0
+        self.error_code = None
+        self.seconds = 0.0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.calls = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, record):
+        with self._lock:
+            self.latency[record.method_name].observe(record.seconds)
+            cache = 'hit' if record.cache_hit else 'miss'
+            self.calls[record.method_name, cache] += 1
+            if not record.cache_hit:
+                self.sizes[record.method_name].observe(record.response_bytes)
+            if record.error_code is not None:
+                self.errors[record.method_name, str(record.error_code)] += 1
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP flickr_calls_total Flickr calls by method and cache outcome.',
+                      '# TYPE flickr_calls_total counter']
+            for (method, cache), count in sorted(self.calls.items()):
+                lines.append('flickr_calls_total{{method="{}",cache="{}"}} {}'.format(
+                    method, cache, count))
+
+            lines += ['# HELP flickr_errors_total Failed Flickr calls by method and error code.',
+                      '# TYPE flickr_errors_total counter']
+            for (method, code), count in sorted(self.errors.items()):
+                lines.append('flickr_errors_total{{method="{}",code="{}"}} {}'.format(
+                    method, code, count))
+
+            lines += _render_histograms(
+                'flickr_call_seconds', 'Wall time of Flickr calls, cache hits included.',
+                self.latency)
+            lines += _render_histograms(
+                'flickr_response_bytes', 'Size of Flickr responses fetched upstream.',
+                self.sizes)
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histograms(name, help_text, histograms):
+    lines = ['# HELP {} {}'.format(name, help_text), '# TYPE {} histogram'.format(name)]
+    for method, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append('{}_bucket{{method="{}",le="{}"}} {}'.format(name, method, bound, count))
+        lines.append('{}_bucket{{method="{}",le="+Inf"}} {}'.format(name, method, histogram.count))
+        lines.append('{}_sum{{method="{}"}} {}'.format(name, method, histogram.sum))
+        lines.append('{}_count{{method="{}"}} {}'.format(name, method, histogram.count))
+    return lines
+
+
+metrics = Metrics()
+
+
+class RequestCalls:
+    """Flickr calls made while handling one request."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def server_timing(self, total_seconds):
+        with self._lock:
+            records = list(self.records)
+
+        by_method = defaultdict(lambda: [0, 0.0])
+        for record in records:
+            by_method[record.method_name][0] += 1
+            by_method[record.method_name][1] += record.seconds
+
+        hits = sum(record.cache_hit for record in records)
+        entries = ['app;dur={:.1f}'.format(total_seconds * 1000),
+                   'flickr;dur={:.1f};desc="{} calls, {} cached"'.format(
+                       sum(record.seconds for record in records) * 1000, len(records), hits)]
+        for method, (count, seconds) in sorted(by_method.items()):
+            entries.append('{};dur={:.1f};desc="{}x"'.format(method, seconds * 1000, count))
+        return ', '.join(entries)
+
+
+@contextmanager
+def measure(method_name):
+    """Measure one Flickr call, yields its CallRecord."""
+    record = CallRecord(method_name)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as err:
+        record.error_code = getattr(err, 'code', None) or type(err).__name__
+        raise
+    finally:
+        record.seconds = time.perf_counter() - started
+        metrics.observe(record)
+        calls = _request_calls.get()
+        if calls is not None:
+            calls.add(record)
+
+
+def response_hook(response, *args, **kwargs):
+    """requests response hook, keeps the size of the last response of this thread."""
+    _local.response_bytes = len(response.content)
+
+
+def last_response_bytes():
+    return getattr(_local, 'response_bytes', 0)
+
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header summarizing the Flickr calls of the request.
+
+    The header is sent before a streaming response is consumed, so calls
+    still running by then, e.g. of a streamed group fan-out, are not in it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        calls = RequestCalls()
+        token = _request_calls.set(calls)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_calls.reset(token)
+        response['Server-Timing'] = calls.server_timing(time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        calls = RequestCalls()
+        token = _request_calls.set(calls)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_calls.reset(token)
+        response['Server-Timing'] = calls.server_timing(time.perf_counter() - started)
+        return response
@@ -0,0 +1,275 @@
+"""Postgres backed queue of background jobs, run by `manage.py run_jobs`.
+
+    job = jobs.enqueue('sync_person', nsid='38954353@N06')
+
+Identical pending jobs are queued once: enqueue() returns the job already
+waiting. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, at
+most FLICKR_JOBS['CONCURRENCY'][kind] of a kind running at a time across
+all workers. A failed job is retried after an exponential backoff until it
+used up its attempts. Running jobs are kept alive by their worker's
+heartbeat; those of a worker that died are retried once their heartbeat is
+LEASE seconds old. Handlers report progress with job.report(), which the
+job status view serves to the UI.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from flickr import client, resolver, sync
+from flickr.models import Job, Person
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONCURRENCY': {},
+    'DEFAULT_CONCURRENCY': 1,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 30,
+    'MAX_BACKOFF': 60 * 60,
+    'LEASE': 5 * 60,
+    'POLL': 1,
+}
+
+# Inserts enqueue() tries when the identical pending job keeps being claimed.
+ENQUEUE_ATTEMPTS = 3
+
+HANDLERS = {}
+
+
+def jobs_settings():
+    return dict(DEFAULTS, **getattr(settings, 'FLICKR_JOBS', {}))
+
+
+def handler(kind):
+    """Register the decorated function(job, **args) as the handler of kind."""
+
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+
+    return register
+
+
+def job_key(kind, args):
+    raw = json.dumps([kind, args], sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def enqueue(kind, max_attempts=None, **args):
+    """Queue a job, or return the identical job already pending."""
+    if kind not in HANDLERS:
+        raise ValueError('Unknown job kind {}'.format(kind))
+
+    key = job_key(kind, args)
+    max_attempts = max_attempts or jobs_settings()['MAX_ATTEMPTS']
+    for attempt in range(ENQUEUE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Job.objects.create(kind=kind, args=args, key=key, max_attempts=max_attempts)
+        except IntegrityError:
+            pending = Job.objects.filter(key=key, status=Job.PENDING).first()
+            if pending is not None:
+                return pending
+            # Claimed between the insert and the select, queue it again,
+            # unless that keeps happening.
+            if attempt == ENQUEUE_ATTEMPTS - 1:
+                raise
+
+
+def backoff(attempts):
+    """Seconds to wait before attempt number attempts + 1, with jitter."""
+    options = jobs_settings()
+    delay = min(options['BACKOFF'] * 2 ** (attempts - 1), options['MAX_BACKOFF'])
+    return delay * random.uniform(0.5, 1)
+
+
+def describe(job):
+    """What the UI needs to show a job."""
+    error = job.error.strip()
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'args': job.args,
+        'status': job.status,
+        'progress': job.progress,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after.isoformat() if job.status == Job.PENDING else None,
+        'result': job.result,
+        'error': error.splitlines()[-1] if error else '',
+    }
+
+
+# Claiming
+
+def claim(worker, kinds=None):
+    """Mark the next runnable job as running and return it, None if there is none."""
+    options = jobs_settings()
+    kinds = kinds or list(HANDLERS)
+
+    for kind in kinds:
+        limit = options['CONCURRENCY'].get(kind, options['DEFAULT_CONCURRENCY'])
+        with transaction.atomic():
+            # Serialize claims of one kind, so the running count stays exact.
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [_lock_id(kind)])
+            if Job.objects.filter(kind=kind, status=Job.RUNNING).count() >= limit:
+                continue
+
+            job = (Job.objects.select_for_update(skip_locked=True)
+                   .filter(kind=kind, status=Job.PENDING, run_after__lte=timezone.now())
+                   .order_by('run_after', 'pk').first())
+            if job is None:
+                continue
+
+            now = timezone.now()
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.worker = worker
+            job.started_at = now
+            job.heartbeat_at = now
+            job.save(update_fields=['status', 'attempts', 'worker', 'started_at', 'heartbeat_at'])
+            return job
+    return None
+
+
+def _lock_id(kind):
+    return int(hashlib.sha1(('flickr.jobs.' + kind).encode('utf-8')).hexdigest()[:15], 16)
+
+
+def heartbeat(job_ids):
+    Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale():
+    """Fail the running jobs whose worker stopped beating, they are retried if they can be."""
+    lease = timezone.now() - timedelta(seconds=jobs_settings()['LEASE'])
+    with transaction.atomic():
+        stale = list(Job.objects.select_for_update(skip_locked=True)
+                     .filter(status=Job.RUNNING, heartbeat_at__lt=lease))
+        for job in stale:
+            log.warning('Job {} {} lost its worker {}'.format(job.pk, job.kind, job.worker))
+            _failed(job, 'Worker {} stopped responding.'.format(job.worker))
+    return len(stale)
+
+
+# Running
+
+def execute(job):
+    """Run the handler of a claimed job and record the outcome."""
+    try:
+        result = HANDLERS[job.kind](job, **job.args)
+    except Exception:
+        log.exception('Job {} {} failed'.format(job.pk, job.kind))
+        _failed(job, traceback.format_exc())
+    else:
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, result=result, error='',
+                                             finished_at=timezone.now())
+    finally:
+        # Jobs run on worker threads, each with its own connection.
+        connection.close()
+
+
+def _failed(job, error):
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        run_after = now + timedelta(seconds=backoff(job.attempts))
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(status=Job.PENDING, run_after=run_after,
+                                                     error=error)
+            return
+        except IntegrityError:
+            error += '\nNot retried, an identical job is already pending.'
+    Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=error, finished_at=now)
+
+
+class Worker:
+    """Claim and run jobs on a pool of threads until stopped."""
+
+    def __init__(self, kinds=None, threads=4, poll=None):
+        self.kinds = kinds
+        self.threads = threads
+        self.poll = poll or jobs_settings()['POLL']
+        self.name = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.running = {}
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self, once=False):
+        """Work until stop(), or with once until no job is left to claim."""
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while not self.stopping.is_set():
+                requeue_stale()
+                with self._lock:
+                    heartbeat(list(self.running))
+                    # Taken before claiming: a job finishing meanwhile may
+                    # have held back the claim of another of its kind.
+                    busy = bool(self.running)
+
+                claimed = self._fill(executor)
+                if once and not claimed and not busy:
+                    break
+                if not claimed:
+                    self.stopping.wait(self.poll)
+
+    def stop(self):
+        self.stopping.set()
+
+    def _fill(self, executor):
+        claimed = 0
+        while len(self.running) < self.threads and not self.stopping.is_set():
+            job = claim(self.name, self.kinds)
+            if job is None:
+                break
+            claimed += 1
+            log.info('Running job {} {} {}'.format(job.pk, job.kind, job.args))
+            with self._lock:
+                self.running[job.pk] = job
+            executor.submit(self._execute, job)
+        return claimed
+
+    def _execute(self, job):
+        try:
+            execute(job)
+        finally:
+            with self._lock:
+                del self.running[job.pk]
+
+
+# Handlers
+
+@handler('sync_person')
+def sync_person_job(job, nsid, full=False):
+    return sync.sync_person(nsid, full=full,
+                            progress=lambda done, total, message: job.report(done, total, message))
+
+
+@handler('sync_favs')
+def sync_favs_job(job, nsid, full=False):
+    person, _ = Person.objects.get_or_create(flickrid=nsid)
+    return sync.sync_favs(client.get_client(), person, sync.cursor(person, full))
+
+
+@handler('resolve_users')
+def resolve_users_job(job, values, chunk_size=100):
+    f = client.get_client()
+    resolved, errors = {}, {}
+    for start in range(0, len(values), chunk_size):
+        job.report(start, len(values), 'resolving')
+        chunk_resolved, chunk_errors = resolver.resolve_many(f, values[start:start + chunk_size])
+        resolved.update(chunk_resolved)
+        errors.update((value, str(err)) for value, err in chunk_errors.items())
+    job.report(len(values), len(values), 'resolved')
+    return {'resolved': resolved, 'errors': errors}
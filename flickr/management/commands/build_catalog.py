@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from flickr import catalog, client
+
+
+class Command(BaseCommand):
+    help = 'Build the Flickr method catalog used by the API index and method search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent getMethodInfo calls.')
+        parser.add_argument('--path', default=None,
+                            help='Where to save the catalog, FLICKR_METHOD_CATALOG["PATH"] by default.')
+
+    def handle(self, *args, **options):
+        f = client.get_client()
+
+        built, errors = catalog.build(f, workers=options['workers'])
+        path = options['path'] or catalog.catalog_path()
+        built.save(path)
+
+        for method_name, err in errors:
+            self.stderr.write('{}: {}'.format(method_name, err))
+        self.stdout.write(self.style.SUCCESS(
+            'Saved {} methods in {} namespaces to {}.'.format(
+                len(built.names), len(built.namespaces()), path)))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+
+class Command(BaseCommand):
+    help = 'Compile every Jinja2 template, filling the bytecode cache or writing a bundle.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bundle', action='store_true',
+                            help='Write precompiled modules to JINJA2_PRECOMPILED_DIR.')
+
+    def handle(self, *args, **options):
+        env = engines['jinja2'].env
+        started = time.perf_counter()
+
+        if options['bundle']:
+            target = settings.JINJA2_PRECOMPILED_DIR
+            names = env.list_templates()
+            env.compile_templates(target, zip=None, ignore_errors=False)
+            message = 'Compiled {} templates into {}'.format(len(names), target)
+        else:
+            if env.bytecode_cache is None:
+                self.stderr.write('JINJA2_BYTECODE_CACHE is disabled, nothing will be kept.')
+            names = env.list_templates()
+            for name in names:
+                env.get_template(name)
+            message = 'Compiled {} templates into the bytecode cache'.format(len(names))
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS('{} in {:.1f} ms.'.format(message, elapsed)))
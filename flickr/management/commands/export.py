@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flickr import client, exports
+
+
+class Command(BaseCommand):
+    help = 'Export the group pools or favorites of a Flickr user to NDJSON, CSV or Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('userid', help='Flickr user id, e.g. 38954353@N06')
+        parser.add_argument('source', choices=sorted(exports.SOURCES))
+        parser.add_argument('output',
+                            help='File to write, a directory for Parquet, - for stdout.')
+        parser.add_argument('--format', choices=sorted(exports.WRITERS),
+                            help='Defaults to the extension of output, else ndjson.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint of output and start over.')
+        parser.add_argument('--skip', type=int, default=0,
+                            help='Records to skip when writing to stdout.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or exports.format_of(output)
+        f = client.get_client()
+
+        def progress(records, rate):
+            self.stderr.write('{} records, {:.0f} records/s'.format(records, rate))
+
+        try:
+            if output == '-':
+                for chunk in exports.stream(f, options['userid'], options['source'], fmt,
+                                            skip=options['skip'], progress=progress):
+                    sys.stdout.buffer.write(chunk)
+                return
+
+            result = exports.export_file(f, options['userid'], options['source'], fmt, output,
+                                         restart=options['restart'], progress=progress)
+        except exports.ExportError as err:
+            raise CommandError(err)
+
+        self.stderr.write(self.style.SUCCESS(
+            '{records} records in {output}, {new} written now at {rate:.0f} records/s.'.format(
+                output=output, **result)))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from flickr import client, jobs, resolver
+
+
+class Command(BaseCommand):
+    help = 'Resolve Flickr profile URLs or path aliases to user ids, and remember them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('values', nargs='*',
+                            help='Profile URLs, path aliases or user ids, one per line '
+                                 'on stdin when none are given.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of concurrent lookupUser calls.')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue a job for `manage.py run_jobs` instead.')
+
+    def handle(self, *args, **options):
+        values = options['values'] or [line.strip() for line in sys.stdin if line.strip()]
+        if options['background']:
+            job = jobs.enqueue('resolve_users', values=values)
+            self.stdout.write('Queued job {}.'.format(job.pk))
+            return
+
+        f = client.get_client()
+
+        resolved, errors = resolver.resolve_many(f, values, workers=options['workers'])
+
+        for value in values:
+            if value in resolved:
+                self.stdout.write('{}\t{}'.format(value, resolved[value]))
+        for value, err in errors.items():
+            self.stderr.write('{}: {}'.format(value, err))
+        self.stdout.write(self.style.SUCCESS(
+            'Resolved {} of {}.'.format(len(resolved), len(set(values)))))
@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from flickr import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped with SIGINT or SIGTERM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=sorted(jobs.HANDLERS),
+                            help='Only run jobs of this kind, may be repeated.')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Number of jobs run at the same time by this worker.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no job is left to run.')
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(kinds=options['kind'], threads=options['threads'])
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping, waiting for the running jobs to finish.')
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write('Worker {} running {}.'.format(
+            worker.name, ', '.join(options['kind'] or sorted(jobs.HANDLERS))))
+        worker.run(once=options['once'])
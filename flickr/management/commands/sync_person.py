@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from flickr import jobs, sync
+
+
+class Command(BaseCommand):
+    help = 'Sync photos, favorites and contacts of Flickr users into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nsid', nargs='+', help='Flickr user ids, e.g. 38954353@N06')
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore the last sync time and fetch everything.')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue a job per user for `manage.py run_jobs` instead.')
+
+    def handle(self, *args, **options):
+        for nsid in options['nsid']:
+            if options['background']:
+                job = jobs.enqueue('sync_person', nsid=nsid, full=options['full'])
+                self.stdout.write('{}: job {}'.format(nsid, job.pk))
+                continue
+            result = sync.sync_person(nsid, full=options['full'])
+            self.stdout.write(self.style.SUCCESS('{}: {}'.format(nsid, result)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from flickr import client, reflection
+
+
+class Command(BaseCommand):
+    help = 'Fetch every flickr.reflection method descriptor into the reflection cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent getMethodInfo calls.')
+
+    def handle(self, *args, **options):
+        f = client.get_client()
+
+        stored, errors = reflection.warm(f, workers=options['workers'])
+
+        for method_name, err in errors:
+            self.stderr.write('{}: {}'.format(method_name, err))
+        self.stdout.write(self.style.SUCCESS(
+            'Cached {} method descriptors.'.format(stored)))
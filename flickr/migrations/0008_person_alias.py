@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickr', '0007_auto_20170803_1226'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='alias',
+            field=models.CharField(max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='resolved_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
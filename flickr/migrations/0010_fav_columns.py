@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:54
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.fields.json
+
+BATCH_SIZE = 10000
+
+# Same as flickr.models.photo_columns.
+BACKFILL_SQL = """
+UPDATE flickr_fav SET
+    views = CASE WHEN info->>'views' ~ '^[0-9]{1,9}$' THEN (info->>'views')::integer END,
+    dateupload = CASE WHEN info->>'dateupload' ~ '^[0-9]{1,12}$'
+                      THEN to_timestamp((info->>'dateupload')::bigint) END,
+    owner = NULLIF(info->>'owner', ''),
+    tags = NULLIF(array_remove(string_to_array(info->>'tags', ' '), ''), '{}')
+WHERE id >= %s AND id < %s
+"""
+
+
+def backfill(apps, schema_editor):
+    """Copy the columns out of info in batches, each its own transaction."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(id), max(id) FROM flickr_fav')
+        first, last = cursor.fetchone()
+        if first is None:
+            return
+        for start in range(first, last + 1, BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently so ingest keeps writing meanwhile.
+    atomic = False
+
+    dependencies = [
+        ('flickr', '0009_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fav',
+            name='dateupload',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='fav',
+            name='owner',
+            field=models.CharField(max_length=30, null=True),
+        ),
+        migrations.AddField(
+            model_name='fav',
+            name='tags',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='fav',
+            name='views',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=models.Index(django.db.models.expressions.F('user'), django.db.models.expressions.OrderBy(django.db.models.expressions.F('views'), descending=True, nulls_last=True), name='flickr_fav_user_views'),
+        ),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.expressions.F('views'), descending=True, nulls_last=True), name='flickr_fav_views'),
+        ),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=models.Index(fields=['owner', '-dateupload'], name='flickr_fav_owner_uploaded'),
+        ),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=models.Index(fields=['dateupload'], name='flickr_fav_dateupload'),
+        ),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='flickr_fav_tags'),
+        ),
+        AddIndexConcurrently(
+            model_name='fav',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('datetaken', 'info'), name='flickr_fav_datetaken'),
+        ),
+        AddIndexConcurrently(
+            model_name='person',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['photos'], name='flickr_person_photos', opclasses=['jsonb_path_ops']),
+        ),
+    ]
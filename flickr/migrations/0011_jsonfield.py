@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickr', '0010_fav_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fav',
+            name='info',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='info',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='photos',
+            field=models.JSONField(default=list),
+        ),
+    ]
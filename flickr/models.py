@@ -0,0 +1,137 @@
+from datetime import datetime
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+from django.utils import timezone
+
+
+class Person(models.Model):
+    flickrid = models.CharField(max_length=30, unique=True, db_index=True)
+    # Time of the last sync, used as the min_*_date cursor of the next one.
+    updated_at = models.DateTimeField(null=True)
+    photos = models.JSONField(default=list)
+    info = models.JSONField(null=True)
+    # Path alias of the profile URL, e.g. flickr.com/photos/<alias>/, lowercased.
+    alias = models.CharField(max_length=100, null=True, unique=True)
+    # Time alias was last resolved to flickrid, see flickr/resolver.py.
+    resolved_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # Containment queries such as photos @> '[{"owner": "..."}]'.
+            GinIndex(fields=['photos'], opclasses=['jsonb_path_ops'], name='flickr_person_photos'),
+        ]
+
+    def __str__(self):
+        return self.flickrid
+
+
+def photo_columns(photo):
+    """Values of the Fav columns extracted from a photo dict of the Flickr API.
+
+    Must match BACKFILL_SQL of migration 0010_fav_columns.
+    """
+    views = photo.get('views')
+    dateupload = photo.get('dateupload')
+    return {
+        'views': int(views) if str(views).isdigit() and len(str(views)) <= 9 else None,
+        'dateupload': (datetime.fromtimestamp(int(dateupload), timezone.utc)
+                       if str(dateupload).isdigit() and len(str(dateupload)) <= 12 else None),
+        'owner': photo.get('owner') or None,
+        'tags': [tag for tag in (photo.get('tags') or '').split(' ') if tag] or None,
+    }
+
+
+class Fav(models.Model):
+    user = models.ForeignKey(Person, on_delete=models.CASCADE, to_field='flickrid')
+    photoid = models.CharField(max_length=30, db_index=True)
+    info = models.JSONField(null=True)
+    # Keys of info queried often, see flickr/queries.py. Copied from info by
+    # save() and by flickr.ingest, the path for bulk writes: bulk_create()
+    # and update() of info leave them stale.
+    views = models.IntegerField(null=True)
+    dateupload = models.DateTimeField(null=True)
+    owner = models.CharField(max_length=30, null=True)
+    tags = ArrayField(models.TextField(), null=True)
+
+    class Meta:
+        unique_together = ('user', 'photoid')
+        indexes = [
+            models.Index('user', F('views').desc(nulls_last=True), name='flickr_fav_user_views'),
+            models.Index(F('views').desc(nulls_last=True), name='flickr_fav_views'),
+            models.Index(fields=['owner', '-dateupload'], name='flickr_fav_owner_uploaded'),
+            models.Index(fields=['dateupload'], name='flickr_fav_dateupload'),
+            GinIndex(fields=['tags'], name='flickr_fav_tags'),
+            models.Index(KeyTextTransform('datetaken', 'info'), name='flickr_fav_datetaken'),
+        ]
+
+    def save(self, *args, **kwargs):
+        columns = photo_columns(self.info or {})
+        for name, value in columns.items():
+            setattr(self, name, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'info' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | set(columns)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return '{} faved {}'.format(self.user_id, self.photoid)
+
+
+class Following(models.Model):
+    follower = models.ForeignKey(Person, on_delete=models.CASCADE,
+                                 to_field='flickrid', related_name='+')
+    followed = models.ForeignKey(Person, on_delete=models.CASCADE,
+                                 to_field='flickrid', related_name='+')
+
+    class Meta:
+        unique_together = ('follower', 'followed')
+
+    def __str__(self):
+        return '{} follows {}'.format(self.follower_id, self.followed_id)
+
+
+class Job(models.Model):
+    """Background job run by `manage.py run_jobs`, see flickr/jobs.py."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(status, status) for status in (PENDING, RUNNING, DONE, FAILED)]
+
+    kind = models.CharField(max_length=50)
+    args = models.JSONField(default=dict)
+    # Hash of kind and args, identical pending jobs are not queued twice.
+    key = models.CharField(max_length=40)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=Q(status='pending'),
+                                    name='flickr_job_unique_pending'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'kind', 'run_after'], name='flickr_job_queue'),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(self.kind, self.args, self.status)
+
+    def report(self, done, total=None, message=''):
+        """Save the progress of the running job, which also counts as a heartbeat."""
+        self.progress = {'done': done, 'total': total, 'message': message}
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, heartbeat_at=timezone.now())
@@ -0,0 +1,155 @@
+"""Walking the pages of paginated Flickr list methods, and paginating list views."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+
+from flickr import steps
+
+log = logging.getLogger(__name__)
+
+PER_PAGE = 500
+
+
+def page_container(response):
+    """Split a list response into its pagination dict and its list of items.
+
+    Flickr wraps every list in a dict carrying page/pages/total, e.g.
+    {'photos': {'page': 1, 'pages': 3, 'photo': [...]}, 'stat': 'ok'}.
+    """
+    for value in response.values():
+        if isinstance(value, dict) and 'pages' in value:
+            items = next((item for item in value.values() if isinstance(item, list)), [])
+            return value, items
+    raise ValueError('Response is not paginated: {}'.format(list(response)))
+
+
+def walk(call, per_page=PER_PAGE, max_items=None, prefetch=True, first_page=1, **kwargs):
+    """Lazily yield the items of every page returned by call(page=n, ...).
+
+    While the items of one page are consumed the next page is fetched in a
+    background thread. Stops after max_items items, and stops fetching as
+    soon as the caller stops iterating.
+
+    :param call: a Flickr method, e.g. f.favorites.getList
+    :param first_page: page to start from, the items of earlier pages are skipped
+    :param kwargs: extra arguments for every call
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    def fetch(page):
+        if executor is None:
+            return _Done(call(page=page, per_page=per_page, **kwargs))
+        return executor.submit(call, page=page, per_page=per_page, **kwargs)
+
+    yielded = 0
+    page = first_page
+    future = fetch(page)
+    try:
+        while future is not None:
+            container, items = page_container(future.result())
+
+            future = None
+            wanted = max_items is None or yielded + len(items) < max_items
+            if wanted and page < int(container.get('pages', 1)):
+                page += 1
+                future = fetch(page)
+
+            for item in items:
+                if max_items is not None and yielded >= max_items:
+                    return
+                yield item
+                yielded += 1
+    finally:
+        if future is not None:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+class _Done:
+    """Already computed result with the Future interface used by walk()."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+    def cancel(self):
+        return False
+
+
+# Pages of list views
+
+# List methods Flickr does not page, their whole list is fetched, through
+# the response cache, and sliced locally.
+UNPAGED_METHODS = {
+    'flickr.people.getGroups',
+    'flickr.people.getPublicGroups',
+}
+
+MAX_PER_PAGE = 500
+
+
+class UpstreamPaginator(Paginator):
+    """Paginator of a list paged by Flickr, counts come from its total/pages."""
+
+    def __init__(self, container, per_page):
+        super().__init__([], per_page)
+        self.count = int(container.get('total') or 0)
+        self.num_pages = max(1, int(container.get('pages') or 1))
+
+
+def page_number(value):
+    """Page number from a query string value, raises InvalidPage when invalid."""
+    if value in (None, ''):
+        return 1
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise PageNotAnInteger('Page {!r} is not an integer.'.format(value))
+    if number < 1:
+        raise EmptyPage('Page {} is less than 1.'.format(number))
+    return number
+
+
+def list_items(response):
+    """Items of a list response, paged or not."""
+    for value in response.values():
+        if isinstance(value, dict):
+            return next((item for item in value.values() if isinstance(item, list)), [])
+    raise ValueError('Response has no list: {}'.format(list(response)))
+
+
+def paginate(f, method_name, page=1, per_page=25, **kwargs):
+    """django.core.paginator.Page of the items of a Flickr list method.
+
+    Methods paged by Flickr are asked for that one page. Pages beyond the
+    last raise EmptyPage, instead of being clamped to the last one.
+    """
+    return steps.run(_paginate_steps(f, method_name, page, per_page, kwargs))
+
+
+async def apaginate(f, method_name, page=1, per_page=25, **kwargs):
+    """paginate for an AsyncFlickrClient."""
+    return await steps.arun(_paginate_steps(f, method_name, page, per_page, kwargs))
+
+
+def _paginate_steps(f, method_name, page, per_page, kwargs):
+    per_page = min(per_page, MAX_PER_PAGE)
+    if method_name in UNPAGED_METHODS:
+        response = yield lambda: f.do_flickr_call(method_name, **kwargs)
+        return Paginator(list_items(response), per_page).page(page)
+
+    response = yield lambda: f.do_flickr_call(method_name, page=page, per_page=per_page,
+                                              **kwargs)
+    return _upstream_page(response, page, per_page)
+
+
+def _upstream_page(response, page, per_page):
+    container, items = page_container(response)
+    paginator = UpstreamPaginator(container, per_page)
+    if page > paginator.num_pages:
+        raise EmptyPage('Page {} is past the last page, {}.'.format(page, paginator.num_pages))
+    return Page(items, page, paginator)
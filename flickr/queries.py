@@ -0,0 +1,73 @@
+"""Queries over favorites and synced photos that are served by indexes.
+
+    queries.favs(tag='sunset', order='-views')[:50]
+    queries.favs(user='38954353@N06', taken_after='2017-01-01', order='-taken')
+    queries.people_with_photos_by('10894748@N07')
+
+Fav keeps the keys of its info that are filtered and sorted on, views,
+dateupload, owner and tags, in columns of their own, copied from info by
+Fav.save() and flickr.ingest and indexed (see Fav.Meta). datetaken is
+only read through an index on the info->>'datetaken' expression, its
+text sorts by date. Person.photos has a GIN index for containment
+queries. Filtering on other keys of info works but scans the table.
+"""
+from django.db.models import F, TextField
+from django.db.models.fields.json import KeyTextTransform
+
+from flickr.models import Fav, Person
+
+ORDERS = {
+    '-views': F('views').desc(nulls_last=True),
+    'dateupload': F('dateupload').asc(),
+    '-dateupload': F('dateupload').desc(),
+    'taken': F('datetaken').asc(),
+    '-taken': F('datetaken').desc(),
+}
+
+
+def favs(user=None, tag=None, tags=(), owner=None, min_views=None,
+         uploaded_after=None, uploaded_before=None, taken_after=None, taken_before=None,
+         order='-views'):
+    """Fav queryset filtered on the indexed columns.
+
+    :param tag: a tag the photos have, tags: several tags they all have
+    :param taken_after: date taken as text, e.g. '2017' or '2017-08-03 12:26:00'
+    :param order: one of ORDERS
+    """
+    if order not in ORDERS:
+        raise ValueError('Unknown order {}, one of {}'.format(order, ', '.join(sorted(ORDERS))))
+
+    queryset = Fav.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user_id=user)
+    tags = [tag.lower() for tag in ([tag] if tag else []) + list(tags)]
+    if tags:
+        queryset = queryset.filter(tags__contains=tags)
+    if owner is not None:
+        queryset = queryset.filter(owner=owner)
+    if min_views is not None:
+        queryset = queryset.filter(views__gte=min_views)
+    if uploaded_after is not None:
+        queryset = queryset.filter(dateupload__gte=uploaded_after)
+    if uploaded_before is not None:
+        queryset = queryset.filter(dateupload__lt=uploaded_before)
+
+    if taken_after is not None or taken_before is not None or order in ('taken', '-taken'):
+        # Compared as text, not as JSON, and matching the index expression.
+        queryset = queryset.annotate(
+            datetaken=KeyTextTransform('datetaken', 'info', output_field=TextField()))
+        if taken_after is not None:
+            queryset = queryset.filter(datetaken__gte=taken_after)
+        if taken_before is not None:
+            queryset = queryset.filter(datetaken__lt=taken_before)
+    return queryset.order_by(ORDERS[order])
+
+
+def people_with_photo(photo_id):
+    """People whose synced photos include photo_id."""
+    return Person.objects.filter(photos__contains=[{'id': photo_id}])
+
+
+def people_with_photos_by(owner):
+    """People whose synced photos include photos owned by owner."""
+    return Person.objects.filter(photos__contains=[{'owner': owner}])
@@ -0,0 +1,312 @@
+"""Spend the hourly call quota of FLICKR_KEY where latency matters.
+
+Every call that reaches Flickr, cache hits and coalesced calls excluded,
+first takes a token from a bucket refilled at FLICKR_QUOTA['LIMIT'] calls
+per hour. LIMIT and BURST are split evenly between the PROCESSES calling
+Flickr with the key: web workers, `run_jobs` workers and the `export`,
+`sync_person` and other commands while they run. When the bucket runs
+dry callers queue:
+
+- by priority, interactive page loads before AJAX group fan-outs before
+  background jobs and commands. Lower priorities also leave a RESERVE
+  share of the bucket to the higher ones, so a fan-out cannot drain what
+  the next page load needs;
+- within a priority, fairly between users: a user asking for many calls
+  does not hold back one asking for a few (start-time fair queueing);
+- until their DEADLINES. A caller that would get its token too late,
+  or not at all, fails early with QuotaExceeded instead.
+
+The priority and the user come from the context, set for each request by
+QuotaMiddleware and overridden with use(). Outside of a request calls are
+background calls.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from flickrapi import FlickrError
+
+from flickr import tokens
+
+INTERACTIVE, FANOUT, BACKGROUND = 'interactive', 'fanout', 'background'
+PRIORITIES = (INTERACTIVE, FANOUT, BACKGROUND)
+
+DEFAULTS = {
+    'LIMIT': 3600,
+    'PROCESSES': 1,
+    'BURST': 60,
+    'RESERVE': {FANOUT: 0.2, BACKGROUND: 0.5},
+    'DEADLINES': {INTERACTIVE: 5, FANOUT: 10, BACKGROUND: 15 * 60},
+    'POLL': 0.05,
+}
+
+_priority = contextvars.ContextVar('flickr_quota_priority', default=BACKGROUND)
+_user = contextvars.ContextVar('flickr_quota_user', default=None)
+
+_scheduler = None
+_init_lock = threading.Lock()
+
+
+class QuotaExceeded(FlickrError):
+    """Not called, the call would have exceeded the quota."""
+
+
+def quota_settings():
+    return dict(DEFAULTS, **getattr(settings, 'FLICKR_QUOTA', {}))
+
+
+@contextmanager
+def use(priority=None, user=None):
+    """Make the calls of the block with priority, on behalf of user."""
+    reset = bind(priority, user)
+    try:
+        yield
+    finally:
+        for var, token in reset:
+            var.reset(token)
+
+
+def bind(priority=None, user=None):
+    """Set the priority and user of the current context, e.g. one just copied
+    for a worker thread. Returns what use() needs to reset them.
+    """
+    reset = []
+    if priority is not None:
+        reset.append((_priority, _priority.set(priority)))
+    if user is not None:
+        reset.append((_user, _user.set(user)))
+    return reset
+
+
+class _Waiter:
+    def __init__(self, tag, priority, user, deadline):
+        self.tag = tag
+        self.priority = priority
+        self.user = user
+        self.deadline = deadline
+        self.granted = threading.Event()
+        self.cancelled = False
+
+
+class Scheduler:
+    """Token bucket with a queue of callers ordered by priority and fair share."""
+
+    def __init__(self, rate, burst, reserve, deadlines, poll=0.05, clock=time.monotonic):
+        """
+        :param rate: tokens per second
+        :param burst: bucket capacity
+        :param reserve: {priority: share of the bucket it may not take}
+        :param deadlines: {priority: seconds a caller waits at most}
+        :param clock: seconds as a float, only compared with itself
+        """
+        self.rate = rate
+        self.burst = burst
+        self.reserve = {priority: burst * reserve.get(priority, 0) for priority in PRIORITIES}
+        self.deadlines = deadlines
+        self.poll = poll
+        self.clock = clock
+
+        self.tokens = burst
+        self.counts = Counter()
+        self.wait_seconds = Counter()
+        self._refilled_at = clock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual_time = 0
+        self._finish_tags = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user, priority=INTERACTIVE):
+        """Block until a call may be made, raise QuotaExceeded past the deadline."""
+        started = self.clock()
+        with self._lock:
+            waiter = self._enqueue(user, priority, started)
+        while True:
+            with self._lock:
+                if self._granted(waiter, started):
+                    return
+                delay = self._delay(waiter)
+            waiter.granted.wait(delay)
+
+    async def aacquire(self, user, priority=INTERACTIVE):
+        """Same as acquire, for async callers."""
+        started = self.clock()
+        with self._lock:
+            waiter = self._enqueue(user, priority, started)
+        while True:
+            with self._lock:
+                if self._granted(waiter, started):
+                    return
+                delay = self._delay(waiter)
+            try:
+                await asyncio.sleep(min(delay, self.poll))
+            except asyncio.CancelledError:
+                with self._lock:
+                    self._cancel(waiter)
+                raise
+
+    def _enqueue(self, user, priority, now):
+        deadline = self.deadlines.get(priority)
+        deadline = now + deadline if deadline is not None else None
+
+        # Start-time fair queueing: a user's next call is served after the
+        # ones already queued for them, a user new to the queue starts now.
+        start = max(self._virtual_time, self._finish_tags.get(user, 0))
+        waiter = _Waiter(start, priority, user, deadline)
+        position = (PRIORITIES.index(priority), start, next(self._seq))
+        heapq.heappush(self._queue, position + (waiter,))
+        self.counts['waiting_' + priority] += 1
+
+        self._dispatch(now)
+        if not waiter.granted.is_set() and deadline is not None:
+            ahead = sum(1 for entry in self._queue
+                        if not entry[3].cancelled and entry[:3] < position)
+            needed = ahead + 1 + self.reserve[priority] - self.tokens
+            if needed / self.rate > deadline - now:
+                self._cancel(waiter)
+                self.counts['rejected_' + priority] += 1
+                raise QuotaExceeded('Flickr quota: {} call of {} would wait {:.1f}s'.format(
+                    priority, user, needed / self.rate))
+        # Only calls that are made count against the user's fair share.
+        self._finish_tags[user] = start + 1
+        return waiter
+
+    def _granted(self, waiter, started):
+        now = self.clock()
+        if not waiter.granted.is_set():
+            self._dispatch(now)
+        if waiter.granted.is_set():
+            self.wait_seconds[waiter.priority] += now - started
+            return True
+        if waiter.deadline is not None and now >= waiter.deadline:
+            self._cancel(waiter)
+            self.counts['expired_' + waiter.priority] += 1
+            raise QuotaExceeded('Flickr quota: {} call of {} timed out after {:.1f}s'.format(
+                waiter.priority, waiter.user, now - started))
+        return False
+
+    def _dispatch(self, now):
+        """Refill the bucket and grant tokens to the callers first in line."""
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+        while self._queue:
+            waiter = self._queue[0][3]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            # Reserves grow with lower priorities, when the first in line may
+            # not take a token nobody behind it may.
+            if self.tokens - 1 < self.reserve[waiter.priority]:
+                break
+            heapq.heappop(self._queue)
+            self.tokens -= 1
+            self._virtual_time = waiter.tag
+            self.counts['waiting_' + waiter.priority] -= 1
+            self.counts['granted_' + waiter.priority] += 1
+            waiter.granted.set()
+
+        if len(self._finish_tags) > 10000:
+            self._finish_tags = {user: tag for user, tag in self._finish_tags.items()
+                                 if tag > self._virtual_time}
+
+    def _delay(self, waiter):
+        """Seconds until the bucket may hold a token for the first in line."""
+        first = next((entry[3] for entry in self._queue if not entry[3].cancelled), waiter)
+        missing = self.reserve[first.priority] + 1 - self.tokens
+        delay = max(missing / self.rate, 0.001)
+        if waiter.deadline is not None:
+            delay = min(delay, max(waiter.deadline - self.clock(), 0))
+        return delay
+
+    def _cancel(self, waiter):
+        if not waiter.cancelled and not waiter.granted.is_set():
+            waiter.cancelled = True
+            self.counts['waiting_' + waiter.priority] -= 1
+            # Give back the slot of the user's last queued call, when it is this one.
+            if self._finish_tags.get(waiter.user) == waiter.tag + 1:
+                self._finish_tags[waiter.user] = waiter.tag
+
+    def stats(self):
+        with self._lock:
+            self._dispatch(self.clock())
+            stats = {'tokens': round(self.tokens, 2), 'burst': self.burst,
+                     'limit_per_hour': round(self.rate * 3600)}
+            for priority in PRIORITIES:
+                for name in ('granted', 'waiting', 'rejected', 'expired'):
+                    key = '{}_{}'.format(name, priority)
+                    stats[key] = self.counts[key]
+                stats['wait_seconds_' + priority] = round(self.wait_seconds[priority], 3)
+            return stats
+
+
+def get_scheduler():
+    """The scheduler of this process, None when FLICKR_QUOTA['LIMIT'] is None."""
+    global _scheduler
+    with _init_lock:
+        options = quota_settings()
+        if _scheduler is None and options['LIMIT'] is not None:
+            rate = options['LIMIT'] / options['PROCESSES'] / 3600
+            burst = max(1, options['BURST'] / options['PROCESSES'])
+            _scheduler = Scheduler(rate, burst, options['RESERVE'],
+                                   options['DEADLINES'], options['POLL'])
+        return _scheduler
+
+
+def acquire(scope):
+    """Wait for the quota of one upstream call made by a client of scope."""
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.acquire(_user.get() or scope, _priority.get())
+
+
+async def aacquire(scope):
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        await scheduler.aacquire(_user.get() or scope, _priority.get())
+
+
+def stats():
+    scheduler = get_scheduler()
+    return scheduler.stats() if scheduler is not None else {}
+
+
+def request_user(request):
+    """Who a request spends the quota for: the Flickr user, else the client address."""
+    token = tokens.load(request.session) if hasattr(request, 'session') else None
+    if token is not None:
+        return token.user_nsid
+    return request.META.get('REMOTE_ADDR') or 'public'
+
+
+class QuotaMiddleware:
+    """Make the Flickr calls of a request interactive calls of its user.
+
+    Must come after SessionMiddleware. Calls made while a streaming response
+    is consumed fall back to the background priority unless set otherwise.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        with use(INTERACTIVE, request_user(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with use(INTERACTIVE, await sync_to_async(request_user)(request)):
+            return await self.get_response(request)
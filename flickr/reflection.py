@@ -0,0 +1,209 @@
+"""Cache for flickr.reflection.* responses.
+
+Reflection metadata almost never changes, so responses are kept in a small
+in-process LRU and, optionally, in a Django cache shared by all workers.
+Entries older than TTL are still served for another STALE seconds while a
+background thread fetches a fresh copy.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+from flickr import steps
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': None,
+    'VERSION': 1,
+    'TTL': 24 * 60 * 60,
+    'STALE': 7 * 24 * 60 * 60,
+    'MAX_ENTRIES': 512,
+}
+
+
+class ReflectionCache:
+    def __init__(self, backend=None, version=1, ttl=DEFAULTS['TTL'],
+                 stale=DEFAULTS['STALE'], max_entries=DEFAULTS['MAX_ENTRIES']):
+        self.shared = caches[backend] if backend else None
+        self.prefix = 'flickr:reflection:v{}:'.format(version)
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """Return the cached value for key, calling fetch() when missing."""
+        return steps.run(self._get_steps(key, fetch, self._refresh_in_background))
+
+    async def aget(self, key, fetch):
+        """Same as get, for a fetch() returning an awaitable."""
+        return await steps.arun(self._get_steps(key, fetch, self._arefresh_in_background))
+
+    def _get_steps(self, key, fetch, refresh_in_background):
+        entry = self._get_local(key)
+        if entry is None and self.shared is not None:
+            entry = yield steps.blocking(self._get_shared, key)
+
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale:
+                refresh_in_background(key, fetch)
+                return value
+        return (yield from self._fetch_steps(key, fetch))
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        self._set_local(key, entry)
+        if self.shared is not None:
+            self.shared.set(self.prefix + key, entry, self.ttl + self.stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _get_shared(self, key):
+        entry = self.shared.get(self.prefix + key)
+        if entry is not None:
+            self._set_local(key, entry)
+        return entry
+
+    def _set_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fetch_steps(self, key, fetch):
+        value = yield fetch
+        self.set(key, value)
+        return value
+
+    def _start_refresh(self, key):
+        """False when key is being refreshed already."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _refresh_in_background(self, key, fetch):
+        if not self._start_refresh(key):
+            return
+
+        def refresh():
+            try:
+                steps.run(self._fetch_steps(key, fetch))
+            except Exception as err:
+                log.warning('Refreshing {} failed: {}'.format(key, err))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _arefresh_in_background(self, key, fetch):
+        if not self._start_refresh(key):
+            return
+
+        async def refresh():
+            try:
+                await steps.arun(self._fetch_steps(key, fetch))
+            except Exception as err:
+                log.warning('Refreshing {} failed: {}'.format(key, err))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        asyncio.ensure_future(refresh())
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        options = dict(DEFAULTS, **getattr(settings, 'FLICKR_REFLECTION_CACHE', {}))
+        _cache = ReflectionCache(
+            backend=options['BACKEND'],
+            version=options['VERSION'],
+            ttl=options['TTL'],
+            stale=options['STALE'],
+            max_entries=options['MAX_ENTRIES'],
+        )
+    return _cache
+
+
+def get_methods(f):
+    """Cached flickr.reflection.getMethods response."""
+    return get_cache().get('methods', f.reflection.getMethods)
+
+
+def get_method_info(f, method_name):
+    """Cached flickr.reflection.getMethodInfo response for method_name."""
+    return get_cache().get(
+        'method_info:' + method_name,
+        lambda: f.reflection.getMethodInfo(method_name=method_name))
+
+
+async def aget_methods(f):
+    """get_methods for an AsyncFlickrClient."""
+    return await get_cache().aget('methods', f.reflection.getMethods)
+
+
+async def aget_method_info(f, method_name):
+    """get_method_info for an AsyncFlickrClient."""
+    return await get_cache().aget(
+        'method_info:' + method_name,
+        lambda: f.reflection.getMethodInfo(method_name=method_name))
+
+
+def method_names(methods_response):
+    return [method['_content'] for method in methods_response['methods']['method']]
+
+
+def warm(f, workers=8):
+    """Fetch the method list and every method descriptor into the cache.
+
+    :return: (number of descriptors stored, list of (method_name, error))
+    """
+    cache = get_cache()
+    response = f.reflection.getMethods()
+    cache.set('methods', response)
+    names = method_names(response)
+
+    def fetch(method_name):
+        info = f.reflection.getMethodInfo(method_name=method_name)
+        cache.set('method_info:' + method_name, info)
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, name): name for name in names}
+        for future, name in futures.items():
+            try:
+                future.result()
+            except Exception as err:
+                errors.append((name, err))
+
+    return len(names) - len(errors), errors
@@ -0,0 +1,210 @@
+"""Resolve Flickr profile URLs and path aliases to NSIDs.
+
+    https://www.flickr.com/photos/jellybeanzgallery/albums
+    flickr.com/people/jellybeanzgallery
+    jellybeanzgallery
+
+all resolve to the same NSID with at most one flickr.urls.lookupUser call.
+URLs that already carry the NSID need none. Resolved aliases are kept in
+Person.alias for FLICKR_RESOLVER['TTL'] seconds, and in memory in front of
+it. resolve_many() looks up the unknown aliases concurrently and stores
+them with one statement.
+"""
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from flickrapi import FlickrError
+from psycopg2.extras import execute_values
+
+from flickr import response_cache
+from flickr.models import Person
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TTL': 30 * 24 * 60 * 60,
+    'WORKERS': 8,
+    'MAX_ENTRIES': 4096,
+}
+
+NSID, ALIAS, URL = 'nsid', 'alias', 'url'
+
+NSID_RE = re.compile(r'^\d+@[Nn]\d+$')
+ALIAS_RE = re.compile(r'^[\w.-]+$')
+PROFILE_PATHS = ('photos', 'people')
+
+_memory = None
+
+
+def resolver_settings():
+    return dict(DEFAULTS, **getattr(settings, 'FLICKR_RESOLVER', {}))
+
+
+def normalize(value):
+    """(NSID, nsid), (ALIAS, alias) or, for URLs of unknown shape, (URL, url).
+
+    Raises ValueError for anything else.
+    """
+    value = value.strip()
+    if NSID_RE.match(value):
+        return NSID, value.upper()
+
+    if value.lower().startswith(('flickr.com/', 'www.flickr.com/')):
+        value = 'https://' + value
+    parts = urlparse(value)
+    if not parts.scheme:
+        if ALIAS_RE.match(value):
+            return ALIAS, value.lower()
+        raise ValueError('Not a Flickr user id, URL or alias: {}'.format(value))
+
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if (parts.netloc.lower().endswith('flickr.com') and len(segments) >= 2
+            and segments[0].lower() in PROFILE_PATHS):
+        try:
+            return normalize(segments[1])
+        except ValueError:
+            pass
+    return URL, value
+
+
+def profile_url(alias):
+    return 'https://www.flickr.com/photos/{}/'.format(alias)
+
+
+def _get_memory():
+    global _memory
+    if _memory is None:
+        _memory = response_cache.MemoryBackend(max_entries=resolver_settings()['MAX_ENTRIES'])
+    return _memory
+
+
+def resolve(f, value):
+    """NSID of a user id, profile URL or path alias."""
+    resolved, errors = resolve_many(f, [value])
+    if value in errors:
+        raise errors[value]
+    return resolved[value]
+
+
+def resolve_many(f, values, workers=None):
+    """Resolve many values at once.
+
+    :return: ({value: nsid}, {value: error}) for the values that could and
+             could not be resolved
+    """
+    options = resolver_settings()
+    memory = _get_memory()
+    resolved, errors, keys = {}, {}, {}
+
+    for value in values:
+        try:
+            keys[value] = normalize(value)
+        except ValueError as err:
+            errors[value] = err
+
+    found = {}
+    for key in set(keys.values()):
+        kind, name = key
+        if kind == NSID:
+            found[key] = name
+        else:
+            nsid = memory.get(_memory_key(key))
+            if nsid is not None:
+                found[key] = nsid
+
+    pending = set(keys.values()) - set(found)
+    stored = _stored_aliases([name for kind, name in pending if kind == ALIAS], options['TTL'])
+    for alias, nsid in stored.items():
+        found[ALIAS, alias] = nsid
+        memory.set(_memory_key((ALIAS, alias)), nsid, options['TTL'])
+    pending -= set(found)
+
+    looked_up, failed = _lookup_all(f, pending, workers or options['WORKERS'])
+    _store({name: nsid for (kind, name), nsid in looked_up.items() if kind == ALIAS})
+    for key, nsid in looked_up.items():
+        memory.set(_memory_key(key), nsid, options['TTL'])
+    found.update(looked_up)
+
+    for value, key in keys.items():
+        if key in found:
+            resolved[value] = found[key]
+        else:
+            errors[value] = failed[key]
+    return resolved, errors
+
+
+def _memory_key(key):
+    return 'flickr:resolver:{}:{}'.format(*key)
+
+
+def _stored_aliases(aliases, ttl):
+    if not aliases:
+        return {}
+    fresh = timezone.now() - timedelta(seconds=ttl)
+    return dict(Person.objects.filter(alias__in=aliases, resolved_at__gte=fresh)
+                .values_list('alias', 'flickrid'))
+
+
+def _lookup(f, key):
+    kind, name = key
+    response = f.urls.lookupUser(url=profile_url(name) if kind == ALIAS else name)
+    return response['user']['id']
+
+
+def _lookup_all(f, keys, workers):
+    """Call flickr.urls.lookupUser for every key concurrently.
+
+    :return: ({key: nsid}, {key: error}), a failed lookup fails only its key
+    """
+    looked_up, failed = {}, {}
+    if not keys:
+        return looked_up, failed
+
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {key: executor.submit(context.copy().run, _lookup, f, key) for key in keys}
+        for key, future in futures.items():
+            try:
+                looked_up[key] = future.result()
+            except FlickrError as err:
+                log.error('Resolving {} failed: {}'.format(key[1], err))
+                failed[key] = err
+            except Exception as err:
+                # Such as an unexpected response, only this key fails.
+                log.exception('Resolving {} failed'.format(key[1]))
+                failed[key] = err
+    return looked_up, failed
+
+
+def _store(aliases):
+    """Save {alias: nsid} to Person, creating the missing people."""
+    if not aliases:
+        return
+
+    now = timezone.now()
+    # One alias per person, if several resolved to the same NSID the last wins.
+    rows = {nsid: (nsid, '[]', alias, now) for alias, nsid in aliases.items()}
+    sql = ('INSERT INTO {} (flickrid, photos, alias, resolved_at) VALUES %s '
+           'ON CONFLICT (flickrid) DO UPDATE '
+           'SET alias = EXCLUDED.alias, resolved_at = EXCLUDED.resolved_at'
+           ).format(Person._meta.db_table)
+
+    try:
+        with transaction.atomic():
+            # An alias given up by one account can be taken by another.
+            (Person.objects.filter(alias__in=[row[2] for row in rows.values()])
+             .exclude(flickrid__in=list(rows)).update(alias=None))
+            with connection.cursor() as cursor:
+                execute_values(cursor, sql, list(rows.values()),
+                               template='(%s, %s::jsonb, %s, %s)')
+    except IntegrityError:
+        # A concurrent _store gave one of the aliases to another account. The
+        # stored aliases are only a cache, those of this call are dropped.
+        log.warning('Not storing aliases {}, taken meanwhile'.format(sorted(aliases)))
@@ -0,0 +1,212 @@
+"""Cache for responses of idempotent Flickr read methods.
+
+Only methods listed in FLICKR_RESPONSE_CACHE['METHODS'] are cached, each
+with its own TTL. Keys are built from the method name, the canonicalized
+arguments and the scope of the call: 'public' for unauthenticated clients,
+the user's NSID for token-scoped ones, since a token can see more.
+
+Concurrent misses of the same key share one upstream call, see
+flickr.singleflight. With LOCK_BACKEND set to a Django cache alias,
+processes also wait for one another, which pays off when BACKEND is
+shared too ('file' or 'django').
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from flickr import steps
+from flickr.singleflight import SharedLock, SingleFlight
+
+DEFAULTS = {
+    'BACKEND': 'memory',
+    'LOCATION': None,
+    'MAX_ENTRIES': 1024,
+    'METHODS': {},
+    'COALESCE': True,
+    'LOCK_BACKEND': None,
+    'LOCK_TIMEOUT': 10,
+}
+
+IGNORED_ARGS = {'timeout'}
+
+
+def cache_key(method_name, kwargs, scope):
+    args = sorted((key, str(value)) for key, value in kwargs.items()
+                  if key not in IGNORED_ARGS and value is not None and value != '')
+    raw = json.dumps([method_name, scope, args])
+    return 'flickr:response:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, location=None, max_entries=DEFAULTS['MAX_ENTRIES']):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileBackend:
+    """One pickle file per key in the LOCATION directory."""
+
+    def __init__(self, location=None, max_entries=None):
+        self.location = location or os.path.join(tempfile.gettempdir(), 'flickr-responses')
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key.rsplit(':', 1)[-1])
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as fp:
+                expires, value = pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump((time.time() + ttl, value), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        for name in os.listdir(self.location):
+            os.remove(os.path.join(self.location, name))
+
+
+class DjangoBackend:
+    """Store responses in the Django cache named by LOCATION."""
+
+    def __init__(self, location=None, max_entries=None):
+        self.cache = caches[location or 'default']
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'file': FileBackend,
+    'django': DjangoBackend,
+}
+
+
+class ResponseCache:
+    def __init__(self, backend, ttls, flights=None, shared_lock=None):
+        self.backend = backend
+        self.ttls = ttls
+        self.flights = flights
+        self.shared_lock = shared_lock
+
+    def cached_call(self, method_name, kwargs, scope, call):
+        """Return call() for method_name, served from the cache when whitelisted."""
+        key, ttl, response = self._lookup(method_name, kwargs, scope)
+        if response is not None:
+            return response
+
+        def fetch():
+            return steps.run(self._fetch_steps(key, ttl, call))
+
+        if key is None or self.flights is None:
+            return fetch()
+        return self.flights.do(key, fetch)
+
+    async def acached_call(self, method_name, kwargs, scope, call):
+        """Same as cached_call, for a call() returning an awaitable."""
+        key, ttl, response = self._lookup(method_name, kwargs, scope)
+        if response is not None:
+            return response
+
+        def fetch():
+            return steps.arun(self._fetch_steps(key, ttl, call))
+
+        if key is None or self.flights is None:
+            return await fetch()
+        return await self.flights.ado(key, fetch)
+
+    def _lookup(self, method_name, kwargs, scope):
+        """(key, ttl, cached response or None), key is None for uncached methods."""
+        ttl = self.ttls.get(method_name)
+        if not ttl:
+            return None, None, None
+        key = cache_key(method_name, kwargs, scope)
+        return key, ttl, self.backend.get(key)
+
+    def _fetch_steps(self, key, ttl, call):
+        if key is None:
+            return (yield call)
+
+        lock = self.shared_lock
+        if lock is not None and not (yield steps.blocking(lock.acquire, key)):
+            response = yield from lock.wait_steps(key, lambda: self.backend.get(key))
+            if response is not None:
+                self.flights.count('coalesced_shared')
+                return response
+            lock = None
+
+        try:
+            response = yield call
+            if response.get('stat') == 'ok':
+                self.backend.set(key, response, ttl)
+            return response
+        finally:
+            if lock is not None:
+                yield steps.blocking(lock.release, key)
+
+    def stats(self):
+        return self.flights.stats() if self.flights is not None else {}
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        options = dict(DEFAULTS, **getattr(settings, 'FLICKR_RESPONSE_CACHE', {}))
+        backend = BACKENDS[options['BACKEND']](options['LOCATION'], options['MAX_ENTRIES'])
+        flights = SingleFlight() if options['COALESCE'] else None
+        shared_lock = None
+        if flights is not None and options['LOCK_BACKEND']:
+            shared_lock = SharedLock(caches[options['LOCK_BACKEND']], options['LOCK_TIMEOUT'])
+        _cache = ResponseCache(backend, options['METHODS'], flights, shared_lock)
+    return _cache
@@ -0,0 +1,138 @@
+"""Share one in-flight call between concurrent callers asking for the same key.
+
+The first caller of a key runs the call, callers arriving while it runs
+wait for and get its result, or its exception. SharedLock extends this
+across processes through a Django cache: processes that find the lock
+taken wait for the holder to store the result instead of calling too.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from flickr import steps
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.counts = Counter()
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, call):
+        """Return call(), or the result of the identical call already running."""
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Call()
+            self.counts['calls' if leader else 'coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+            return flight.result
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight.done.set()
+
+    async def ado(self, key, call):
+        """Same as do, for a call() returning an awaitable, within one event loop."""
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            future = self._futures.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._futures[loop, key] = loop.create_future()
+            self.counts['calls' if leader else 'coalesced'] += 1
+
+        if not leader:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled, e.g. by a timeout of its own.
+                return await self.ado(key, call)
+
+        try:
+            result = await call()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # Nobody else may be waiting, do not warn about a lost exception.
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._futures[loop, key]
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class SharedLock:
+    """Per key lock in a Django cache, held at most timeout seconds.
+
+    async_wait makes the cache calls, which block, in a thread.
+    """
+
+    def __init__(self, cache, timeout=10, poll=0.05):
+        self.cache = cache
+        self.timeout = timeout
+        self.poll = poll
+
+    def acquire(self, key):
+        return self.cache.add('flickr:lock:' + key, 1, self.timeout)
+
+    def release(self, key):
+        self.cache.delete('flickr:lock:' + key)
+
+    def held(self, key):
+        return self.cache.get('flickr:lock:' + key) is not None
+
+    def wait(self, key, get):
+        """Poll get() while the lock of key is held, return its first result or None."""
+        return steps.run(self.wait_steps(key, get))
+
+    async def async_wait(self, key, get):
+        """Same as wait, for async callers."""
+        return await steps.arun(self.wait_steps(key, get))
+
+    def wait_steps(self, key, get):
+        """wait as flickr.steps, to be run by the caller's steps."""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            value = yield steps.blocking(get)
+            if value is not None:
+                return value
+            if not (yield steps.blocking(self.held, key)):
+                return (yield steps.blocking(get))
+            yield steps.sleep(self.poll)
+        return None
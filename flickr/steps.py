@@ -0,0 +1,84 @@
+"""Logic written once for the sync and the async Flickr clients.
+
+Steps are a generator yielding the calls it needs made and receiving their
+results, or their exceptions. run() makes the calls blocking, arun()
+awaits them:
+
+    def pool_steps(f, groupid):
+        response = yield lambda: f.groups.pools.getPhotos(group_id=groupid)
+        return response['photos']['photo']
+
+    photos = run(pool_steps(client.get_client(), groupid))
+    photos = await arun(pool_steps(aio.AsyncFlickrClient(), groupid))
+
+arun() awaits what a call returns when it is awaitable. Calls that block
+without being awaitable, such as cache lookups, are yielded as
+blocking(fn, *args) so arun() makes them in a thread, and waits as sleep().
+"""
+import asyncio
+import inspect
+import time
+
+from asgiref.sync import sync_to_async
+
+
+class _Blocking:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+
+class _Sleep:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+def blocking(fn, *args):
+    return _Blocking(fn, args)
+
+
+def sleep(seconds):
+    return _Sleep(seconds)
+
+
+def run(steps):
+    """Result of steps, making their calls in this thread."""
+    resume, value = steps.send, None
+    while True:
+        try:
+            step = resume(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if isinstance(step, _Sleep):
+                value = time.sleep(step.seconds)
+            elif isinstance(step, _Blocking):
+                value = step.fn(*step.args)
+            else:
+                value = step()
+            resume = steps.send
+        except BaseException as err:
+            # Let the steps handle it, or clean up on their way out.
+            resume, value = steps.throw, err
+
+
+async def arun(steps):
+    """Same as run, awaiting the calls."""
+    resume, value = steps.send, None
+    while True:
+        try:
+            step = resume(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if isinstance(step, _Sleep):
+                value = await asyncio.sleep(step.seconds)
+            elif isinstance(step, _Blocking):
+                value = await sync_to_async(step.fn)(*step.args)
+            else:
+                value = step()
+                if inspect.isawaitable(value):
+                    value = await value
+            resume = steps.send
+        except BaseException as err:
+            resume, value = steps.throw, err
@@ -0,0 +1,96 @@
+"""Incremental sync of a Flickr user's photos, favorites and contacts.
+
+Person.updated_at records when the last sync started. The next sync only
+asks Flickr for photos uploaded and favorites added since then, through the
+min_upload_date and min_fave_date arguments. Contacts have no such cursor
+and are always fetched in full.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from flickr import client, ingest
+from flickr.models import Person, Following
+from flickr.paging import walk
+
+log = logging.getLogger(__name__)
+
+PHOTO_EXTRAS = 'date_upload,date_taken,owner_name,views,tags,url_q,url_z'
+
+# Photos uploaded or faved while the previous sync ran must not be missed.
+CURSOR_OVERLAP = timedelta(minutes=5)
+
+
+def sync_person(nsid, f=None, full=False, progress=None):
+    """Pull the deltas for nsid into Person, Fav and Following.
+
+    :param full: ignore the cursor and fetch everything
+    :param progress: called with (steps done, steps, step name) between steps
+    :return: dict with the photo count and the fav and following ingest totals
+    """
+    f = f or client.get_client()
+    progress = progress or (lambda done, total, message: None)
+    started_at = timezone.now()
+    person, _ = Person.objects.get_or_create(flickrid=nsid)
+
+    since = cursor(person, full)
+    log.debug('Syncing {} since {}'.format(nsid, since))
+
+    result = {}
+    steps = [('photos', sync_photos), ('favs', sync_favs), ('following', sync_following)]
+    for done, (name, step) in enumerate(steps):
+        progress(done, len(steps) + 1, name)
+        result[name] = step(f, person, since)
+    progress(len(steps), len(steps) + 1, 'info')
+
+    person.info = f.people.getInfo(user_id=nsid)['person']
+    person.updated_at = started_at
+    person.save(update_fields=['info', 'updated_at'])
+    return result
+
+
+def cursor(person, full=False):
+    """min_*_date argument for the next sync of person, None to fetch everything."""
+    if full or person.updated_at is None:
+        return None
+    return int((person.updated_at - CURSOR_OVERLAP).timestamp())
+
+
+def sync_photos(f, person, since=None):
+    kwargs = {'min_upload_date': since} if since else {}
+    photos = list(walk(f.people.getPhotos, user_id=person.flickrid,
+                       extras=PHOTO_EXTRAS, **kwargs))
+    if not photos:
+        return 0
+
+    fetched_ids = {photo['id'] for photo in photos}
+    kept = [photo for photo in person.photos if photo['id'] not in fetched_ids]
+    person.photos = photos + kept
+    person.save(update_fields=['photos'])
+    return len(photos)
+
+
+def sync_favs(f, person, since=None):
+    kwargs = {'min_fave_date': since} if since else {}
+    photos = walk(f.favorites.getList, user_id=person.flickrid,
+                  extras=PHOTO_EXTRAS, **kwargs)
+    return ingest.totals(ingest.upsert_favs(person.flickrid, photos))
+
+
+def sync_following(f, person, since=None):
+    """Contacts have no cursor, since is ignored."""
+    contacts = walk(f.contacts.getPublicList, user_id=person.flickrid)
+    nsids = []
+
+    def followed_nsids():
+        for contact in contacts:
+            nsids.append(contact['nsid'])
+            yield contact['nsid']
+
+    with transaction.atomic():
+        reports = ingest.upsert_following(person.flickrid, followed_nsids())
+        Following.objects.filter(follower=person).exclude(followed_id__in=nsids).delete()
+    return ingest.totals(reports)
+
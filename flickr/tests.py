@@ -1,3 +1,1749 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+from django import forms as django_forms
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+from flickrapi import FlickrError
+from flickrapi.auth import FlickrAccessToken
+
+from config import jinja2
+from flickr import (aio, async_views, catalog, client, exports, fanout, flickrutils, forms,
+                    fragments, ingest, instrumentation, jobs, paging, queries, quota, reflection,
+                    resolver, response_cache, steps, sync, tokens)
+from flickr.fake_flickr import (SERVICE_UNAVAILABLE, USER_NOT_FOUND, FakeFlickr, FlickrFail,
+                                fake_flickr_adapter, serve_in_thread)
+from flickr.models import Fav, Following, Job, Person, photo_columns
+from flickr.singleflight import SharedLock, SingleFlight
+from flickr.views import FRAGMENT_SEPARATOR
+
+USER = '38954353@N06'
+
+TEST_SETTINGS = dict(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    FLICKR_FANOUT=dict(settings.FLICKR_FANOUT, MODE='server'),
+    FLICKR_QUOTA=dict(settings.FLICKR_QUOTA, LIMIT=None),
+    FLICKR_RESPONSE_CACHE=dict(settings.FLICKR_RESPONSE_CACHE, METHODS={}),
+    FLICKR_FRAGMENT_CACHE=dict(settings.FLICKR_FRAGMENT_CACHE, TTL=0),
+    FLICKR_METHOD_CATALOG=dict(settings.FLICKR_METHOD_CATALOG,
+                               PATH=os.path.join(settings.BASE_DIR, 'no-such-catalog.json')),
+)
+
+
+def reset_singletons():
+    """Drop the per-process caches and clients, so every test starts cold."""
+    response_cache._cache = None
+    fragments._cache = None
+    reflection._cache = None
+    quota._scheduler = None
+    catalog._catalog = None
+    client._transport = None
+    client._pool = None
+    resolver._memory = None
+    forms._form_classes.clear()
+
+
+@override_settings(**TEST_SETTINGS)
+class FakeFlickrTestCase(SimpleTestCase):
+    """Runs the views against flickr.fake_flickr, in process."""
+    fake_options = dict(groups_per_user=3, photos_per_pool=5)
+
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+        self.fake = FakeFlickr(**self.fake_options)
+        client.get_transport().mount(settings.FLICKR_REST_URL, fake_flickr_adapter(self.fake))
+
+
+class ViewTests(FakeFlickrTestCase):
+    def test_api_index_lists_the_methods(self):
+        response = self.client.get('/api/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'flickr.groups.pools.getPhotos')
+        self.assertEqual(self.fake.stats().get('flickr.reflection.getMethods'), 1)
+
+    def test_api_search(self):
+        response = self.client.get('/api/search', {'q': 'getph'})
+
+        names = [method['name'] for method in response.json()['methods']]
+        self.assertIn('flickr.groups.pools.getPhotos', names)
+
+    def test_explorer_form(self):
+        response = self.client.get('/flickr.groups.pools.getPhotos')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="group_id"')
+
+    def test_explorer_unknown_method(self):
+        response = self.client.get('/flickr.nothing.here')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_explorer_call(self):
+        response = self.client.post('/flickr.groups.pools.getPhotos',
+                                    {'group_id': '1@N20', 'per_page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Photo 1')
+        self.assertNotContains(response, 'Photo 2')
+
+    def test_groups_page(self):
+        response = self.client.get('/people/{}/groups/'.format(USER))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Group 2 of {}'.format(USER))
+        self.assertEqual(self.fake.stats().get('flickr.groups.pools.getPhotos'), None)
+
+    def test_groups_stream(self):
+        response = self.client.get('/people/{}/groups/'.format(USER), {'stream': 1})
+
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(body.count(FRAGMENT_SEPARATOR), 3)
+        self.assertEqual(self.fake.stats()['flickr.groups.pools.getPhotos'], 3)
+
+    def test_streamed_fanouts_are_made_for_the_request(self):
+        group_fragment = fragments.group_fragment
+        contexts = []
+
+        def recording(f, request, userid, groupid, groupname):
+            contexts.append((quota._user.get(), quota._priority.get(),
+                             instrumentation._request_calls.get() is not None))
+            return group_fragment(f, request, userid, groupid, groupname)
+
+        groups = json.dumps({'groups': [{'nsid': '1@N20', 'name': 'One'}]})
+        with mock.patch('flickr.fragments.group_fragment', recording):
+            for response in (
+                    self.client.get('/people/{}/groups/'.format(USER), {'stream': 1}),
+                    self.client.post('/people/{}/groups/batch'.format(USER), groups,
+                                     content_type='application/json')):
+                b''.join(response.streaming_content)
+
+        self.assertEqual(contexts, [('127.0.0.1', quota.FANOUT, True)] * 4)
+
+    def test_groups_batch(self):
+        groups = [{'nsid': '1@N20', 'name': 'One'}, {'nsid': '2@N21', 'name': 'Two'},
+                  {'nsid': '1@N20', 'name': 'One'}]
+        response = self.client.post('/people/{}/groups/batch?format=json'.format(USER),
+                                    json.dumps({'groups': groups}),
+                                    content_type='application/json')
+
+        self.assertEqual([group['nsid'] for group in response.json()['groups']],
+                         ['1@N20', '2@N21'])
+        self.assertEqual(self.fake.stats()['flickr.groups.pools.getPhotos'], 2)
+
+    def test_groups_batch_with_a_failing_group(self):
+        group_fragment = fragments.group_fragment
+
+        def failing(f, request, userid, groupid, groupname):
+            if groupid == '2@N21':
+                raise RuntimeError('template error')
+            return group_fragment(f, request, userid, groupid, groupname)
+
+        groups = [{'nsid': '1@N20', 'name': 'One'}, {'nsid': '2@N21', 'name': 'Two'}]
+        with mock.patch('flickr.fragments.group_fragment', failing), \
+                self.assertLogs('flickr.fanout', 'ERROR'):
+            response = self.client.post('/people/{}/groups/batch?format=json'.format(USER),
+                                        json.dumps({'groups': groups}),
+                                        content_type='application/json')
+
+        rendered = {group['nsid']: group['html'] for group in response.json()['groups']}
+        self.assertIn('Photo 4', rendered['1@N20'])
+        self.assertIn('Two', rendered['2@N21'])
+        self.assertNotIn('Photo 4', rendered['2@N21'])
+
+    def test_groups_batch_malformed(self):
+        response = self.client.post('/people/{}/groups/batch'.format(USER), 'groups',
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_group_fragment(self):
+        response = self.client.post('/people/{}/1@N20'.format(USER), {'group[name]': 'One'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Photo 4')
+
+    def test_photos_page(self):
+        response = self.client.get('/people/{}/photos/'.format(USER), {'per_page': 10})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Photo 9')
+
+
+class InstrumentationTests(FakeFlickrTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(instrumentation, 'metrics', instrumentation.Metrics())
+        self.metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_explorer_call_is_measured(self):
+        response = self.client.post('/flickr.groups.pools.getPhotos',
+                                    {'group_id': '1@N20', 'per_page': 2})
+
+        self.assertRegex(response['Server-Timing'], r'^app;dur=\d+\.\d, '
+                         r'flickr;dur=\d+\.\d;desc="2 calls, 0 cached", '
+                         r'flickr\.groups\.pools\.getPhotos;dur=\d+\.\d;desc="1x", '
+                         r'flickr\.reflection\.getMethodInfo;dur=\d+\.\d;desc="1x"$')
+
+        lines = self.client.get('/metrics').content.decode('utf-8').splitlines()
+        method = 'method="flickr.groups.pools.getPhotos"'
+        for line in ('# TYPE flickr_calls_total counter',
+                     'flickr_calls_total{{{},cache="miss"}} 1'.format(method),
+                     '# TYPE flickr_call_seconds histogram',
+                     'flickr_call_seconds_bucket{{{},le="+Inf"}} 1'.format(method),
+                     'flickr_call_seconds_count{{{}}} 1'.format(method),
+                     'flickr_response_bytes_count{{{}}} 1'.format(method)):
+            self.assertIn(line, lines)
+
+    def test_failed_call_is_measured(self):
+        def get_photos(params):
+            raise FlickrFail(*SERVICE_UNAVAILABLE)
+
+        self.fake.methods['flickr.groups.pools.getPhotos'] = get_photos
+        with self.assertLogs('flickr', 'ERROR'):
+            response = self.client.post('/flickr.groups.pools.getPhotos', {'group_id': '1@N20'})
+
+        self.assertIn('flickr.groups.pools.getPhotos;dur=', response['Server-Timing'])
+        body = self.client.get('/metrics').content.decode('utf-8')
+        self.assertIn('flickr_errors_total{{method="flickr.groups.pools.getPhotos",code="{}"}} 1\n'
+                      .format(SERVICE_UNAVAILABLE[0]), body)
+
+    def test_metrics_for_local_scrapers_only(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TokenTests(FakeFlickrTestCase):
+    access_token = FlickrAccessToken('token', 'secret', 'read', 'Some One', 'someone', '10@N01')
+
+    def session(self, session_key=None):
+        return importlib.import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+
+    def test_round_trip(self):
+        session = self.session()
+        tokens.save(session, self.access_token)
+        session.save()
+
+        token = tokens.load(self.session(session.session_key))
+
+        self.assertEqual(token, tokens.StoredToken('token', 'secret', 'read', 'Some One',
+                                                   'someone', '10@N01'))
+        access_token = token.to_flickrapi()
+        self.assertIsInstance(access_token, FlickrAccessToken)
+        for field in tokens.FIELDS:
+            self.assertEqual(getattr(access_token, field), getattr(self.access_token, field))
+
+    def test_clear(self):
+        session = self.session()
+        tokens.save(session, self.access_token)
+
+        tokens.clear(session)
+        tokens.clear(session)
+
+        self.assertIsNone(tokens.load(session))
+        self.assertNotIn(tokens.SESSION_KEY, session)
+
+    def test_unknown_values_are_dropped(self):
+        fields = {field: getattr(self.access_token, field) for field in tokens.FIELDS}
+        for value in ('token', ['token', 'secret'], dict(fields, user_nsid=None, extra='x'),
+                      {key: fields[key] for key in tokens.FIELDS[:2]}):
+            with self.subTest(value=value):
+                session = {tokens.SESSION_KEY: value}
+
+                self.assertIsNone(tokens.load(session))
+                self.assertEqual(session, {})
+
+    def test_views_treat_a_legacy_token_as_logged_out(self):
+        session = self.session()
+        session[tokens.SESSION_KEY] = ['token', 'secret']
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        response = self.client.post('/flickr.groups.pools.getPhotos', {'group_id': '1@N20'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Photo 1')
+
+    def test_tampered_cookie_is_logged_out(self):
+        session = self.session()
+        tokens.save(session, self.access_token)
+        session.save()
+        signature = session.session_key[-1]
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = (
+            session.session_key[:-1] + ('A' if signature != 'A' else 'B'))
+
+        self.assertIsNone(tokens.load(self.client.session))
+        response = self.client.post('/flickr.groups.pools.getPhotos', {'group_id': '1@N20'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(FLICKR_FRAGMENT_CACHE=dict(settings.FLICKR_FRAGMENT_CACHE, TTL=60, FRESH=60))
+class FragmentCacheTests(FakeFlickrTestCase):
+    token = tokens.StoredToken('token', 'secret', 'read', 'Someone', 'someone', '10@N01')
+
+    def pool_calls(self):
+        return self.fake.stats().get('flickr.groups.pools.getPhotos')
+
+    def test_posted_names_are_not_cached(self):
+        url = '/people/{}/1@N20'.format(USER)
+        first = self.client.post(url, {'group[name]': 'One'})
+        second = self.client.post(url, {'group[name]': '<i>Not One</i>'})
+        third = self.client.post(url, {'group[name]': 'One'})
+
+        self.assertContains(first, '<h4>One</h4>')
+        self.assertContains(second, '<h4>&lt;i&gt;Not One&lt;/i&gt;</h4>')
+        self.assertContains(third, '<h4>One</h4>')
+        self.assertNotContains(third, 'Not One')
+        self.assertContains(third, 'Photo 4')
+        self.assertEqual(self.pool_calls(), 1)
+
+    def test_scopes_are_cached_apart(self):
+        public = client.FlickrClient()
+        private = client.FlickrClient(token=self.token)
+
+        html = [fragments.group_fragment(f, None, USER, '1@N20', 'One')
+                for f in (public, private, public, private)]
+
+        self.assertEqual(self.pool_calls(), 2)
+        self.assertEqual(html[0], html[2])
+        self.assertEqual(html[1], html[3])
+        self.assertEqual(fragments.stats().get('hits'), 2)
+
+
+def interrupted(source, after):
+    """Patch the records of source to fail after that many."""
+    records, fields = exports.SOURCES[source]
+
+    def interrupted_records(*args, **kwargs):
+        for count, item in enumerate(records(*args, **kwargs)):
+            if count == after:
+                raise RuntimeError('Interrupted')
+            yield item
+
+    return mock.patch.dict(exports.SOURCES, {source: (interrupted_records, fields)})
+
+
+@override_settings(FLICKR_EXPORT=dict(exports.DEFAULTS, PER_PAGE=3, CHECKPOINT_EVERY=2,
+                                      PART_ROWS=2, ROW_GROUP_SIZE=1))
+class ExportTests(FakeFlickrTestCase):
+    fake_options = dict(groups_per_user=2, photos_per_pool=5, favorites_per_user=7)
+    titles = ['Photo {}'.format(index) for index in range(7)]
+
+    def setUp(self):
+        super().setUp()
+        self.f = client.FlickrClient()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def stream(self, source, fmt, skip=0):
+        return b''.join(exports.stream(self.f, USER, source, fmt, skip=skip, chunk_size=100))
+
+    def read_csv(self, data, fields=None):
+        fieldnames = [name for name, kind in fields] if fields else None
+        return list(csv.DictReader(io.StringIO(data.decode('utf-8')), fieldnames))
+
+    def read_ndjson(self, data):
+        return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+    def test_ndjson(self):
+        records = self.read_ndjson(self.stream('favorites', 'ndjson'))
+
+        self.assertEqual([record['title'] for record in records], self.titles)
+        self.assertEqual(set(records[0]), {name for name, kind in exports.FAVORITE_FIELDS})
+        self.assertIsInstance(records[0]['views'], int)
+        self.assertEqual(records[0]['date_faved'], 1500000000)
+
+    def test_csv(self):
+        rows = self.read_csv(self.stream('groups', 'csv'))
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(list(rows[0]), [name for name, kind in exports.GROUP_FIELDS])
+        self.assertEqual(rows[0]['group_name'], 'Group 0 of {}'.format(USER))
+        self.assertEqual([row['title'] for row in rows[:5]], self.titles[:5])
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'Parquet exports need pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(io.BytesIO(self.stream('favorites', 'parquet')))
+
+        self.assertEqual(table.to_pylist(), self.read_ndjson(self.stream('favorites', 'ndjson')))
+
+    def test_skip(self):
+        rows = self.read_csv(self.stream('favorites', 'csv', skip=5), exports.FAVORITE_FIELDS)
+        self.assertEqual([row['title'] for row in rows], self.titles[5:])
+
+        # Past the first pool of 5 photos.
+        records = self.read_ndjson(self.stream('groups', 'ndjson', skip=6))
+        self.assertEqual([record['title'] for record in records], self.titles[1:5])
+        self.assertEqual({record['group_name'] for record in records},
+                         {'Group 1 of {}'.format(USER)})
+
+    def export_file(self, fmt, path):
+        return exports.export_file(self.f, USER, 'favorites', fmt, path)
+
+    def test_resume_after_checkpoint(self):
+        for fmt, read in (('ndjson', self.read_ndjson), ('csv', self.read_csv)):
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.directory, 'favorites.' + fmt)
+                with interrupted('favorites', 5), self.assertRaises(RuntimeError):
+                    self.export_file(fmt, path)
+                self.assertEqual(exports.load_checkpoint(path + '.checkpoint')['records'], 4)
+
+                self.assertEqual(self.export_file(fmt, path)['new'], 3)
+                with open(path, 'rb') as fp:
+                    self.assertEqual([record['title'] for record in read(fp.read())],
+                                     self.titles)
+                self.assertEqual(self.export_file(fmt, path)['new'], 0)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'Parquet exports need pyarrow')
+    def test_resume_parquet_after_checkpoint(self):
+        import pyarrow.parquet
+
+        path = os.path.join(self.directory, 'favorites')
+        with interrupted('favorites', 5), self.assertRaises(RuntimeError):
+            self.export_file('parquet', path)
+        self.assertEqual(exports.load_checkpoint(path + '.checkpoint')['parts'], 2)
+
+        result = self.export_file('parquet', path)
+        self.assertEqual((result['records'], result['new']), (7, 3))
+        parts = sorted(os.listdir(path))
+        self.assertEqual(len(parts), 4)
+        titles = [title for part in parts for title in pyarrow.parquet.read_table(
+            os.path.join(path, part)).column('title').to_pylist()]
+        self.assertEqual(titles, self.titles)
+
+    def test_checkpoint_of_another_export(self):
+        path = os.path.join(self.directory, 'favorites.ndjson')
+        self.export_file('ndjson', path)
+
+        with self.assertRaises(exports.ExportError):
+            exports.export_file(self.f, USER, 'groups', 'ndjson', path)
+
+    def test_view(self):
+        url = '/people/{}/export/favorites.csv'.format(USER)
+        response = self.client.get(url)
+
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="38954353_N06-favorites.csv"')
+        rows = self.read_csv(b''.join(response.streaming_content))
+        self.assertEqual([row['title'] for row in rows], self.titles)
+
+        resumed = b''.join(self.client.get(url, {'skip': 5}).streaming_content)
+        self.assertEqual(len(resumed.splitlines()), 2)
+
+    def test_view_bad_request(self):
+        for url in ('favorites.xml', 'favorites.csv?skip=-1', 'favorites.csv?skip=all'):
+            with self.subTest(url=url):
+                response = self.client.get('/people/{}/export/{}'.format(USER, url))
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(**TEST_SETTINGS)
+class TransportErrorTests(SimpleTestCase):
+    """Against fake_flickr over a socket, through the retrying HTTPAdapter."""
+
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+        self.fake = FakeFlickr(http_error_rate=1.0)
+        self.server, self.url = serve_in_thread(self.fake)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def new_client(self):
+        with self.settings(FLICKR_REST_URL=self.url):
+            return client.FlickrClient(transport=client.Transport(2, 60, retries=1, backoff=0))
+
+    def test_exhausted_retries_raise_flickr_error(self):
+        with self.assertRaises(FlickrError):
+            self.new_client().people.getGroups(user_id=USER)
+        self.assertEqual(self.fake.stats()['flickr.people.getGroups'], 2)
+
+    def test_connection_error_raises_flickr_error(self):
+        f = self.new_client()
+        self.server.shutdown()
+        self.server.server_close()
+
+        with self.assertRaises(FlickrError):
+            f.people.getGroups(user_id=USER)
+
+    def test_views_answer_with_the_error(self):
+        fake = FakeFlickr()
+        catalog.set_catalog(catalog.Catalog({
+            'flickr.groups.pools.getPhotos': dict(
+                fake.get_method_info({'method_name': 'flickr.groups.pools.getPhotos'}),
+                stat='ok')}))
+        groups = json.dumps({'groups': [{'nsid': '1@N20', 'name': 'One'}]})
+
+        with self.settings(FLICKR_REST_URL=self.url, FLICKR_CLIENT=dict(
+                settings.FLICKR_CLIENT, RETRIES=1, BACKOFF=0)):
+            explored = self.client.post('/flickr.groups.pools.getPhotos', {'group_id': '1@N20'})
+            batch = self.client.post('/people/{}/groups/batch?format=json'.format(USER), groups,
+                                     content_type='application/json')
+
+        self.assertContains(explored, 'Status code 503')
+        self.assertEqual([group['nsid'] for group in batch.json()['groups']], ['1@N20'])
+
+
+class FanoutTests(SimpleTestCase):
+    groups = [{'nsid': '1@N20'}, {'nsid': '2@N21'}, {'nsid': '3@N22'}]
+
+    def fetch(self, f, userid, groupid):
+        if groupid == '2@N21':
+            raise FlickrError('Error: 105: Service currently unavailable', code=105)
+        if groupid == '3@N22':
+            raise KeyError('photos')
+        return [groupid]
+
+    def test_failing_groups_are_yielded_with_their_error(self):
+        with self.assertLogs('flickr.fanout', 'ERROR'):
+            results = {group['nsid']: (photos, err) for group, photos, err in
+                       fanout.fetch_group_pools(None, USER, self.groups, fetch=self.fetch)}
+
+        self.assertEqual(results['1@N20'], (['1@N20'], None))
+        self.assertEqual(results['2@N21'][0], [])
+        self.assertIsInstance(results['2@N21'][1], FlickrError)
+        self.assertEqual(results['3@N22'][0], [])
+        self.assertIsInstance(results['3@N22'][1], KeyError)
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_nsid(self):
+        self.assertEqual(resolver.normalize(' 38954353@n06 '), (resolver.NSID, USER))
+
+    def test_alias(self):
+        self.assertEqual(resolver.normalize('JellyBeanzGallery'),
+                         (resolver.ALIAS, 'jellybeanzgallery'))
+
+    def test_profile_urls(self):
+        for url in ('https://www.flickr.com/photos/jellybeanzgallery/albums',
+                    'http://flickr.com/people/JellyBeanzGallery',
+                    'www.flickr.com/photos/jellybeanzgallery/',
+                    'flickr.com/photos/jellybeanzgallery'):
+            with self.subTest(url=url):
+                self.assertEqual(resolver.normalize(url), (resolver.ALIAS, 'jellybeanzgallery'))
+
+    def test_profile_url_with_nsid(self):
+        self.assertEqual(resolver.normalize('https://www.flickr.com/photos/38954353@N06/'),
+                         (resolver.NSID, USER))
+
+    def test_other_urls(self):
+        for url in ('https://www.flickr.com/groups/flickrcentral/',
+                    'https://flic.kr/ps/abc', 'https://www.flickr.com/photos/'):
+            with self.subTest(url=url):
+                self.assertEqual(resolver.normalize(url), (resolver.URL, url))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            resolver.normalize('not an alias')
+
+
+@mock.patch('flickr.resolver._store')
+@mock.patch('flickr.resolver._stored_aliases', return_value={})
+class ResolveManyTests(SimpleTestCase):
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+
+    def lookup_user(self, url):
+        if 'broken' in url:
+            raise FlickrError('Error: 1: User not found', code=1)
+        if 'garbled' in url:
+            return {'stat': 'ok'}
+        return {'user': {'id': '1@N01'}}
+
+    def test_partial_failure(self, stored_aliases, store):
+        f = mock.Mock()
+        f.urls.lookupUser.side_effect = self.lookup_user
+
+        with self.assertLogs('flickr.resolver', 'ERROR'):
+            resolved, errors = resolver.resolve_many(
+                f, ['jellybean', 'broken', 'garbled', USER, 'not an alias'])
+
+        self.assertEqual(resolved, {'jellybean': '1@N01', USER: USER})
+        self.assertIsInstance(errors['broken'], FlickrError)
+        self.assertIsInstance(errors['garbled'], KeyError)
+        self.assertIsInstance(errors['not an alias'], ValueError)
+        store.assert_called_once_with({'jellybean': '1@N01'})
+
+    def test_resolved_aliases_are_remembered(self, stored_aliases, store):
+        f = mock.Mock()
+        f.urls.lookupUser.side_effect = self.lookup_user
+
+        resolver.resolve(f, 'https://www.flickr.com/photos/jellybean/')
+        self.assertEqual(resolver.resolve(f, 'jellybean'), '1@N01')
+
+        self.assertEqual(f.urls.lookupUser.call_count, 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class AsyncClientErrorTests(SimpleTestCase):
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+
+    def call(self, handler):
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        f = aio.AsyncFlickrClient(http=http)
+        return asyncio.run(f.people.getGroups(user_id=USER))
+
+    def test_ok(self):
+        response = self.call(lambda request: httpx.Response(
+            200, json={'stat': 'ok', 'groups': {'group': []}}))
+
+        self.assertEqual(response['groups'], {'group': []})
+
+    def test_flickr_error(self):
+        with self.assertRaises(FlickrError) as raised:
+            self.call(lambda request: httpx.Response(
+                200, json={'stat': 'fail', 'code': 105, 'message': 'Service unavailable'}))
+
+        self.assertEqual(raised.exception.code, 105)
+
+    def test_http_error(self):
+        with self.assertRaises(FlickrError):
+            self.call(lambda request: httpx.Response(503, text='Service Unavailable'))
+
+    def test_transport_error(self):
+        def handler(request):
+            raise httpx.ConnectError('Connection refused', request=request)
+
+        with self.assertRaises(FlickrError):
+            self.call(handler)
+
+    def test_invalid_json(self):
+        with self.assertRaises(FlickrError):
+            self.call(lambda request: httpx.Response(200, text='<html>'))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class SchedulerTests(SimpleTestCase):
+    def scheduler(self, burst=1, reserve=None, deadlines=None):
+        self.clock = FakeClock()
+        return quota.Scheduler(rate=1, burst=burst, reserve=reserve or {},
+                               deadlines=deadlines or {}, clock=self.clock)
+
+    def queue(self, scheduler, *calls):
+        """Queue (user, priority) calls without blocking, return their waiters."""
+        with scheduler._lock:
+            return [scheduler._enqueue(user, priority, self.clock())
+                    for user, priority in calls]
+
+    def granted(self, scheduler, waiters, seconds):
+        """Indexes of the waiters granted after seconds, in the order they were."""
+        order = []
+        for _ in range(seconds):
+            self.clock.advance(1)
+            with scheduler._lock:
+                scheduler._dispatch(self.clock())
+            order += [i for i, waiter in enumerate(waiters)
+                      if waiter.granted.is_set() and i not in order]
+        return order
+
+    def test_burst_then_refill(self):
+        scheduler = self.scheduler(burst=3)
+        for _ in range(3):
+            scheduler.acquire('a')
+        waiter, = self.queue(scheduler, ('a', quota.INTERACTIVE))
+
+        self.assertFalse(waiter.granted.is_set())
+        self.assertEqual(self.granted(scheduler, [waiter], 1), [0])
+
+    def test_priority(self):
+        scheduler = self.scheduler()
+        scheduler.acquire('a')
+        waiters = self.queue(scheduler, ('a', quota.BACKGROUND), ('b', quota.FANOUT),
+                             ('c', quota.INTERACTIVE))
+
+        self.assertEqual(self.granted(scheduler, waiters, 3), [2, 1, 0])
+
+    def test_fair_share_between_users(self):
+        scheduler = self.scheduler()
+        scheduler.acquire('a')
+        waiters = self.queue(scheduler, *[('a', quota.INTERACTIVE)] * 3,
+                             ('b', quota.INTERACTIVE))
+
+        # b has made no call yet, a one.
+        self.assertEqual(self.granted(scheduler, waiters, 4), [3, 0, 1, 2])
+
+    def test_reserve(self):
+        scheduler = self.scheduler(burst=10, reserve={quota.BACKGROUND: 0.5},
+                                   deadlines={quota.BACKGROUND: 0.5})
+        for _ in range(5):
+            scheduler.acquire('a', quota.BACKGROUND)
+
+        with self.assertRaises(quota.QuotaExceeded):
+            scheduler.acquire('a', quota.BACKGROUND)
+        scheduler.acquire('b', quota.INTERACTIVE)
+        self.assertEqual(scheduler.stats()['granted_interactive'], 1)
+
+    def test_deadline(self):
+        scheduler = self.scheduler(deadlines={quota.INTERACTIVE: 1.5})
+        scheduler.acquire('a')
+        waiters = self.queue(scheduler, ('a', quota.INTERACTIVE), ('b', quota.INTERACTIVE))
+
+        with self.assertRaises(quota.QuotaExceeded):
+            # Behind b, in 2s.
+            scheduler.acquire('c')
+        self.assertEqual(self.granted(scheduler, waiters, 2), [1, 0])
+        self.assertEqual(scheduler.stats()['rejected_interactive'], 1)
+
+    def test_expired_waiter(self):
+        # A fan-out may never take the last token, it waits until its deadline.
+        scheduler = self.scheduler(reserve={quota.FANOUT: 1}, deadlines={quota.FANOUT: 5})
+        scheduler.acquire('a')
+        started = self.clock()
+        waiter, = self.queue(scheduler, ('a', quota.FANOUT))
+
+        self.clock.advance(4)
+        with scheduler._lock:
+            self.assertFalse(scheduler._granted(waiter, started))
+        self.clock.advance(1)
+        with scheduler._lock, self.assertRaises(quota.QuotaExceeded):
+            scheduler._granted(waiter, started)
+        self.assertEqual(scheduler.stats()['expired_fanout'], 1)
+
+    def test_rejected_calls_keep_the_fair_share(self):
+        scheduler = self.scheduler(deadlines={quota.INTERACTIVE: 0.5})
+        scheduler.acquire('a')
+        for _ in range(5):
+            with self.assertRaises(quota.QuotaExceeded):
+                scheduler.acquire('a')
+        waiters = self.queue(scheduler, *[('b', quota.BACKGROUND)] * 3,
+                             ('a', quota.BACKGROUND))
+
+        # Counting only the call a made, its second one comes with b's second.
+        self.assertEqual(self.granted(scheduler, waiters, 4), [0, 1, 3, 2])
+
+    def test_cancelled_call_gives_back_its_slot(self):
+        scheduler = self.scheduler()
+        scheduler.acquire('a')
+        first, = self.queue(scheduler, ('a', quota.BACKGROUND))
+        with scheduler._lock:
+            scheduler._cancel(first)
+        waiters = self.queue(scheduler, ('b', quota.BACKGROUND), ('a', quota.BACKGROUND))
+
+        self.assertEqual(waiters[1].tag, first.tag)
+        self.assertEqual(self.granted(scheduler, waiters, 2), [0, 1])
+
+    def test_limit_and_burst_are_split_between_processes(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+        with self.settings(FLICKR_QUOTA=dict(quota.DEFAULTS, LIMIT=3600, BURST=60,
+                                             PROCESSES=4)):
+            scheduler = quota.get_scheduler()
+
+        self.assertEqual(scheduler.rate, 0.25)
+        self.assertEqual(scheduler.burst, 15)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.001)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_together(self, flights, call, callers=4):
+        """do(call) from callers threads, the leader returning once all joined."""
+        release = threading.Event()
+        results = []
+
+        def leader_call():
+            release.wait(5)
+            return call()
+
+        def run():
+            try:
+                results.append(flights.do('key', leader_call))
+            except Exception as err:
+                results.append(err)
+
+        threads = [threading.Thread(target=run) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: flights.stats().get('coalesced') == callers - 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_do_shares_the_result(self):
+        flights = SingleFlight()
+        calls = []
+
+        results = self.run_together(flights, lambda: calls.append(1) or {'stat': 'ok'})
+
+        self.assertEqual(results, [{'stat': 'ok'}] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {'calls': 1, 'coalesced': 3})
+        self.assertEqual(flights._calls, {})
+
+    def test_do_shares_the_error(self):
+        error = FlickrError('Error: 105: Service currently unavailable', code=105)
+
+        def call():
+            raise error
+
+        results = self.run_together(SingleFlight(), call)
+
+        self.assertEqual(results, [error] * 4)
+
+    def test_do_after_a_flight_calls_again(self):
+        flights = SingleFlight()
+
+        self.assertEqual(flights.do('key', lambda: 1), 1)
+        self.assertEqual(flights.do('key', lambda: 2), 2)
+
+    def test_ado_shares_the_result(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'stat': 'ok'}
+
+        async def main():
+            return await asyncio.gather(*[flights.ado('key', call) for _ in range(4)])
+
+        self.assertEqual(asyncio.run(main()), [{'stat': 'ok'}] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights._futures, {})
+
+    def test_ado_shares_the_error(self):
+        flights = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise FlickrError('Error: 105: Service currently unavailable', code=105)
+
+        async def main():
+            return await asyncio.gather(*[flights.ado('key', call) for _ in range(3)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(result, FlickrError) for result in results))
+        self.assertEqual(flights.stats(), {'calls': 1, 'coalesced': 2})
+
+    def test_ado_follower_takes_over_from_a_cancelled_leader(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.ensure_future(flights.ado('key', call))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.ado('key', call))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower, leader.cancelled()
+
+        self.assertEqual(asyncio.run(main()), (2, True))
+        self.assertEqual(flights._futures, {})
+
+
+class SharedLockTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('shared-lock-tests', {})
+        self.cache.clear()
+        self.lock = SharedLock(self.cache, timeout=1, poll=0.001)
+
+    def test_acquire(self):
+        self.assertTrue(self.lock.acquire('key'))
+        self.assertFalse(self.lock.acquire('key'))
+        self.lock.release('key')
+        self.assertTrue(self.lock.acquire('key'))
+
+    def test_wait_returns_the_stored_result(self):
+        self.lock.acquire('key')
+        gets = iter([None, None, {'stat': 'ok'}])
+
+        self.assertEqual(self.lock.wait('key', lambda: next(gets)), {'stat': 'ok'})
+
+    def test_wait_falls_back_when_the_holder_released(self):
+        self.lock.acquire('key')
+        self.lock.release('key')
+
+        self.assertIsNone(self.lock.wait('key', lambda: None))
+
+    def test_wait_gives_up_after_the_timeout(self):
+        self.lock.timeout = 0.02
+        self.lock.acquire('key')
+        started = time.monotonic()
+
+        self.assertIsNone(self.lock.wait('key', lambda: None))
+        self.assertGreaterEqual(time.monotonic() - started, 0.02)
+
+    def test_async_wait(self):
+        self.lock.acquire('key')
+        gets = iter([None, {'stat': 'ok'}])
+
+        async def main():
+            return await self.lock.async_wait('key', lambda: next(gets))
+
+        self.assertEqual(asyncio.run(main()), {'stat': 'ok'})
+
+    def test_async_wait_falls_back_when_the_holder_released(self):
+        self.lock.acquire('key')
+        self.lock.release('key')
+
+        async def main():
+            return await self.lock.async_wait('key', lambda: None)
+
+        self.assertIsNone(asyncio.run(main()))
+
+    def test_async_wait_does_not_block_the_loop(self):
+        self.lock.acquire('key')
+        gets = iter([None, None, {'stat': 'ok'}])
+        threads = set()
+
+        def get():
+            threads.add(threading.get_ident())
+            return next(gets)
+
+        async def main():
+            return await self.lock.async_wait('key', get)
+
+        self.assertEqual(asyncio.run(main()), {'stat': 'ok'})
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+@override_settings(**TEST_SETTINGS)
+class ReflectionCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_entries_from_the_shared_cache_are_bounded(self):
+        writer = reflection.ReflectionCache(backend='default')
+        for name in ('a', 'b', 'c'):
+            writer.set(name, {'name': name})
+        reader = reflection.ReflectionCache(backend='default', max_entries=2)
+
+        for name in ('a', 'b', 'c'):
+            self.assertEqual(reader.get(name, None), {'name': name})
+
+        self.assertEqual(list(reader._entries), ['b', 'c'])
+
+    def test_fetch_once(self):
+        cache = reflection.ReflectionCache()
+        calls = []
+
+        for _ in range(2):
+            self.assertEqual(cache.get('methods', lambda: calls.append(1) or 'methods'), 'methods')
+        self.assertEqual(len(calls), 1)
+
+
+class FlickrFormTests(SimpleTestCase):
+    METHOD_INFO = {'arguments': {'argument': [
+        {'name': 'api_key', '_content': 'Your API application key.', 'optional': 0},
+        {'name': 'user_id', '_content': 'The NSID of the user.', 'optional': 0},
+        {'name': 'min_fave_date', '_content': 'Minimum date.', 'optional': 1},
+        {'name': 'max_taken_date', '_content': 'Maximum taken date.', 'optional': 1},
+        {'name': 'per_page', '_content': 'Photos per page.', 'optional': 1},
+        {'name': 'page', '_content': 'The page.', 'optional': 1},
+    ]}}
+
+    def setUp(self):
+        forms._form_classes.clear()
+        self.addCleanup(forms._form_classes.clear)
+
+    def form(self, data):
+        return forms.flickr_form_class('flickr.favorites.getList', lambda: self.METHOD_INFO)(data)
+
+    def test_fields(self):
+        fields = self.form({}).fields
+
+        self.assertIsInstance(fields['page'], django_forms.IntegerField)
+        self.assertIsInstance(fields['per_page'], django_forms.IntegerField)
+        self.assertIsInstance(fields['min_fave_date'], forms.FlickrDateField)
+        self.assertIsInstance(fields['user_id'], django_forms.CharField)
+        self.assertFalse(fields['api_key'].required)
+        self.assertTrue(fields['user_id'].required)
+        self.assertEqual(fields['user_id'].help_text, 'The NSID of the user.')
+
+    def test_built_once(self):
+        calls = []
+
+        def load_method_info():
+            calls.append(1)
+            return self.METHOD_INFO
+
+        form_class = forms.flickr_form_class('flickr.favorites.getList', load_method_info)
+
+        self.assertIs(forms.flickr_form_class('flickr.favorites.getList', load_method_info),
+                      form_class)
+        self.assertEqual(len(calls), 1)
+
+    def test_cleaned_data(self):
+        form = self.form({'user_id': '1@N01', 'min_fave_date': '2020-01-02 03:04:05',
+                          'max_taken_date': '1577934245', 'page': '2', 'per_page': '',
+                          'api_key': ''})
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data, {'user_id': '1@N01', 'min_fave_date': 1577934245,
+                                             'max_taken_date': '2020-01-02 03:04:05', 'page': 2})
+
+    def test_invalid(self):
+        form = self.form({'user_id': '1@N01', 'min_fave_date': 'yesterday',
+                          'max_taken_date': '2020-13-01', 'page': '0', 'per_page': 'many'})
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'min_fave_date', 'max_taken_date', 'page', 'per_page'})
+
+    def test_required(self):
+        form = self.form({})
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'user_id'})
+
+
+class FlickrDateFieldTests(SimpleTestCase):
+    def test_timestamp(self):
+        field = forms.FlickrDateField()
+
+        self.assertEqual(field.clean('1577934245'), 1577934245)
+        self.assertEqual(field.clean(' 0 '), 0)
+        self.assertEqual(field.clean('2020-01-02 03:04:05'), 1577934245)
+        self.assertEqual(field.clean('2020-01-02'), 1577923200)
+
+    def test_mysql_datetime(self):
+        field = forms.FlickrDateField(mysql_datetime=True)
+
+        self.assertEqual(field.clean('2020-01-02 03:04:05'), '2020-01-02 03:04:05')
+        self.assertEqual(field.clean('1577934245'), '2020-01-02 03:04:05')
+
+    def test_empty(self):
+        field = forms.FlickrDateField(required=False)
+
+        self.assertIsNone(field.clean(''))
+        with self.assertRaises(ValidationError):
+            forms.FlickrDateField().clean('')
+
+    def test_invalid(self):
+        for value in ('yesterday', '-1', '2020-02-30'):
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                forms.FlickrDateField().clean(value)
+
+
+class PhotoUrlTests(SimpleTestCase):
+    photo = {'farm': 6, 'id': '30014555241', 'secret': 'cc74e7f525', 'server': '5631'}
+
+    def test_size_suffix(self):
+        for longest_side, suffix in ((1, 's'), (75, 's'), (99, 's'), (100, 't'), (150, 'q'),
+                                     (639, 'n'), (640, 'z'), (1023, 'c'), (2048, 'k'),
+                                     (5000, 'k')):
+            with self.subTest(longest_side=longest_side):
+                self.assertEqual(flickrutils._get_size_suffix(longest_side), suffix)
+
+    def test_size_suffix_is_the_largest_fitting_size(self):
+        for longest_side in range(75, 2100):
+            fitting = max(side for side in flickrutils.SIZES if side <= longest_side)
+            self.assertEqual(flickrutils._get_size_suffix(longest_side),
+                             flickrutils.SIZES[fitting])
+
+    def test_photo_url(self):
+        self.assertEqual(flickrutils.photo_url(self.photo),
+                         'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_z.jpg')
+        self.assertEqual(flickrutils.photo_url(self.photo, longest_side='240'),
+                         'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_m.jpg')
+        self.assertEqual(flickrutils.photo_url(self.photo, size_suffix='o'),
+                         'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_o.jpg')
+
+    def test_url_extra(self):
+        photo = dict(self.photo, url_m='https://live.staticflickr.com/m.jpg')
+
+        self.assertEqual(flickrutils.photo_url(photo, 'm'), 'https://live.staticflickr.com/m.jpg')
+        self.assertEqual(flickrutils.photo_url(photo, 'z'),
+                         'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_z.jpg')
+        self.assertEqual(flickrutils.photo_url(dict(self.photo, url_z=''), 'z'),
+                         'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_z.jpg')
+
+    def test_photo_urls(self):
+        photos = [self.photo,
+                  dict(self.photo, id='1', url_n='https://live.staticflickr.com/n.jpg'),
+                  dict(self.photo, id='2', farm=1)]
+
+        self.assertEqual(flickrutils.photo_urls(photos, longest_side=320), [
+            'https://farm6.staticflickr.com/5631/30014555241_cc74e7f525_n.jpg',
+            'https://live.staticflickr.com/n.jpg',
+            'https://farm1.staticflickr.com/5631/2_cc74e7f525_n.jpg'])
+        for kwargs in ({}, {'size_suffix': 'q'}, {'longest_side': 1000}):
+            with self.subTest(**kwargs):
+                self.assertEqual(flickrutils.photo_urls(photos, **kwargs),
+                                 [flickrutils.photo_url(photo, **kwargs) for photo in photos])
+        self.assertEqual(flickrutils.photo_urls([]), [])
+
+
+class Jinja2EnvironmentTests(SimpleTestCase):
+    @override_settings(JINJA2_AUTO_RELOAD=True, JINJA2_BYTECODE_CACHE=None)
+    def test_auto_reload_passed_in_is_kept(self):
+        self.assertFalse(jinja2.environment(auto_reload=False).auto_reload)
+        self.assertTrue(jinja2.environment().auto_reload)
+
+
+class StepsTests(SimpleTestCase):
+    def pool_steps(self, call, released):
+        try:
+            response = yield call
+        except FlickrError:
+            response = None
+        finally:
+            yield steps.blocking(released.append, True)
+        yield steps.sleep(0)
+        return response
+
+    def test_run_and_arun_agree(self):
+        async def acall():
+            return 'photos'
+
+        released = []
+        self.assertEqual(steps.run(self.pool_steps(lambda: 'photos', released)), 'photos')
+        self.assertEqual(asyncio.run(steps.arun(self.pool_steps(acall, released))), 'photos')
+        self.assertEqual(released, [True, True])
+
+    def test_errors_are_thrown_into_the_steps(self):
+        def call():
+            raise FlickrError('Error: 1: User not found', code=1)
+
+        async def acall():
+            call()
+
+        released = []
+        self.assertIsNone(steps.run(self.pool_steps(call, released)))
+        self.assertIsNone(asyncio.run(steps.arun(self.pool_steps(acall, released))))
+        self.assertEqual(released, [True, True])
+
+    def test_unhandled_errors_propagate_after_cleanup(self):
+        released = []
+
+        def call():
+            raise KeyError('photos')
+
+        with self.assertRaises(KeyError):
+            steps.run(self.pool_steps(call, released))
+        self.assertEqual(released, [True])
+
+
+@override_settings(**TEST_SETTINGS)
+class AsyncClientTests(SimpleTestCase):
+    """The async paths against fake_flickr, through an httpx mock transport."""
+
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+        self.fake = FakeFlickr(groups_per_user=30, photos_per_pool=5)
+
+    def handler(self, request):
+        params = dict(httpx.QueryParams(request.content.decode('utf-8')))
+        status, data = self.fake.call(params)
+        return httpx.Response(status, json=data)
+
+    def run_async(self, make_coroutine):
+        async def main():
+            http = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+            async with http:
+                return await make_coroutine(aio.AsyncFlickrClient(http=http))
+        return asyncio.run(main())
+
+    def test_apaginate(self):
+        page = self.run_async(lambda f: paging.apaginate(
+            f, 'flickr.people.getGroups', page=2, per_page=25, user_id=USER))
+
+        self.assertEqual(page.paginator.count, 30)
+        self.assertEqual(len(page.object_list), 5)
+
+    def test_apaginate_upstream_pages(self):
+        page = self.run_async(lambda f: paging.apaginate(
+            f, 'flickr.groups.pools.getPhotos', page=2, per_page=2, group_id='1@N20'))
+
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertEqual(page.object_list[0]['title'], 'Photo 2')
+
+    def test_agroup_fragment_revalidates(self):
+        with self.settings(FLICKR_FRAGMENT_CACHE=dict(settings.FLICKR_FRAGMENT_CACHE,
+                                                      TTL=60, FRESH=0)):
+            for _ in range(2):
+                html = self.run_async(lambda f: fragments.agroup_fragment(
+                    f, None, USER, '1@N20', 'One'))
+
+        self.assertIn('Photo 4', html)
+        self.assertEqual(fragments.stats().get('revalidated'), 1)
+        self.assertEqual(self.fake.stats()['flickr.groups.pools.getPhotos'], 2)
+
+    def test_group_fragments_with_a_failing_group(self):
+        agroup_fragment = fragments.agroup_fragment
+
+        async def failing(f, request, userid, groupid, groupname):
+            if groupid == '2@N21':
+                raise KeyError('photos')
+            return await agroup_fragment(f, request, userid, groupid, groupname)
+
+        groups = [{'nsid': '1@N20', 'name': 'One'}, {'nsid': '2@N21', 'name': 'Two'}]
+        with mock.patch('flickr.fragments.agroup_fragment', failing), \
+                self.assertLogs('flickr.async_views', 'ERROR'):
+            results = self.run_async(
+                lambda f: async_views.group_fragments(None, f, USER, groups))
+
+        rendered = {group['nsid']: html for group, html in results}
+        self.assertIn('Photo 4', rendered['1@N20'])
+        self.assertIn('Two', rendered['2@N21'])
+        self.assertNotIn('Photo 4', rendered['2@N21'])
+
+    def test_explorer_call_that_fails(self):
+        method_name = 'flickr.groups.pools.getPhotos'
+        catalog.set_catalog(catalog.Catalog({method_name: dict(
+            self.fake.get_method_info({'method_name': method_name}), stat='ok')}))
+        self.fake.error_rate = 1.0
+        request = RequestFactory().post('/' + method_name, {'group_id': '1@N20'})
+        request.session = {}
+
+        async def explore(f):
+            with mock.patch('flickr.aio.get_http_client', return_value=f.http):
+                return await async_views.FlickrExplore.as_view()(request, method_name=method_name)
+
+        with self.assertLogs('flickr.async_views', 'ERROR'):
+            response = self.run_async(explore)
+
+        self.assertContains(response, 'Service currently unavailable')
+
+    def test_areflection(self):
+        methods = self.run_async(lambda f: reflection.aget_methods(f))
+        self.run_async(lambda f: reflection.aget_methods(f))
+
+        self.assertIn('methods', methods)
+        self.assertEqual(self.fake.stats()['flickr.reflection.getMethods'], 1)
+
+    def test_acached_call_with_a_shared_lock(self):
+        lock = SharedLock(LocMemCache('acached-call-tests', {}), timeout=1, poll=0.001)
+        cache = response_cache.ResponseCache(
+            response_cache.MemoryBackend(), {'flickr.people.getGroups': 60},
+            SingleFlight(), lock)
+
+        async def call():
+            return {'stat': 'ok'}
+
+        async def main():
+            return await cache.acached_call('flickr.people.getGroups', {}, 'public', call)
+
+        self.assertEqual(asyncio.run(main()), {'stat': 'ok'})
+        self.assertTrue(lock.acquire(response_cache.cache_key(
+            'flickr.people.getGroups', {}, 'public')))
+
+
+class FavColumnsTests(SimpleTestCase):
+    photo = {'id': '1', 'owner': '10@N01', 'views': '42', 'dateupload': '1500000000',
+             'tags': 'sunset  beach', 'datetaken': '2017-07-14 02:40:00'}
+
+    def test_photo_columns(self):
+        columns = photo_columns(self.photo)
+
+        self.assertEqual(columns['views'], 42)
+        self.assertEqual(columns['dateupload'].timestamp(), 1500000000)
+        self.assertEqual(columns['owner'], '10@N01')
+        self.assertEqual(columns['tags'], ['sunset', 'beach'])
+
+    def test_photo_columns_of_missing_or_odd_keys(self):
+        self.assertEqual(photo_columns({'views': 'many', 'dateupload': '', 'tags': ' '}),
+                         {'views': None, 'dateupload': None, 'owner': None, 'tags': None})
+        self.assertIsNone(photo_columns({'views': '9' * 10})['views'])
+
+    @mock.patch('django.db.models.Model.save')
+    def test_save_copies_the_columns(self, save):
+        fav = Fav(user_id=USER, photoid='1', info=self.photo)
+        fav.save()
+
+        self.assertEqual((fav.views, fav.owner, fav.tags), (42, '10@N01', ['sunset', 'beach']))
+
+        fav.info = dict(self.photo, views='43')
+        fav.save(update_fields=['info'])
+        self.assertEqual(fav.views, 43)
+        self.assertEqual(save.call_args.kwargs['update_fields'],
+                         {'info', 'views', 'dateupload', 'owner', 'tags'})
+
+
+# Against the database
+
+def echo_job(job, value):
+    job.report(1, 1, 'echoed')
+    return value
+
+
+def failing_job(job, value):
+    raise RuntimeError('failed {}'.format(value))
+
+
+TEST_JOBS = dict(settings.FLICKR_JOBS, CONCURRENCY={'echo': 1, 'fail': 1}, MAX_ATTEMPTS=2,
+                 BACKOFF=30)
+
+
+@override_settings(FLICKR_JOBS=TEST_JOBS)
+@mock.patch.dict(jobs.HANDLERS, {'echo': echo_job, 'fail': failing_job})
+class JobQueueTests(TestCase):
+    def claim(self):
+        return jobs.claim('test-worker', ['echo'])
+
+    def test_enqueue_returns_the_pending_job(self):
+        job = jobs.enqueue('echo', value=1)
+
+        self.assertEqual(jobs.enqueue('echo', value=1).pk, job.pk)
+        self.assertNotEqual(jobs.enqueue('echo', value=2).pk, job.pk)
+        self.assertEqual(job.max_attempts, 2)
+
+    def test_enqueue_queues_again_once_claimed(self):
+        job = jobs.enqueue('echo', value=1)
+        self.assertEqual(self.claim().pk, job.pk)
+
+        self.assertNotEqual(jobs.enqueue('echo', value=1).pk, job.pk)
+
+    def test_enqueue_gives_up(self):
+        with mock.patch.object(Job.objects, 'create', side_effect=IntegrityError) as create, \
+                self.assertRaises(IntegrityError):
+            jobs.enqueue('echo', value=1)
+        self.assertEqual(create.call_count, jobs.ENQUEUE_ATTEMPTS)
+
+    def test_enqueue_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('nothing')
+
+    def test_claim(self):
+        job = jobs.enqueue('echo', value=1)
+
+        claimed = self.claim()
+        job.refresh_from_db()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((job.status, job.attempts, job.worker),
+                         (Job.RUNNING, 1, 'test-worker'))
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_claim_limits_the_running_jobs_of_a_kind(self):
+        first = jobs.enqueue('echo', value=1)
+        second = jobs.enqueue('echo', value=2)
+
+        self.assertEqual(self.claim().pk, first.pk)
+        self.assertIsNone(self.claim())
+        Job.objects.filter(pk=first.pk).update(status=Job.DONE)
+        self.assertEqual(self.claim().pk, second.pk)
+
+    def test_claim_waits_for_run_after(self):
+        later = jobs.enqueue('echo', value=1)
+        Job.objects.filter(pk=later.pk).update(run_after=timezone.now() + timedelta(minutes=1))
+        due = jobs.enqueue('echo', value=2)
+
+        self.assertEqual(self.claim().pk, due.pk)
+        Job.objects.filter(pk=due.pk).update(status=Job.DONE)
+        self.assertIsNone(self.claim())
+
+    def test_failed_job_is_retried_after_a_backoff(self):
+        jobs.enqueue('echo', value=1)
+        job = self.claim()
+        started = timezone.now()
+
+        jobs._failed(job, 'Traceback\nRuntimeError: failed 1\n')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreaterEqual(job.run_after, started + timedelta(seconds=15))
+        self.assertLessEqual(job.run_after, timezone.now() + timedelta(seconds=30))
+        self.assertEqual(jobs.describe(job)['error'], 'RuntimeError: failed 1')
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = self.claim()
+        jobs._failed(job, 'Traceback\nRuntimeError: failed 1\n')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job_with_an_identical_one_pending(self):
+        jobs.enqueue('echo', value=1)
+        job = self.claim()
+        pending = jobs.enqueue('echo', value=1)
+
+        jobs._failed(job, 'RuntimeError: failed 1')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Not retried', job.error)
+        self.assertEqual(Job.objects.get(pk=pending.pk).status, Job.PENDING)
+
+    def test_requeue_stale(self):
+        jobs.enqueue('echo', value=1)
+        stale = self.claim()
+        jobs.enqueue('fail', value=1)
+        alive = jobs.claim('other-worker', ['fail'])
+        lease = timedelta(seconds=TEST_JOBS['LEASE'] + 1)
+        Job.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - lease)
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.PENDING)
+        self.assertIn('test-worker', stale.error)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, Job.RUNNING)
+
+    def test_describe(self):
+        job = jobs.enqueue('echo', value=1)
+
+        self.assertEqual(jobs.describe(job)['error'], '')
+        job.error = ' \n '
+        self.assertEqual(jobs.describe(job)['error'], '')
+
+
+class JobViewTests(TestCase):
+    def test_person_sync(self):
+        url = '/people/{}/sync'.format(USER)
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual((job['kind'], job['args'], job['status']),
+                         ('sync_person', {'nsid': USER}, Job.PENDING))
+        self.assertEqual(self.client.post(url).json()['id'], job['id'])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        status = self.client.get(job['url'])
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual(status.json()['id'], job['id'])
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/999999').status_code, 404)
+
+
+@override_settings(FLICKR_JOBS=TEST_JOBS)
+@mock.patch.dict(jobs.HANDLERS, {'echo': echo_job, 'fail': failing_job})
+class WorkerTests(TransactionTestCase):
+    def test_run_once(self):
+        echoes = [jobs.enqueue('echo', value=value) for value in range(3)]
+        failing = jobs.enqueue('fail', value=1)
+
+        with self.assertLogs('flickr.jobs', 'ERROR'):
+            jobs.Worker(kinds=['echo', 'fail'], threads=2, poll=0.01).run(once=True)
+
+        for value, job in enumerate(echoes):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.result), (Job.DONE, value))
+            self.assertEqual(job.progress, {'done': 1, 'total': 1, 'message': 'echoed'})
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.PENDING, 1))
+        self.assertEqual(jobs.describe(failing)['error'], 'RuntimeError: failed 1')
+
+    def test_claim_skips_locked_jobs(self):
+        first = jobs.enqueue('fail', value=1)
+        second = jobs.enqueue('fail', value=2)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        try:
+            locked.wait(5)
+            self.assertEqual(jobs.claim('test-worker', ['fail']).pk, second.pk)
+        finally:
+            release.set()
+            holder.join(5)
+
+
+def fav_photo(photoid, views=10, tags='sunset'):
+    return {'id': photoid, 'owner': '10@N01', 'views': str(views), 'dateupload': '1500000000',
+            'tags': tags, 'title': 'Photo {}'.format(photoid)}
+
+
+class IngestTests(TestCase):
+    def test_upsert_favs(self):
+        photos = [fav_photo(str(photoid)) for photoid in range(3)]
+
+        reports = ingest.upsert_favs(USER, photos, batch_size=2)
+
+        self.assertEqual(reports, [{'inserted': 2, 'updated': 0, 'skipped': 0},
+                                   {'inserted': 1, 'updated': 0, 'skipped': 0}])
+        fav = Fav.objects.get(user_id=USER, photoid='2')
+        self.assertEqual((fav.views, fav.owner, fav.tags), (10, '10@N01', ['sunset']))
+        self.assertEqual(fav.info['title'], 'Photo 2')
+        self.assertTrue(Person.objects.filter(flickrid=USER).exists())
+
+    def test_upsert_favs_again_updates_changed_rows(self):
+        ingest.upsert_favs(USER, [fav_photo(str(photoid)) for photoid in range(3)])
+        photos = [fav_photo('0'), fav_photo('1', views=11, tags='beach'), fav_photo('3')]
+
+        reports = ingest.upsert_favs(USER, photos)
+
+        self.assertEqual(ingest.totals(reports), {'inserted': 1, 'updated': 1, 'skipped': 1})
+        self.assertEqual(Fav.objects.filter(user_id=USER).count(), 4)
+        fav = Fav.objects.get(user_id=USER, photoid='1')
+        self.assertEqual((fav.views, fav.tags, fav.info['views']), (11, ['beach'], '11'))
+
+    def test_upsert_favs_twice_in_a_batch(self):
+        reports = ingest.upsert_favs(USER, [fav_photo('1'), fav_photo('1', views=11)])
+
+        self.assertEqual(reports, [{'inserted': 1, 'updated': 0, 'skipped': 1}])
+        self.assertEqual(Fav.objects.get(user_id=USER, photoid='1').views, 11)
+
+    def test_upsert_following(self):
+        reports = ingest.upsert_following(USER, ['1@N01', '2@N01', '1@N01'], batch_size=2)
+
+        self.assertEqual(reports, [{'inserted': 2, 'updated': 0, 'skipped': 0},
+                                   {'inserted': 0, 'updated': 0, 'skipped': 1}])
+        self.assertEqual(ingest.totals(ingest.upsert_following(USER, ['1@N01', '3@N01'])),
+                         {'inserted': 1, 'updated': 0, 'skipped': 1})
+        self.assertEqual(sorted(Following.objects.filter(follower_id=USER)
+                                .values_list('followed_id', flat=True)),
+                         ['1@N01', '2@N01', '3@N01'])
+        self.assertEqual(Person.objects.count(), 4)
+
+
+class SyncTests(FakeFlickrTestCase, TestCase):
+    fake_options = dict(photos_per_user=5, favorites_per_user=4, contacts_per_user=3)
+
+    def test_sync_person(self):
+        started = timezone.now()
+
+        result = sync.sync_person(USER)
+
+        self.assertEqual(result, {
+            'photos': 5,
+            'favs': {'inserted': 4, 'updated': 0, 'skipped': 0},
+            'following': {'inserted': 3, 'updated': 0, 'skipped': 0},
+        })
+        person = Person.objects.get(flickrid=USER)
+        self.assertEqual(len(person.photos), 5)
+        self.assertEqual(person.info['nsid'], USER)
+        self.assertTrue(started <= person.updated_at <= timezone.now())
+
+    def test_sync_since_the_cursor(self):
+        sync.sync_person(USER)
+        # The fake adds a photo an hour, newest at 1500000000. The overlap
+        # takes the cursor back to the second newest photo.
+        updated_at = 1500000000 - 3600 + sync.CURSOR_OVERLAP.total_seconds()
+        Person.objects.filter(flickrid=USER).update(
+            updated_at=datetime.fromtimestamp(updated_at, timezone.utc))
+        person = Person.objects.get(flickrid=USER)
+        self.assertEqual(sync.cursor(person), 1500000000 - 3600)
+
+        result = sync.sync_person(USER)
+
+        self.assertEqual(result['photos'], 2)
+        self.assertEqual(result['favs'], {'inserted': 0, 'updated': 0, 'skipped': 2})
+        person.refresh_from_db()
+        self.assertEqual(len(person.photos), 5)
+        self.assertEqual(Fav.objects.filter(user_id=USER).count(), 4)
+
+    def test_cursor(self):
+        person = Person(flickrid=USER)
+        self.assertIsNone(sync.cursor(person))
+
+        person.updated_at = timezone.now()
+        self.assertIsNone(sync.cursor(person, full=True))
+        self.assertEqual(sync.cursor(person),
+                         int((person.updated_at - sync.CURSOR_OVERLAP).timestamp()))
+
+
+class FavSaveTests(TestCase):
+    def test_saved_favorites_are_queried_on_their_columns(self):
+        person = Person.objects.create(flickrid=USER)
+        fav = Fav.objects.create(user=person, photoid='1', info=fav_photo('1', tags='sunset'))
+        self.assertEqual(list(queries.favs(tag='sunset')), [fav])
+
+        fav.info = fav_photo('1', views=99, tags='beach')
+        fav.save(update_fields=['info'])
+
+        self.assertEqual(list(queries.favs(tag='beach', min_views=99)), [fav])
+        self.assertEqual(list(queries.favs(tag='sunset')), [])
+
+
+class FavColumnsMigrationTests(TransactionTestCase):
+    """Migration 0010 copying the columns out of existing favorites."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('flickr', target)])
+        executor.loader.build_graph()
+        return executor.loader.project_state([('flickr', target)]).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('flickr')[0][1]
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate('0009_job')
+        person = apps.get_model('flickr', 'Person').objects.create(flickrid=USER)
+        infos = [fav_photo('1', views=5, tags='sunset beach'),
+                 fav_photo('2', views=50, tags='sunset'),
+                 dict(fav_photo('3', views=500, tags='beach'), datetaken='2017-08-03 12:26:00'),
+                 {'id': '4', 'views': 'many', 'tags': ''}]
+        for info in infos:
+            apps.get_model('flickr', 'Fav').objects.create(user=person, photoid=info['id'],
+                                                           info=info)
+        backfill = importlib.import_module('flickr.migrations.0010_fav_columns')
+        with mock.patch.object(backfill, 'BATCH_SIZE', 3):
+            self.migrate(latest)
+
+    def test_backfill(self):
+        columns = {fav.photoid: (fav.views, fav.owner, fav.tags) for fav in Fav.objects.all()}
+
+        self.assertEqual(columns, {'1': (5, '10@N01', ['sunset', 'beach']),
+                                   '2': (50, '10@N01', ['sunset']),
+                                   '3': (500, '10@N01', ['beach']),
+                                   '4': (None, None, None)})
+        self.assertEqual(Fav.objects.get(photoid='1').dateupload.timestamp(), 1500000000)
+
+    def test_queries(self):
+        def ids(queryset):
+            return [fav.photoid for fav in queryset]
+
+        self.assertEqual(ids(queries.favs(tag='sunset')), ['2', '1'])
+        self.assertEqual(ids(queries.favs(tags=['beach', 'Sunset'])), ['1'])
+        self.assertEqual(ids(queries.favs(user=USER, min_views=50)), ['3', '2'])
+        self.assertEqual(sorted(ids(queries.favs(owner='10@N01', order='-dateupload'))),
+                         ['1', '2', '3'])
+        self.assertEqual(ids(queries.favs(taken_after='2017', order='-taken')), ['3'])
+
+    def test_indexes_are_valid(self):
+        # A concurrent build that failed leaves an invalid index behind.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT c.relname, i.indisvalid FROM pg_index i '
+                           'JOIN pg_class c ON c.oid = i.indexrelid '
+                           "WHERE c.relname LIKE 'flickr_%'")
+            valid = dict(cursor.fetchall())
+
+        for model in (Fav, Person):
+            for index in model._meta.indexes:
+                with self.subTest(index=index.name):
+                    self.assertIs(valid.get(index.name), True)
+
+
+class StoreAliasesTests(TestCase):
+    def stored(self):
+        return dict(Person.objects.exclude(alias=None).values_list('alias', 'flickrid'))
+
+    def test_store(self):
+        Person.objects.create(flickrid='1@N01', photos=[{'id': '1'}])
+
+        resolver._store({'jellybean': '1@N01', 'sunny': '2@N01'})
+
+        self.assertEqual(self.stored(), {'jellybean': '1@N01', 'sunny': '2@N01'})
+        self.assertEqual(Person.objects.get(flickrid='1@N01').photos, [{'id': '1'}])
+        self.assertEqual(resolver._stored_aliases(['jellybean', 'other'], 60),
+                         {'jellybean': '1@N01'})
+
+    def test_alias_taken_by_another_account(self):
+        resolver._store({'jellybean': '1@N01'})
+        resolver._store({'jellybean': '2@N01'})
+        resolver._store({'sunny': '2@N01'})
+
+        self.assertEqual(self.stored(), {'sunny': '2@N01'})
+
+    def test_expired_aliases(self):
+        resolver._store({'jellybean': '1@N01'})
+        Person.objects.update(resolved_at=timezone.now() - timedelta(seconds=61))
+
+        self.assertEqual(resolver._stored_aliases(['jellybean'], 60), {})
+
+
+class StoreAliasesConflictTests(TransactionTestCase):
+    def test_alias_taken_meanwhile(self):
+        inserted, release = threading.Event(), threading.Event()
+
+        def take():
+            try:
+                with transaction.atomic():
+                    Person.objects.create(flickrid='1@N01', alias='jellybean')
+                    inserted.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def store():
+            try:
+                resolver._store({'jellybean': '2@N01'})
+            finally:
+                connection.close()
+
+        taker = threading.Thread(target=take)
+        taker.start()
+        inserted.wait(5)
+        storer = threading.Thread(target=store)
+        with self.assertLogs('flickr.resolver', 'WARNING'):
+            storer.start()
+            # Until the insert of _store waits on the uncommitted alias.
+            wait_until(lambda: Person.objects.raw(
+                "SELECT 1 AS id FROM pg_stat_activity WHERE wait_event_type = 'Lock'"))
+            release.set()
+            taker.join(5)
+            storer.join(5)
+
+        self.assertEqual(Person.objects.get(alias='jellybean').flickrid, '1@N01')
+
+
+class PeopleViewTests(FakeFlickrTestCase, TestCase):
+    def post(self, value):
+        return self.client.post('/people/', {'user_id_or_url': value, 'page': 2,
+                                             'submit_group_photos': 'Groups Photos'})
+
+    def test_alias(self):
+        response = self.post('https://www.flickr.com/photos/JellyBean/')
+        nsid = Person.objects.get(alias='jellybean').flickrid
+
+        self.assertRedirects(response, '/people/{}/groups?page=2'.format(nsid),
+                             fetch_redirect_response=False)
+        reset_singletons()
+        self.assertRedirects(self.post('jellybean'), '/people/{}/groups?page=2'.format(nsid),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.fake.stats()['flickr.urls.lookupUser'], 1)
+
+    def test_unknown_user(self):
+        def lookup_user(params):
+            raise FlickrFail(*USER_NOT_FOUND)
+
+        self.fake.methods['flickr.urls.lookupUser'] = lookup_user
+        with self.assertLogs('flickr.views', 'ERROR'):
+            response = self.post('nobody')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Could not find the Flickr user nobody')
+
+    def test_invalid_form(self):
+        response = self.post('')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'This field is required.')
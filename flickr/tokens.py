@@ -0,0 +1,45 @@
+"""Compact session storage of the Flickr OAuth access token.
+
+The session keeps the token as a small JSON dict instead of a pickled
+flickrapi object, so it fits in a signed cookie. StoredToken exposes the
+attributes of flickrapi's FlickrAccessToken, which is only built when a
+client is created for it (see flickr.client).
+"""
+from collections import namedtuple
+
+from flickrapi.auth import FlickrAccessToken
+
+SESSION_KEY = 'flickr_token'
+
+FIELDS = ('token', 'token_secret', 'access_level', 'fullname', 'username', 'user_nsid')
+
+
+class StoredToken(namedtuple('StoredToken', FIELDS)):
+    __slots__ = ()
+
+    def to_flickrapi(self):
+        return FlickrAccessToken(*self)
+
+
+def save(session, token):
+    """Store a FlickrAccessToken, or StoredToken, in session."""
+    session[SESSION_KEY] = {field: getattr(token, field) for field in FIELDS}
+
+
+def load(session):
+    """StoredToken of session, or None.
+
+    A value not saved by save(), e.g. left by an older version, is dropped
+    and the session treated as logged out.
+    """
+    data = session.get(SESSION_KEY)
+    if data is None:
+        return None
+    if not isinstance(data, dict) or set(data) != set(FIELDS):
+        clear(session)
+        return None
+    return StoredToken(**data)
+
+
+def clear(session):
+    session.pop(SESSION_KEY, None)
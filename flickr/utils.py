@@ -1,5 +1,8 @@
 from urllib.parse import urlparse, urlencode, parse_qs, urlunparse
 
+from flickr import tokens
+
+
 def set_query_param(url, key, value):
     parts = list(urlparse(url))
     query_dict = parse_qs(parts[4])
@@ -10,6 +13,6 @@ def set_query_param(url, key, value):
 
 
 def get_logged_in_user_id(request):
-    token = request.session['token']
+    token = tokens.load(request.session)
     user_id = token.user_nsid
     return user_id
@@ -1,40 +1,32 @@
-import itertools
+import json
 import logging
-from urllib.parse import unquote, urlparse
-from pprint import pformat
+from urllib.parse import unquote, urlencode
 
 from django.conf import settings
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import InvalidPage
 from django.db import IntegrityError
-from django.http import HttpResponseRedirect, HttpResponse, HttpResponseNotFound
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotFound,
+                         HttpResponseRedirect, JsonResponse, StreamingHttpResponse)
 from django.shortcuts import render, redirect, reverse
 from django.views import View
+from django.views.decorators.http import require_POST
 from django.views.generic import DeleteView
-from flickrapi import FlickrAPI, FlickrError
+from flickrapi import FlickrError
 
 from flickr.flickrutils import photo_url, photo_page_url, photostream_url
 import flickr.flickrutils
+from flickr import (catalog, client, exports, fanout, fragments, instrumentation, jobs, paging,
+                    quota, reflection, resolver, response_cache, tokens)
 from flickr.utils import set_query_param, get_logged_in_user_id
-from flickr.forms import PeopleForm, FlickrForm
+from flickr.forms import PeopleForm, flickr_form_class
+from flickr.models import Job
 
 logging.basicConfig()
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
-
-def paginate(request=None, collection=None, per_page=100):
-    page = request.GET.get('page') if request is not None else 1
-    paginator = Paginator(collection, per_page)
-    try:
-        pages = paginator.page(page)
-    except PageNotAnInteger:
-        # If page is not an integer, deliver first page.
-        pages = paginator.page(1)
-    except EmptyPage:
-        # If page is out of range (e.g. 9999), deliver last page of results.
-        pages = paginator.page(paginator.num_pages)
-
-    return pages
+# Written after every streamed group fragment, see static/js/group-ajax.js.
+FRAGMENT_SEPARATOR = '\n<!-- /group -->\n'
 
 
 class PeopleView(View):
@@ -47,33 +39,74 @@ class PeopleView(View):
 
     def post(self, request):
         form = PeopleForm(request.POST)
-        if not form.is_valid():
-            raise 'Form not valid.'
-
-        userid_or_url = form.cleaned_data['user_id_or_url']
-        userid = self._userid_from_url(userid_or_url, request)
+        userid = None
+        if form.is_valid():
+            userid = self._userid_from_url(form, request)
+        if userid is None:
+            return render(request, 'flickr/groups.html', {'form': form})
 
+        query = {key: form.cleaned_data[key] for key in ('page', 'per_page')
+                 if form.cleaned_data.get(key)}
         if 'submit_group_photos' in request.POST:
-            return redirect('groups', userid=userid)
+            return redirect(_with_query(reverse('groups', kwargs={'userid': userid}), query))
+        if 'submit_photos' in request.POST:
+            return redirect(_with_query(reverse('photos', kwargs={'userid': userid}), query))
 
 
-    def _userid_from_url(self, param, request):
+    def _userid_from_url(self, form, request):
         """
-        :param: flickr user url or flickr user id:
+        :param: form with a flickr user url, path alias or flickr user id:
                 https://www.FLICKR.com/photos/jellybeanzgallery
                 or
                 38954353@N06
         :return: flickr user id:
                 38954353@N06
+                or None, with the error added to form, when Flickr has no such user
         """
-        parts = urlparse(param)
-        if not parts.scheme:
+        param = form.cleaned_data['user_id_or_url']
+        try:
+            return resolver.resolve(init_flickrapi(request), param)
+        except ValueError:
             return param
+        except FlickrError as err:
+            log.error('{}'.format(err))
+            form.add_error('user_id_or_url', 'Could not find the Flickr user {}: {}'.format(
+                param, err))
+            return None
+
 
+class UserPhotosView(View):
+    def get(self, request, userid):
         f = init_flickrapi(request)
-        response = f.urls.lookupUser(url=param)
-        userid = response['user']['id']
-        return userid
+        pages = list_page(request, f, 'flickr.people.getPublicPhotos', per_page=100,
+                          user_id=userid, extras='owner_name,views')
+
+        context = {
+            'photos': pages.object_list,
+            'pages': pages,
+            'utils': flickr.flickrutils,
+        }
+        return render(request, 'flickr/photos.html', context)
+
+
+def list_page(request, f, method_name, per_page, **kwargs):
+    """Page of a Flickr list method for the ?page= and ?per_page= of the request."""
+    try:
+        return paging.paginate(f, method_name, paging.page_number(request.GET.get('page')),
+                               per_page=per_page_param(request, per_page), **kwargs)
+    except InvalidPage as err:
+        raise Http404(str(err))
+
+
+def per_page_param(request, default):
+    try:
+        return max(1, int(request.GET['per_page']))
+    except (KeyError, ValueError):
+        return default
+
+
+def _with_query(url, query):
+    return url + '?' + urlencode(query) if query else url
 
 
 class UserGroupView(View):
@@ -81,52 +114,123 @@ class UserGroupView(View):
         groupname = request.POST.get('group[name]')
 
         f = init_flickrapi(request)
-        photos = []
-        try:
-            response = f.groups.pools.getPhotos(group_id=groupid, user_id=userid, extras='views')
-            photos = response['photos']['photo']
-        except FlickrError as err:
-            log.error('{} {}'.format(err, groupname))
-
-        context = {
-            'groupname': groupname,
-            'photos': photos,
-            'utils': flickr.flickrutils,
-        }
-        return render(request, 'flickr/_group.html', context)
+        # One of the AJAX requests a groups page fans out to.
+        with quota.use(quota.FANOUT):
+            return HttpResponse(fragments.group_fragment(f, request, userid, groupid, groupname))
 
 
 class UserGroupsView(View):
     def get(self, request, userid):
         f = init_flickrapi(request)
 
-        response = f.people.getGroups(user_id=userid)
+        pages = list_page(request, f, 'flickr.people.getGroups', per_page=25, user_id=userid)
+        log.debug('%s groups for %s', pages.paginator.count, userid)
 
-        group_list = response['groups']['group']
-        log.debug('{} groups for {}:\n{}'.format(len(group_list), userid,
-            pformat(group_list[:10])))
+        if request.GET.get('stream'):
+            results = group_fragments(request, f, userid, pages.object_list)
+            return StreamingHttpResponse(
+                (html + FRAGMENT_SEPARATOR for group, html in results), content_type='text/html')
 
-        pages = paginate(request, collection=group_list, per_page=25)
+        stream_url = None
+        if settings.FLICKR_FANOUT['MODE'] == 'server':
+            stream_url = set_query_param(request.get_full_path(), 'stream', 1)
 
         context = {
             'userid': userid,
             'groups': pages.object_list,
             'pages': pages,
+            'stream_url': stream_url,
+            'batch_url': reverse('groups-batch', kwargs={'userid': userid}),
             'utils': flickr.flickrutils,
         }
         return render(request, 'flickr/groups.html', context)
 
 
+class UserGroupsBatchView(View):
+    """Fragments of all the groups posted, fetched concurrently, in one response.
+
+    The JSON body is {"groups": [{"nsid": ..., "name": ...}, ...]}. Fragments
+    are streamed as their pools arrive, each followed by FRAGMENT_SEPARATOR,
+    or with ?format=json returned as {"groups": [{"nsid": ..., "html": ...}]}
+    in the order they were posted.
+    """
+
+    def post(self, request, userid):
+        try:
+            groups = batch_groups(request)
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+
+        f = init_flickrapi(request)
+        results = group_fragments(request, f, userid, groups)
+
+        if request.GET.get('format') == 'json':
+            rendered = {group['nsid']: html for group, html in results}
+            return JsonResponse({'groups': [{'nsid': group['nsid'], 'html': rendered[group['nsid']]}
+                                            for group in groups]})
+
+        return StreamingHttpResponse(
+            (html + FRAGMENT_SEPARATOR for group, html in results), content_type='text/html')
+
+
+def batch_groups(request):
+    """Groups posted to the batch endpoint, raises ValueError when malformed."""
+    try:
+        groups = json.loads(request.body.decode('utf-8'))['groups']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Expected a JSON body {"groups": [{"nsid": ..., "name": ...}]}.')
+
+    if not isinstance(groups, list) or not all(
+            isinstance(group, dict) and isinstance(group.get('nsid'), str) for group in groups):
+        raise ValueError('Every group needs an nsid.')
+
+    max_groups = settings.FLICKR_FANOUT['MAX_BATCH']
+    if len(groups) > max_groups:
+        raise ValueError('At most {} groups per batch.'.format(max_groups))
+
+    unique = {}
+    for group in groups:
+        unique.setdefault(group['nsid'], {'nsid': group['nsid'], 'name': group.get('name')})
+    return list(unique.values())
+
+
+def group_fragments(request, f, userid, groups):
+    """Iterator of (group, rendered _group.html) as the pools arrive, fetched concurrently.
+
+    The pools are requested before this returns, while the middleware still
+    holds the quota user and call summary of the request, even when the
+    fragments are streamed after the view returned.
+    """
+    names = {group['nsid']: group.get('name') for group in groups}
+
+    def fetch(f, userid, groupid):
+        return fragments.group_fragment(f, request, userid, groupid, names[groupid])
+
+    results = fanout.fetch_group_pools(
+        f, userid, groups,
+        workers=settings.FLICKR_FANOUT['WORKERS'],
+        timeout=settings.FLICKR_FANOUT['TIMEOUT'],
+        fetch=fetch)
+    return _rendered(request, f, userid, results)
+
+
+def _rendered(request, f, userid, results):
+    for group, html, err in results:
+        if err is not None:
+            html = fragments.render_group(request, f.scope, userid, group['nsid'],
+                                          group.get('name'))
+        yield group, html
+
+
 # Flickr auth
 
 def require_flickr_auth(view):
     """"View decorator, redirects users to Flickr when no access token found."""
 
     def protected_view(request, *args, **kwargs):
-        token = request.session.get('token')
+        token = tokens.load(request.session)
         if token is None:
-            f = FlickrAPI(settings.FLICKR_KEY, settings.FLICKR_SECRET,
-                token=token, store_token=False)
+            f = client.new_client()
             callback_url = _build_callback_url(request)
             f.get_request_token(oauth_callback=callback_url)
 
@@ -161,7 +265,7 @@ def flickr_auth(request):
     verifier = request.GET.get('oauth_verifier')
     log.debug('verifier: {}'.format(verifier))
 
-    f = init_flickrapi(request)
+    f = client.new_client()
 
     f.flickr_oauth.resource_owner_key = request.session['request_token']
     f.flickr_oauth.resource_owner_secret = request.session['request_token_secret']
@@ -174,7 +278,7 @@ def flickr_auth(request):
 
     token = f.token_cache.token
     log.debug('token: {}'.format(token.__dict__))
-    request.session['token'] = token
+    tokens.save(request.session, token)
 
     user_id = token.user_nsid
 
@@ -187,17 +291,13 @@ def auth(request):
 
 
 def logout(request):
-    request.session.pop('token', None)
+    tokens.clear(request.session)
     return redirect('/')
 
 
 def init_flickrapi(request):
-    token = request.session.get('token')
-
-    f = FlickrAPI(settings.FLICKR_KEY, settings.FLICKR_SECRET,
-        token=token, store_token=False, format='parsed-json')
-
-    return f
+    token = tokens.load(request.session)
+    return client.get_client(token)
 
 
 # Flickr API calls
@@ -224,28 +324,44 @@ class FlickrExplore(View):
 
     def post(self, request, method_name):
         f = init_flickrapi(request)
-        method_info = f.reflection.getMethodInfo(method_name=method_name)
+        try:
+            form_class = self._form_class(request, method_name)
+        except FlickrError:
+            return HttpResponseNotFound('<h1>404 Not Found</h1>')
 
-        form = FlickrForm(request.POST, extra=method_info)
+        form = form_class(request.POST)
 
         if form.is_valid():
             log.debug(f'form: {form.cleaned_data}')
 
-        response = f.do_flickr_call(_method_name=method_name, **form.cleaned_data)
+        try:
+            response = f.do_flickr_call(_method_name=method_name, **form.cleaned_data)
+        except FlickrError as err:
+            log.error('{}'.format(err))
+            response = {'stat': 'fail', 'code': err.code, 'message': str(err)}
 
         return self.get(request, method_name=method_name, response=response, form=form)
 
 
     def _dynamic_form(self, request, method_name):
-        method_info = self._get_method_info(request, method_name)
-        form = FlickrForm(extra=method_info)
-        return form
+        form_class = self._form_class(request, method_name)
+        return form_class()
+
+
+    def _form_class(self, request, method_name):
+        return flickr_form_class(
+            method_name, lambda: self._get_method_info(request, method_name))
 
 
     def _get_method_info(self, request, method_name):
+        methods = catalog.get_catalog()
+        method_info = methods.method_info(method_name) if methods is not None else None
+        if method_info is not None:
+            return method_info
+
         f = init_flickrapi(request)
         try:
-            method_info = f.reflection.getMethodInfo(method_name=method_name)
+            method_info = reflection.get_method_info(f, method_name)
         except FlickrError as err:
             log.error('{}'.format(err))
             raise err
@@ -258,18 +374,89 @@ class FlickrExplore(View):
 
 def api(request):
     f = init_flickrapi(request)
-    response = f.reflection.getMethods()
-    status = response.get('stat')
-
-    if status != 'ok':
-        log.debug(f'Bad status\n{response}')
-
-    methods = (method['_content'] for method in response['methods']['method'])
-    between_dots = lambda _str: _str[7: _str.rindex('.')]
-    methods = itertools.groupby(methods, key=between_dots)
+    methods = catalog.get_methods_catalog(f)
 
     context = {
-        'methods': methods,
+        'methods': methods.namespaces(),
     }
 
     return render(request, 'flickr/api.html', context)
+
+
+def api_search(request):
+    """Methods matching ?q=, best first, for search as you type."""
+    query = request.GET.get('q', '')
+    limit = settings.FLICKR_METHOD_CATALOG['SEARCH_LIMIT']
+
+    f = init_flickrapi(request)
+    methods = catalog.get_methods_catalog(f)
+
+    return JsonResponse({
+        'query': query,
+        'methods': [methods.describe(name) for name in methods.search(query, limit)],
+    })
+
+
+# Background jobs
+
+@require_POST
+def person_sync(request, userid):
+    """Queue a sync of userid, answers with the job to poll."""
+    job = jobs.enqueue('sync_person', nsid=userid)
+    return _job_response(job, status=202)
+
+
+def job_status(request, job_id):
+    try:
+        job = Job.objects.get(pk=job_id)
+    except Job.DoesNotExist:
+        raise Http404('No job {}'.format(job_id))
+    return _job_response(job)
+
+
+def _job_response(job, status=200):
+    data = jobs.describe(job)
+    data['url'] = reverse('job', kwargs={'job_id': job.pk})
+    return JsonResponse(data, status=status)
+
+
+# Exports
+
+def export(request, userid, source, fmt):
+    """Stream the group pools or favorites of userid, ?skip=n resumes after n records.
+
+    The response is consumed after the middleware returned, so its Flickr
+    calls have the background quota priority.
+    """
+    try:
+        writer = exports.writer_class(fmt)
+        skip = int(request.GET.get('skip') or 0)
+    except exports.ExportError as err:
+        return HttpResponseBadRequest(str(err))
+    except ValueError:
+        return HttpResponseBadRequest('skip must be a number of records.')
+    if skip < 0:
+        return HttpResponseBadRequest('skip must be a number of records.')
+
+    f = init_flickrapi(request)
+    response = StreamingHttpResponse(exports.stream(f, userid, source, fmt, skip=skip),
+                                     content_type=writer.content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}-{}.{}"'.format(
+        userid.replace('@', '_'), source, fmt)
+    return response
+
+
+def metrics(request):
+    """Flickr call metrics in the Prometheus text format, for local scrapers only."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        return HttpResponseNotFound('<h1>404 Not Found</h1>')
+
+    gauges = [('flickr_client_pool', client.pool_stats()),
+              ('flickr_fragment_cache', fragments.stats()),
+              ('flickr_single_flight', response_cache.get_cache().stats()),
+              ('flickr_quota', quota.stats())]
+    lines = ['# TYPE {}_{} gauge'.format(prefix, key) + '\n' +
+             '{}_{} {}'.format(prefix, key, value)
+             for prefix, stats in gauges for key, value in sorted(stats.items())]
+    body = instrumentation.metrics.render() + '\n'.join(lines) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
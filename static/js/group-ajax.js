@@ -1,19 +1,64 @@
+var FRAGMENT_SEPARATOR = '\n<!-- /group -->\n';
+
 (function (){
     // console.log(context)
-    $.each(context.groups, function (idx, group) {
-        $.ajax({
-            type: 'post',
-            url: group.nsid,
-            data: {
-                group: group,
-                csrfmiddlewaretoken: context.csrf_token
-            },
-            success: ajax_success,
-            dataType: 'html'
-        });
-    });
+    if (context.stream_url) {
+        stream_groups(context.stream_url);
+        return;
+    }
+
+    batch_groups(context.batch_url, context.groups);
 }())
 
 function ajax_success(data, textStatus, jqXHR) {
     $('#groups').append(data)
 }
+
+// One request for all groups: the server streams a fragment per group,
+// each followed by FRAGMENT_SEPARATOR, as soon as its pool arrives.
+function stream_groups(url) {
+    fetch(url, {credentials: 'same-origin'}).then(read_fragments);
+}
+
+// Same, for the groups of the page posted to the batch endpoint.
+function batch_groups(url, groups) {
+    var body = {
+        groups: $.map(groups, function (group) {
+            return {nsid: group.nsid, name: group.name};
+        })
+    };
+    fetch(url, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': context.csrf_token
+        },
+        body: JSON.stringify(body)
+    }).then(read_fragments);
+}
+
+function read_fragments(response) {
+    var reader = response.body.getReader();
+    var decoder = new TextDecoder();
+    var buffer = '';
+
+    function read() {
+        return reader.read().then(function (result) {
+            if (result.done) {
+                if (buffer) {
+                    ajax_success(buffer);
+                }
+                return;
+            }
+            buffer += decoder.decode(result.value, {stream: true});
+            var fragments = buffer.split(FRAGMENT_SEPARATOR);
+            buffer = fragments.pop();
+            $.each(fragments, function (idx, fragment) {
+                ajax_success(fragment);
+            });
+            return read();
+        });
+    }
+    return read();
+}
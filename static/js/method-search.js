@@ -0,0 +1,38 @@
+(function (){
+    var input = document.getElementById('method-search');
+    var results = $('#method-results');
+    var timer = null;
+    var latest = '';
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(search, 100);
+    });
+
+    function search() {
+        var query = input.value.trim();
+        latest = query;
+        if (!query) {
+            results.empty();
+            return;
+        }
+        var url = context.search_url + '?q=' + encodeURIComponent(query);
+        fetch(url, {credentials: 'same-origin'})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                // Answers to earlier keystrokes can arrive late.
+                if (data.query !== latest) {
+                    return;
+                }
+                results.empty();
+                $.each(data.methods, function (idx, method) {
+                    var link = $('<a>').attr('href', '/' + method.name).text(method.name);
+                    var item = $('<li>').append(link);
+                    if (method.description) {
+                        item.append($('<small class="text-muted ml-2">').text(method.description));
+                    }
+                    results.append(item);
+                });
+            });
+    }
+}())